@@ -0,0 +1,180 @@
+import time  # Для работы с временем
+import sqlite3  # Для хранения индекса артикулов
+import logging  # Для ведения логов
+import threading  # Для доступа к индексу из рабочих потоков
+import uuid  # Для идентификатора запуска в счётчиках пропусков
+
+TTL_HOURS = 24 * 7  # Через сколько часов карточка считается устаревшей и открывается заново
+
+
+def listing_fingerprint(entry):
+    """Возвращает отпечаток карточки по данным каталога (цена и количество отзывов)."""
+    return f"{entry.get('price')}|{entry.get('reviews_count')}"
+
+
+class ArticleIndex:
+    """
+    Индекс известных артикулов для инкрементального обхода.
+
+    Для каждого артикула хранятся ссылка, отпечаток из каталога при последнем просмотре (seen_fingerprint)
+    и при последнем сборе карточки (scraped_fingerprint), а также время просмотра и сбора.
+    Карточку нужно открывать, если артикул новый, данные каталога изменились
+    или с последнего сбора прошло больше `ttl_hours` часов.
+
+    Сколько карточек отобрано и сколько пропущено, считается за запуск (selected, skipped)
+    и сохраняется в таблице runs для команды stats.
+    """
+
+    def __init__(self, index_file, ttl_hours=TTL_HOURS):
+        self.index_file = index_file
+        self.ttl_seconds = ttl_hours * 3600
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(index_file, timeout=30.0, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS articles (
+                product_article TEXT PRIMARY KEY,
+                url TEXT,
+                seen_fingerprint TEXT,
+                last_seen REAL,
+                scraped_fingerprint TEXT,
+                last_scraped REAL
+            )
+            """
+        )
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                started REAL,
+                selected INTEGER NOT NULL DEFAULT 0,
+                skipped INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._connection.commit()
+        self.run_id = uuid.uuid4().hex
+        self.started = time.time()
+        self.selected = 0  # Карточки, отобранные для сбора в этом запуске
+        self.skipped = 0  # Карточки, пропущенные в этом запуске: их сбор не понадобился
+
+    def close(self):
+        """Закрывает индекс."""
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def seed(self, articles, scraped_at=None):
+        """
+        Добавляет артикулы, уже сохранённые в файле с товарами, но отсутствующие в индексе.
+        Их отпечаток неизвестен, поэтому они будут открыты заново только по истечении срока.
+        """
+        scraped_at = scraped_at or time.time()
+        with self._lock:
+            cursor = self._connection.executemany(
+                "INSERT OR IGNORE INTO articles (product_article, last_scraped) VALUES (?, ?)",
+                ((article, scraped_at) for article in articles if article),
+            )
+            self._connection.commit()
+        if cursor.rowcount:
+            logging.info("В индекс артикулов добавлено %d ранее сохранённых товаров.", cursor.rowcount)
+
+    def _record_seen(self, article, url, fingerprint, now):
+        self._connection.execute(
+            "INSERT INTO articles (product_article, url, seen_fingerprint, last_seen) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(product_article) DO UPDATE SET url = excluded.url, "
+            "seen_fingerprint = excluded.seen_fingerprint, last_seen = excluded.last_seen",
+            (article, url, fingerprint, now),
+        )
+
+    def record_listing(self, listing, now=None):
+        """
+        Только запоминает данные каталога (отпечатки карточек), ничего не отбирая.
+        Используется при полном обходе, чтобы следующий инкрементальный обход мог сравнивать отпечатки.
+
+        :param listing: Список словарей с ключами url, product_article, price, reviews_count.
+        """
+        now = now or time.time()
+        with self._lock:
+            for entry in listing:
+                article = entry.get("product_article")
+                if article is not None:
+                    self._record_seen(article, entry["url"], listing_fingerprint(entry), now)
+            self._connection.commit()
+
+    def select_for_fetch(self, listing, now=None):
+        """
+        Запоминает данные каталога и отбирает карточки, которые нужно открыть (инкрементальный обход).
+
+        :param listing: Список словарей с ключами url, product_article, price, reviews_count.
+        :return: tuple: (список ссылок для сбора, количество пропущенных карточек).
+        """
+        now = now or time.time()
+        to_fetch = []
+        skipped = 0
+        with self._lock:
+            for entry in listing:
+                article = entry.get("product_article")
+                fingerprint = listing_fingerprint(entry)
+                if article is None:
+                    to_fetch.append(entry["url"])  # Без артикула сравнивать не с чем
+                    continue
+                row = self._connection.execute(
+                    "SELECT scraped_fingerprint, last_scraped FROM articles WHERE product_article = ?", (article,)
+                ).fetchone()
+                self._record_seen(article, entry["url"], fingerprint, now)
+                if self._is_fresh(row, fingerprint, now):
+                    skipped += 1
+                else:
+                    to_fetch.append(entry["url"])
+            self.selected += len(to_fetch)
+            self.skipped += skipped
+            self._connection.execute(
+                "INSERT INTO runs (run_id, started, selected, skipped) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(run_id) DO UPDATE SET selected = excluded.selected, skipped = excluded.skipped",
+                (self.run_id, self.started, self.selected, self.skipped),
+            )
+            self._connection.commit()
+        logging.debug("Инкрементальный обход страницы: к сбору %d карточек, пропущено %d.", len(to_fetch), skipped)
+        return to_fetch, skipped
+
+    def skip_stats(self):
+        """
+        Счётчики инкрементального обхода по сохранённым запускам.
+
+        :return: Словарь: last_selected и last_skipped - последний запуск, total_skipped - все запуски, runs.
+        """
+        with self._lock:
+            last = self._connection.execute(
+                "SELECT selected, skipped FROM runs ORDER BY started DESC LIMIT 1").fetchone()
+            runs, total_skipped = self._connection.execute("SELECT COUNT(*), SUM(skipped) FROM runs").fetchone()
+        last_selected, last_skipped = last or (0, 0)
+        return {"runs": runs, "last_selected": last_selected, "last_skipped": last_skipped,
+                "total_skipped": total_skipped or 0}
+
+    def _is_fresh(self, row, fingerprint, now):
+        if row is None:
+            return False
+        scraped_fingerprint, last_scraped = row
+        if last_scraped is None or now - last_scraped > self.ttl_seconds:
+            return False
+        # Для артикулов без известного отпечатка решает только срок давности
+        return scraped_fingerprint is None or scraped_fingerprint == fingerprint
+
+    def mark_scraped(self, article, now=None):
+        """Отмечает, что карточка собрана по текущим данным каталога."""
+        if not article:
+            return
+        with self._lock:
+            self._connection.execute(
+                "UPDATE articles SET scraped_fingerprint = seen_fingerprint, last_scraped = ? "
+                "WHERE product_article = ?",
+                (now or time.time(), article),
+            )
+            self._connection.commit()
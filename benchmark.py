@@ -0,0 +1,580 @@
+import os  # Для работы с операционной системой
+import io  # Для генерации изображений в памяти
+import sys  # Для вывода результатов
+import json  # Для вывода результатов в JSON
+import time  # Для работы с временем
+import re  # Для шаблона хоста фиктивного сайта
+import random  # Для генерации синтетических данных
+import shutil  # Для удаления временных каталогов
+import logging  # Для ведения логов
+import argparse  # Для разбора аргументов командной строки
+import platform  # Для описания окружения в результатах
+import tempfile  # Для временных каталогов с результатами
+import threading  # Для HTTP-сервера изображений
+import subprocess  # Для определения ревизии git
+from collections import Counter  # Для подсчёта вызовов драйвера
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler  # Для локального сервера изображений
+from urllib.parse import urljoin, urlparse  # Для ссылок фиктивного сайта
+
+from lxml import html
+from PIL import Image
+from selenium.common.exceptions import NoSuchElementException
+
+from products import get_product_listing, get_product_data, save_product_data_to_parquet, LISTING_SCRIPT
+from reviews import get_reviews_with_photos, save_review_data_to_parquet, REVIEWS_SCRIPT
+from utils import XPATH_TEXTS_SCRIPT, OUTER_HTML_SCRIPT, SCROLL_SCRIPT, BLOCK_CHECK_SCRIPT
+from storage import close_parquet_writers
+from html_extract import element_text, extract_product_data, extract_reviews_with_photos
+from image_store import ImageStore
+from downloader import ImageDownloader
+from rate_limit import RATE_LIMITER, HOST_GROUPS
+
+# Офлайн-замеры горячих путей парсера на синтетическом сайте: фиктивный WebDriver отдаёт
+# страницы-фикстуры, разобранные lxml, и считает каждый запрос к "браузеру", а изображения
+# скачиваются с локального HTTP-сервера. Результат - JSON, который можно сравнивать между версиями.
+
+SCALES = (100, 1000, 10000)  # Размеры синтетического каталога, карточек
+MODES = ("js", "webdriver", "lxml")  # Способы извлечения данных (см. run_cards)
+CATALOG_PAGE_SIZE = 100  # Карточек на странице каталога
+REVIEWS_PER_CARD = 30  # Отзывов на странице товара
+PHOTO_REVIEW_SHARE = 0.6  # Доля отзывов с фотографиями
+MAX_IMAGES = 1000  # Максимальное количество изображений в замере скачивания
+STARTUP_REPEATS = 5  # Сколько раз запускать каждую команду в замере старта
+# Команды main.py без браузера для замера старта (каталог данных пустой)
+STARTUP_COMMANDS = {
+    "help": ["--help"],
+    "stats": ["stats"],
+    "watch": ["watch", "--once"],
+    "export": ["export", "export.parquet"],
+    "download": ["download"],
+}
+HEAVY_MODULES = ("selenium", "webdriver_manager", "pandas", "pyarrow", "requests")  # Отмечаются в замере старта
+BASE_URL = "https://bench.local"  # Адрес фиктивного сайта
+# Фиктивный сайт ограничивается планировщиком запросов как страницы каталога
+BENCH_HOST_GROUPS = (("catalog", re.compile(r"^bench\.local$")),) + HOST_GROUPS
+
+_real_sleep = time.sleep
+
+
+def render_catalog_page(articles, next_page_url=None):
+    """Возвращает HTML страницы каталога с карточками заданных артикулов."""
+    cards = "".join(
+        f'<article><div><a href="{BASE_URL}/catalog/{article}/detail.aspx">Товар {article}</a>'
+        f'<span class="price__lower-price">{1000 + article % 3000} ₽</span>'
+        f'<span class="product-card__count">{article % 500} оценок</span></div></article>'
+        for article in articles
+    )
+    pagination = (f'<a class="pagination-next pagination__next j-next-page" href="{next_page_url}">Далее</a>'
+                  if next_page_url else "")
+    return f"<html><body><div class='catalog'>{cards}</div>{pagination}</body></html>"
+
+
+def _table(rows):
+    cells = "".join(f"<tr><th>{label}</th><td><span>{value}</span></td></tr>" for label, value in rows)
+    return f"<table><tbody>{cells}</tbody></table>"
+
+
+def render_product_page(article, image_base_url, reviews=REVIEWS_PER_CARD, photo_share=PHOTO_REVIEW_SHARE):
+    """Возвращает HTML отрисованной страницы товара с открытым окном характеристик и лентой отзывов."""
+    rng = random.Random(article)
+    popup = (
+        '<div class="popup"><a class="popup__close">x</a><div class="popup__content">'
+        + _table([("Цвет", "белый")])
+        + _table([("Количество", f"{rng.randint(20, 120)} шт.")])
+        + _table([("Тип", "трусики"), ("Вес", f"{rng.randint(4, 15)}-{rng.randint(16, 25)} кг"),
+                  ("Вес с упаковкой", f"{rng.randint(500, 3000)} г"), ("Страна", "Россия"),
+                  ("Комплектация", "подгузники")])
+        + _table([("Длина", f"{rng.randint(20, 50)} см"), ("Высота", f"{rng.randint(10, 30)} см"),
+                  ("Ширина", f"{rng.randint(10, 30)} см")])
+        + "<section><p>" + "Описание товара. " * rng.randint(10, 60) + "</p></section>"
+        + "</div></div>"
+    )
+    items = []
+    for number in range(reviews):
+        photos = ""
+        if rng.random() < photo_share:
+            photos = '<ul class="feedback__photos j-feedback-photos-scroll">' + "".join(
+                f'<li><img src="{image_base_url}/img/{article}-{number}-{index}/ms.webp"></li>'
+                for index in range(rng.randint(1, 4))
+            ) + "</ul>"
+        items.append(
+            f'<li><div><div>аватар</div><div><div><p>Покупатель {number}</p></div></div></div>'
+            f'<div class="feedback__date" content="2024-11-{1 + number % 28:02d}T11:29:09Z">дата</div>'
+            f'<span class="stars-line star{1 + number % 5}"></span>{photos}'
+            f'<p><span class="feedback__text--item feedback__text--item-pro">Хорошо сидят</span></p>'
+            f'<p><span class="feedback__text--item feedback__text--item-con">Нет</span></p>'
+            f'<p><span class="feedback__text--item">Комментарий {number}</span></p></li>'
+        )
+    price_block = ('<div class="product-page__price-block product-page__price-block--common hide-mobile">'
+                   f'<div><div><div><div><p><span><ins>{rng.randint(500, 5000)} ₽</ins></span></p>'
+                   '</div></div></div></div></div>')
+    return (
+        f"<html><body>{popup}<div class='main'><span id='productNmId'>{article}</span>"
+        f"<div class='product-page__header'><a>Бренд {article % 17}</a><h1>Подгузники {article}</h1></div>"
+        f"{price_block}<button>Все характеристики и описание</button>"
+        f'<a class="comments__btn-all" data-see-all="true">Все отзывы</a>'
+        f"<ul class=\"comments__list\">{''.join(items)}</ul></div></body></html>"
+    )
+
+
+class FakeSite:
+    """Синтетический сайт: каталог из `cards` карточек, страницы товаров генерируются по запросу."""
+
+    def __init__(self, cards, image_base_url="http://127.0.0.1"):
+        self.articles = list(range(100000, 100000 + cards))
+        self.image_base_url = image_base_url
+        self.start_url = f"{BASE_URL}/catalog/podguzniki"
+
+    def card_urls(self):
+        return [f"{BASE_URL}/catalog/{article}/detail.aspx" for article in self.articles]
+
+    def page(self, url):
+        parsed = urlparse(url)
+        if parsed.path.startswith("/catalog/") and parsed.path.endswith("/detail.aspx"):
+            return render_product_page(int(parsed.path.split("/")[2]), self.image_base_url)
+        page_number = int(parsed.query.split("page=")[-1]) if "page=" in parsed.query else 1
+        start = (page_number - 1) * CATALOG_PAGE_SIZE
+        articles = self.articles[start:start + CATALOG_PAGE_SIZE]
+        has_next = start + CATALOG_PAGE_SIZE < len(self.articles)
+        return render_catalog_page(articles, f"{self.start_url}?page={page_number + 1}" if has_next else None)
+
+
+def _class_selector_xpath(selector):
+    """Переводит CSS-селектор вида ".class" (других в LISTING_SELECTORS нет) в XPath."""
+    return f".//*[contains(concat(' ', normalize-space(@class), ' '), ' {selector.lstrip('.')} ')]"
+
+
+class FakeElement:
+    """Элемент фиктивного драйвера: узел lxml с интерфейсом WebElement."""
+
+    def __init__(self, driver, node):
+        self._driver = driver
+        self._node = node
+
+    @property
+    def text(self):
+        self._driver._count("element.text")
+        return element_text(self._node)
+
+    def get_attribute(self, name):
+        self._driver._count("element.get_attribute")
+        if name == "href":
+            value = self._node.get("href")
+            return urljoin(self._driver.current_url, value) if value else None
+        return self._node.get(name)
+
+    def find_element(self, by, value):
+        self._driver._count("element.find_element")
+        return self._driver._first(value, self._node)
+
+    def find_elements(self, by, value):
+        self._driver._count("element.find_elements")
+        return [FakeElement(self._driver, node) for node in self._node.xpath(value)]
+
+    def click(self):
+        self._driver._count("element.click")
+        href = self._node.get("href")
+        if href and "page=" in href:
+            self._driver._load(href)
+
+    def is_displayed(self):
+        return True
+
+
+class FakeWebDriver:
+    """
+    Фиктивный WebDriver поверх страниц FakeSite.
+
+    Все известные скрипты парсера (см. products, reviews, utils) исполняются на lxml с той же семантикой,
+    что и в браузере. Каждый вызов считается как один запрос к браузеру; `round_trip_ms` добавляет
+    к нему задержку, чтобы оценить время работы с настоящим браузером.
+    """
+
+    def __init__(self, site, round_trip_ms=0.0):
+        self.site = site
+        self.round_trip = round_trip_ms / 1000
+        self.calls = Counter()
+        self.current_url = None
+        self._root = None
+
+    def _count(self, name):
+        self.calls[name] += 1
+        if self.round_trip:
+            _real_sleep(self.round_trip)
+
+    def _load(self, url):
+        self.current_url = url
+        self._root = html.fromstring(self.site.page(url))
+
+    def _first(self, xpath, node):
+        found = node.xpath(xpath)
+        if not found:
+            raise NoSuchElementException(f"Элемент не найден: {xpath}")
+        return FakeElement(self, found[0])
+
+    @property
+    def round_trips(self):
+        return sum(self.calls.values())
+
+    def get(self, url):
+        self._count("get")
+        self._load(url)
+
+    @property
+    def page_source(self):
+        self._count("page_source")
+        return html.tostring(self._root, encoding="unicode")
+
+    def find_element(self, by, value):
+        self._count("find_element")
+        return self._first(value, self._root)
+
+    def find_elements(self, by, value):
+        self._count("find_elements")
+        return [FakeElement(self, node) for node in self._root.xpath(value)]
+
+    def set_script_timeout(self, seconds):
+        pass
+
+    def execute_script(self, script, *args):
+        self._count("execute_script")
+        if script == XPATH_TEXTS_SCRIPT:
+            root_xpath, xpaths = args
+            root = self._root
+            if root_xpath:
+                found = self._root.xpath(root_xpath)
+                if not found:
+                    return None
+                root = found[0]
+            return {key: (element_text(found[0]) if (found := root.xpath(xpath)) else None)
+                    for key, xpath in xpaths.items()}
+        if script == LISTING_SCRIPT:
+            link_xpath, selectors = args
+            entries = []
+            for link in self._root.xpath(link_xpath):
+                card = next(iter(link.xpath("ancestor::article[1]")), link.getparent())
+                text = lambda selector: (element_text(found[0])
+                                         if (found := card.xpath(_class_selector_xpath(selector))) else None)
+                entries.append({"url": urljoin(self.current_url, link.get("href")),
+                                "price": text(selectors["price"]), "reviews_count": text(selectors["reviews_count"])})
+            return entries
+        if script == REVIEWS_SCRIPT:
+            return self._reviews(*args)
+        if script == OUTER_HTML_SCRIPT:
+            found = self._root.xpath(args[0])
+            return html.tostring(found[0], encoding="unicode") if found else None
+        if script == BLOCK_CHECK_SCRIPT:
+            return None  # Фиктивный сайт не ограничивает частоту запросов
+        return 1  # "return 1", прокрутка и прочие служебные скрипты
+
+    def execute_async_script(self, script, *args):
+        self._count("execute_async_script")
+        item_xpath = args[0] if script == SCROLL_SCRIPT else None
+        count = int(self._root.xpath(f"count({item_xpath})")) if item_xpath else 0
+        return {"reason": "converged", "count": count, "height": 10000, "elapsed": 0.0}
+
+    def _reviews(self, xpaths, max_reviews, only_new):
+        reviews = []
+        scanned = 0
+        for review in self._root.xpath(xpaths["items"]):
+            if len(reviews) >= max_reviews:
+                break
+            if only_new:
+                if review.get("data-wb-seen"):
+                    continue
+                review.set("data-wb-seen", "1")
+            scanned += 1
+            photo_srcs = []
+            for photo in review.xpath(xpaths["photos"]):
+                images = photo.xpath(".//img")
+                src = photo.get("src") or (images[0].get("src") if images else None)
+                if src:
+                    photo_srcs.append(src)
+            if not photo_srcs:
+                continue
+            first = lambda key: found[0] if (found := review.xpath(xpaths[key])) else None
+            text = lambda key: element_text(node) if (node := first(key)) is not None else None
+            attribute = lambda key, name: node.get(name) if (node := first(key)) is not None else None
+            reviews.append({
+                "photo_srcs": photo_srcs,
+                "author": text("author"),
+                "date_content": attribute("date", "content"),
+                "rating_class": attribute("rating", "class"),
+                "pros": text("pros"),
+                "cons": text("cons"),
+                "comments": text("comments"),
+            })
+        return {"reviews": reviews, "scanned": scanned}
+
+    def quit(self):
+        pass
+
+
+class SleepRecorder:
+    """
+    Подменяет time.sleep: паузы парсера суммируются, но не выполняются (или выполняются при real=True).
+
+    Планировщик запросов (RATE_LIMITER) на время замера переводится на часы, в которых невыполненные
+    паузы считаются прошедшими, поэтому sleep_seconds - это ожидание, которое он назначил бы на самом деле.
+    """
+
+    def __init__(self, real=False):
+        self.real = real
+        self.calls = 0
+        self.seconds = 0.0
+
+    def __call__(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        if self.real:
+            _real_sleep(seconds)
+
+    def now(self):
+        return time.monotonic() + (0.0 if self.real else self.seconds)
+
+    def __enter__(self):
+        time.sleep = self
+        RATE_LIMITER.reset(clock=self.now, groups=BENCH_HOST_GROUPS)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        time.sleep = _real_sleep
+        RATE_LIMITER.reset(clock=time.monotonic, groups=HOST_GROUPS)
+
+
+def directory_size(path):
+    """Возвращает суммарный размер файлов в каталоге (или размер файла)."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def run_listing(site, round_trip_ms=0.0, real_sleep=False):
+    """Замеряет сбор ссылок по страницам каталога (get_product_listing)."""
+    driver = FakeWebDriver(site, round_trip_ms)
+    with SleepRecorder(real_sleep) as sleeps:
+        started = time.perf_counter()
+        listing = get_product_listing(driver, site.start_url)
+        wall = time.perf_counter() - started
+    return {
+        "catalog_cards": len(site.articles),
+        "listed_cards": len(listing),
+        "wall_seconds": round(wall, 4),
+        "driver_round_trips": driver.round_trips,
+        "driver_calls": dict(driver.calls),
+        "sleep_seconds": round(sleeps.seconds, 3),
+        "sleep_calls": sleeps.calls,
+    }
+
+
+def run_cards(site, mode, round_trip_ms=0.0, real_sleep=False):
+    """
+    Замеряет обработку всех карточек сайта: данные товара, отзывы с фотографиями и запись в Parquet.
+
+    Режимы: "js" - поля читаются пакетно через execute_script, "webdriver" - отдельный find_element
+    на каждое поле, "lxml" - одно чтение page_source и разбор без браузера (html_extract).
+    """
+    output_dir = tempfile.mkdtemp(prefix="wb-bench-")
+    product_file = os.path.join(output_dir, "products_data", "products.parquet")
+    review_dir = os.path.join(output_dir, "reviews_data")
+    driver = FakeWebDriver(site, round_trip_ms)
+    reviews_saved = 0
+    try:
+        with SleepRecorder(real_sleep) as sleeps:
+            started = time.perf_counter()
+            for url in site.card_urls():
+                if mode == "lxml":
+                    driver.get(url)
+                    page_html = driver.page_source
+                    product_data = extract_product_data(page_html)
+                    review_data = extract_reviews_with_photos(page_html)
+                else:
+                    product_data = get_product_data(driver, url, use_js=mode == "js")
+                    review_data = get_reviews_with_photos(driver, use_js=mode == "js")
+                save_product_data_to_parquet(product_data, product_file)
+                save_review_data_to_parquet(review_data, review_dir, product_data.product_article)
+                reviews_saved += len(review_data)
+            close_parquet_writers()
+            wall = time.perf_counter() - started
+        bytes_written = directory_size(os.path.dirname(product_file)) + directory_size(review_dir)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    cards = len(site.articles)
+    return {
+        "mode": mode,
+        "cards": cards,
+        "reviews_saved": reviews_saved,
+        "wall_seconds": round(wall, 4),
+        "cards_per_second": round(cards / wall, 2) if wall else None,
+        "driver_round_trips": driver.round_trips,
+        "round_trips_per_card": round(driver.round_trips / cards, 2),
+        "driver_calls": dict(driver.calls),
+        "sleep_seconds": round(sleeps.seconds, 3),
+        "sleep_seconds_per_card": round(sleeps.seconds / cards, 3),
+        "sleep_calls": sleeps.calls,
+        "bytes_written": bytes_written,
+        "bytes_per_product": round(bytes_written / cards),
+    }
+
+
+class _ImageHandler(BaseHTTPRequestHandler):
+    """Отдаёт одно и то же сгенерированное изображение по любому пути (с разным содержимым по пути)."""
+
+    images = {}
+
+    def do_GET(self):
+        body = self.images.get(self.path)
+        if body is None:
+            seed = sum(self.path.encode("utf-8"))
+            image = Image.new("RGB", (640, 480), (seed % 256, (seed * 7) % 256, (seed * 13) % 256))
+            buffer = io.BytesIO()
+            image.save(buffer, "WEBP", quality=80)
+            body = self.images.setdefault(self.path, buffer.getvalue())
+        self.send_response(200)
+        self.send_header("Content-Type", "image/webp")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_image_server():
+    """Запускает локальный HTTP-сервер изображений и возвращает (сервер, базовый URL)."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ImageHandler)
+    threading.Thread(target=server.serve_forever, name="bench-images", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def run_images(image_base_url, count, max_workers):
+    """Замеряет скачивание `count` изображений в хранилище (ImageStore) с локального сервера."""
+    store_dir = tempfile.mkdtemp(prefix="wb-bench-images-")
+    urls = [f"{image_base_url}/img/{number}/fs.webp" for number in range(count)]
+    try:
+        with ImageStore(store_dir, ImageDownloader(max_workers=max_workers)) as store:
+            started = time.perf_counter()
+            summary = store.download(urls)
+            wall = time.perf_counter() - started
+            # Повторный запуск должен пропустить всё без обращения к сети
+            started = time.perf_counter()
+            repeat = store.download(urls)
+            repeat_wall = time.perf_counter() - started
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+    return {
+        "images": count,
+        "ok": summary.ok,
+        "failed": summary.failed,
+        "bytes": summary.bytes,
+        "wall_seconds": round(wall, 4),
+        "images_per_second": round(count / wall, 1) if wall else None,
+        "repeat_skipped": repeat.skipped,
+        "repeat_wall_seconds": round(repeat_wall, 4),
+    }
+
+
+def _run_command(arguments, cwd):
+    """Запускает `python <arguments>` и возвращает (время, stderr)."""
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable] + arguments, cwd=cwd, capture_output=True, text=True)
+    return time.perf_counter() - started, completed.stderr
+
+
+def run_startup(repeats=STARTUP_REPEATS):
+    """
+    Замеряет старт main.py для команд без браузера: медиану времени процесса от запуска до выхода
+    и какие тяжёлые библиотеки он импортировал (по -X importtime). Для сравнения замеряется пустой
+    запуск интерпретатора. Первый запуск каждой команды прогревает кэш байт-кода и не учитывается.
+    """
+    main_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    work_dir = tempfile.mkdtemp(prefix="wb-bench-startup-")
+    results = {}
+    try:
+        commands = {"python": ["-c", "pass"]}
+        commands.update({name: [main_script] + arguments + ([] if name == "help" else ["--data-dir", "data"])
+                         for name, arguments in STARTUP_COMMANDS.items()})
+        for name, arguments in commands.items():
+            _, imports = _run_command(["-X", "importtime"] + arguments, work_dir)
+            loaded = {line.rsplit("|", 1)[-1].strip().split(".")[0] for line in imports.splitlines()
+                      if line.startswith("import time:")}
+            timings = sorted(_run_command(arguments, work_dir)[0] for _ in range(repeats))
+            results[name] = {
+                "median_ms": round(timings[len(timings) // 2] * 1000, 1),
+                "min_ms": round(timings[0] * 1000, 1),
+                "heavy_imports": [module for module in HEAVY_MODULES if module in loaded],
+            }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def git_revision():
+    """Возвращает ревизию git рабочего каталога (или None)."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(scales=SCALES, modes=MODES, round_trip_ms=0.0, real_sleep=False, max_images=MAX_IMAGES,
+                   max_workers=8, startup_repeats=STARTUP_REPEATS):
+    """Выполняет все замеры и возвращает результат в виде словаря, готового к json.dump."""
+    startup = run_startup(startup_repeats) if startup_repeats else None
+    server, image_base_url = start_image_server()
+    results = []
+    try:
+        for cards in scales:
+            site = FakeSite(cards, image_base_url)
+            result = {"cards": cards, "listing": run_listing(site, round_trip_ms, real_sleep), "extract": []}
+            for mode in modes:
+                result["extract"].append(run_cards(site, mode, round_trip_ms, real_sleep))
+            result["images"] = run_images(image_base_url, min(cards, max_images), max_workers)
+            results.append(result)
+            logging.warning("Замер для %d карточек завершён.", cards)
+    finally:
+        server.shutdown()
+    return {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "round_trip_ms": round_trip_ms,
+        "real_sleep": real_sleep,
+        "startup": startup,
+        "results": results,
+    }
+
+
+def parse_args(argv=None):
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Офлайн-замеры парсера на синтетическом сайте.")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(SCALES),
+                        help="размеры каталога, карточек (по умолчанию 100 1000 10000)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES), help="способы извлечения данных")
+    parser.add_argument("--round-trip-ms", type=float, default=0.0,
+                        help="задержка одного запроса к браузеру, мс (0 - без задержки)")
+    parser.add_argument("--real-sleep", action="store_true", help="выполнять паузы парсера, а не только считать их")
+    parser.add_argument("--max-images", type=int, default=MAX_IMAGES, help="изображений в замере скачивания")
+    parser.add_argument("--startup-repeats", type=int, default=STARTUP_REPEATS,
+                        help="запусков каждой команды в замере старта main.py (0 - без замера)")
+    parser.add_argument("--output", help="файл для результатов (по умолчанию stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+    report = run_benchmarks(args.scales, args.modes, args.round_trip_ms, args.real_sleep, args.max_images,
+                            startup_repeats=args.startup_repeats)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
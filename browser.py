@@ -0,0 +1,247 @@
+import os  # Для работы с операционной системой
+import re  # Для разбора версии ChromeDriver
+import json  # Для кэша найденного ChromeDriver
+import time  # Для работы с временем
+import logging  # Для ведения логов
+import threading  # Для выделения профилей браузера рабочим потокам
+import subprocess  # Для запроса версии ChromeDriver
+
+try:
+    import fcntl  # Для блокировки профилей между процессами (Linux, macOS)
+except ImportError:
+    fcntl = None
+    import msvcrt  # Для блокировки профилей между процессами (Windows)
+
+from metrics import instrument_driver
+
+# selenium и webdriver_manager загружаются внутри setup_driver: модуль импортируется и командами
+# без браузера (через driver_pool и параметры командной строки), а сами библиотеки грузятся ~0.5 с.
+
+# Пользовательский агент для имитации браузера
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/85.0.4183.83 Safari/537.36"
+
+HEADLESS = True  # Запускать браузер без окна
+PAGE_LOAD_STRATEGY = "eager"  # Не ждать загрузки картинок и стилей: достаточно готового DOM
+WINDOW_SIZE = "1920,1080"  # Размер окна в режиме без окна (вёрстка каталога зависит от ширины)
+# Каталог тёплых профилей Chrome: кэш, cookies и служебные базы переживают перезапуск браузера
+PROFILE_DIR = os.path.join(os.path.expanduser("~"), ".wb-parser", "chrome-profiles")
+# Кэш найденного ChromeDriver (путь и версия): при следующих запусках драйвер не ищется в сети
+DRIVER_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".wb-parser", "chromedriver.json")
+
+# Запросы, которые браузер не выполняет (Network.setBlockedURLs): картинки, видео, шрифты и счётчики.
+# Ссылки на фотографии при этом остаются в атрибутах src и читаются из DOM как обычно.
+BLOCKED_URL_PATTERNS = [
+    "*.jpg", "*.jpeg", "*.png", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*mc.yandex.ru*", "*top-fwz1.mail.ru*", "*vk.com/rtrg*", "*ads.adfox.ru*",
+]
+
+_profile_lock = threading.Lock()
+_profiles_in_use = {}  # Каталог профиля -> файл блокировки, удерживаемый запущенным браузером
+
+_driver_lock = threading.Lock()
+_driver_path = None  # ChromeDriver, выбранный в этом процессе
+_driver_refreshed = False  # ChromeDriverManager уже вызывался в этом процессе
+
+
+def _lock_profile(path):
+    """
+    Захватывает файл блокировки профиля без ожидания.
+
+    Блокировка принадлежит открытому файлу, поэтому её видят и другие процессы `work` на этой машине,
+    а при аварийном завершении процесса система снимает её сама.
+
+    :param path: Путь к файлу блокировки.
+    :return: Открытый файл блокировки или None, если профиль занят.
+    """
+    lock_file = open(path, "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def _acquire_profile(profile_dir):
+    """
+    Выделяет свободный профиль с наименьшим номером: рабочие раз за разом получают одни и те же профили.
+
+    Профиль занимается файловой блокировкой `worker-N.lock`, поэтому несколько процессов
+    на одной машине не запускают Chrome в одном каталоге.
+
+    :param profile_dir: Каталог профилей Chrome.
+    :return: Каталог выделенного профиля.
+    """
+    os.makedirs(profile_dir, exist_ok=True)
+    with _profile_lock:
+        slot = 0
+        while True:
+            path = os.path.join(profile_dir, f"worker-{slot}")
+            if path not in _profiles_in_use:
+                lock_file = _lock_profile(f"{path}.lock")
+                if lock_file is not None:
+                    _profiles_in_use[path] = lock_file
+                    return path
+            slot += 1
+
+
+def _release_profile(path):
+    with _profile_lock:
+        lock_file = _profiles_in_use.pop(path, None)
+    if lock_file is not None:
+        lock_file.close()  # Закрытие файла снимает блокировку
+
+
+def chromedriver_version(path):
+    """Возвращает версию ChromeDriver из `chromedriver --version` (None, если бинарник не запускается)."""
+    try:
+        output = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=10).stdout
+    except (OSError, subprocess.SubprocessError):
+        return None
+    match = re.search(r"\d+(?:\.\d+)+", output)
+    return match.group(0) if match else None
+
+
+def _read_driver_cache(cache_file):
+    """Возвращает запись кэша ChromeDriver, если кэшированный бинарник на месте, иначе None."""
+    try:
+        with open(cache_file, encoding="utf-8") as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        return None
+    path = cached.get("path")
+    if not path or not os.path.isfile(path) or not os.access(path, os.X_OK):
+        return None
+    return cached
+
+
+def _write_driver_cache(cache_file, path, version):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as file:
+        json.dump({"path": path, "version": version, "resolved_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, file)
+    os.replace(tmp_file, cache_file)
+
+
+def resolve_chromedriver(refresh=False, cache_file=DRIVER_CACHE_FILE):
+    """
+    Возвращает путь к ChromeDriver.
+
+    Путь и версия драйвера, найденного ChromeDriverManager, сохраняются в `cache_file`, и следующие
+    запуски берут драйвер оттуда без обращения к сети. Менеджер вызывается, только если кэша нет,
+    кэшированный файл пропал или драйвер не подошёл к установленному Chrome (`refresh`, не чаще
+    одного раза за процесс). Если менеджер недоступен (нет сети), используется кэш.
+    """
+    global _driver_path, _driver_refreshed
+    with _driver_lock:
+        if _driver_path is not None and (not refresh or _driver_refreshed):
+            return _driver_path
+        cached = _read_driver_cache(cache_file)
+        if cached is not None and not refresh:
+            logging.info(f"ChromeDriver {cached.get('version')} из кэша: {cached['path']}")
+            _driver_path = cached["path"]
+            return _driver_path
+
+        from webdriver_manager.chrome import ChromeDriverManager  # Для автоматической установки ChromeDriver
+        _driver_refreshed = True
+        try:
+            path = ChromeDriverManager().install()
+        except Exception as e:
+            if cached is None:
+                raise
+            logging.warning(f"Не удалось обновить ChromeDriver ({e}), используется кэшированный: {cached['path']}")
+            _driver_path = cached["path"]
+            return _driver_path
+        version = chromedriver_version(path)
+        try:
+            _write_driver_cache(cache_file, path, version)
+        except OSError as e:
+            logging.warning(f"Не удалось сохранить кэш ChromeDriver в {cache_file}: {e}")
+        logging.info(f"Найден ChromeDriver {version}: {path}")
+        _driver_path = path
+        return _driver_path
+
+
+def setup_driver(headless=HEADLESS, block_resources=True, profile_dir=PROFILE_DIR):
+    """
+    Настраивает и возвращает экземпляр Selenium WebDriver с заданными параметрами.
+
+    По умолчанию используется облегчённый профиль: браузер без окна, стратегия загрузки eager,
+    блокировка картинок, видео, шрифтов и счётчиков через DevTools и тёплый каталог профиля.
+
+    :param headless: Запускать браузер без окна.
+    :param block_resources: Блокировать тяжёлые ресурсы (BLOCKED_URL_PATTERNS).
+    :param profile_dir: Каталог профилей Chrome (None - временный профиль, как раньше).
+    """
+    from selenium import webdriver  # Для работы с браузером через Selenium
+    from selenium.webdriver.chrome.service import Service  # Для управления службой ChromeDriver
+    from selenium.common.exceptions import SessionNotCreatedException
+
+    logging.info("Настройка веб-драйвера.")
+    options = webdriver.ChromeOptions()  # Создание объекта с опциями для Chrome
+    if headless:
+        options.add_argument("--headless=new")  # Запуск без окна
+        options.add_argument(f"--window-size={WINDOW_SIZE}")
+    else:
+        options.add_argument("--start-maximized")  # Запуск браузера в максимизированном режиме
+    options.add_argument("--disable-blink-features=AutomationControlled")  # Отключение автоматического управления
+    options.add_argument(f"user-agent={USER_AGENT}")  # Установка пользовательского агента
+    options.page_load_strategy = PAGE_LOAD_STRATEGY
+    options.add_argument("--disable-extensions")
+    options.add_argument("--no-first-run")
+    options.add_argument("--mute-audio")
+    if block_resources:
+        options.add_argument("--blink-settings=imagesEnabled=false")  # Картинки не декодируются и не отрисовываются
+    profile = None
+    if profile_dir:
+        profile = _acquire_profile(profile_dir)
+        # Chrome блокирует профиль, поэтому у каждого одновременно работающего браузера свой каталог
+        options.add_argument(f"--user-data-dir={profile}")
+
+    try:
+        try:
+            driver = webdriver.Chrome(service=Service(resolve_chromedriver()), options=options)  # Инициализация драйвера
+        except SessionNotCreatedException as e:
+            # Chrome обновился, и кэшированный драйвер ему не подходит: ищем подходящий заново
+            logging.warning(f"ChromeDriver не подошёл к установленному Chrome: {e}")
+            driver = webdriver.Chrome(service=Service(resolve_chromedriver(refresh=True)), options=options)
+    except Exception:
+        if profile is not None:
+            _release_profile(profile)
+        raise
+    driver.wb_profile_dir = profile
+    if block_resources:
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+        except Exception as e:
+            logging.warning(f"Не удалось включить блокировку ресурсов: {e}")
+    return instrument_driver(driver)  # Возврат драйвера, запросы которого учитываются в метриках
+
+
+def is_driver_alive(driver):
+    """Проверяет, что браузер и сессия WebDriver всё ещё отвечают."""
+    try:
+        driver.execute_script("return 1")
+        return True
+    except Exception:
+        return False
+
+
+def quit_driver(driver):
+    """Закрывает драйвер, не выбрасывая исключений (браузер мог уже упасть)."""
+    try:
+        driver.quit()
+    except Exception as e:
+        logging.warning(f"Ошибка при закрытии драйвера: {e}")
+    finally:
+        profile = getattr(driver, "wb_profile_dir", None)
+        if profile is not None:
+            _release_profile(profile)
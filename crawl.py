@@ -0,0 +1,404 @@
+import os  # Для работы с операционной системой
+import time  # Для работы с временем
+import logging  # Для ведения логов
+import functools  # Для настройки фабрики драйверов
+
+from products import get_product_data, save_product_data_to_parquet, get_product_writer, read_product_articles, \
+    iter_product_listing, parse_article_from_url, read_listing_page, listing_page_url
+from reviews import save_review_data_to_parquet, download_images_from_reviews, open_reviews_section, \
+    iter_reviews_with_photos
+from storage import close_parquet_writers, flush_parquet_writers
+from browser import setup_driver, quit_driver, is_driver_alive
+from driver_pool import DriverPool
+from pipeline import Pipeline, QUEUE_SIZE
+from image_store import ImageStore
+from preprocess import preprocess_images
+from dedup import find_duplicates
+from metrics import MetricsExporter, card as metrics_card
+from journal import CrawlJournal, MAX_CARD_ATTEMPTS
+from work_queue import WorkQueue, LeaseKeeper, TASK_CATEGORY, TASK_PAGE, TASK_CARD
+from article_index import ArticleIndex
+from rate_limit import RATE_LIMITER
+from snapshots import SnapshotArchive, capture, encode_snapshot
+
+# Обход каталога в браузере (команды crawl и work).
+#
+# main загружает этот модуль только для этих команд: вместе с ним импортируются модули разбора
+# страниц, pyarrow и при запуске браузера selenium, которые не нужны командам без браузера.
+
+REVIEW_BATCH_SIZE = 20  # Сколько отзывов передавать этапу записи одной порцией
+POLL_SECONDS = 5.0  # Как часто рабочий проверяет очередь, когда готовых задач нет
+
+
+def mark_card_saved(journal, article_index, url, article):
+    """Отмечает карточку обработанной в журнале (или очереди) и индексе артикулов."""
+    journal.mark_card_done(url, article)
+    if article_index is not None:
+        article_index.mark_scraped(parse_article_from_url(url) or article)
+
+
+def iter_card_urls(journal, article_index, product_parquet_file, categories, incremental=False,
+                   driver_factory=setup_driver, max_pages=None):
+    """
+    Источник конвейера: ссылки на карточки по мере их обнаружения.
+
+    Сначала выдаются необработанные карточки из журнала, затем каталог каждой категории, сбор ссылок
+    которой ещё не завершён, открывается, и ссылки каждой страницы сразу передаются на обработку.
+    В инкрементальном режиме каталог открывается заново всегда, а отобранные индексом карточки
+    возвращаются в очередь журнала, даже если уже были обработаны.
+    """
+    for url in journal.pending_cards():
+        yield url
+    if not incremental:
+        categories = [category for category in categories if not journal.stage_done(f"links:{category}")]
+    if not categories:
+        return
+
+    product_dir = os.path.dirname(product_parquet_file)
+    saved_articles = read_product_articles(product_dir)
+    if saved_articles:
+        article_index.seed(saved_articles, os.path.getmtime(product_dir))
+    driver = driver_factory()  # Отдельный браузер для обхода каталога
+    try:
+        for category in categories:
+            logging.info(f"Начало сбора ссылок на карточки товаров: {category}")
+            found = skipped = 0
+            for page_entries in iter_product_listing(driver, category, max_pages):
+                cards_to_fetch, page_skipped = select_cards(article_index, page_entries, incremental)
+                new_urls = journal.add_links(cards_to_fetch, requeue_done=incremental)
+                found += len(new_urls)
+                skipped += page_skipped
+                yield from new_urls
+            journal.set_stage(f"links:{category}")
+            if incremental:
+                logging.info(f"Собрано {found} новых ссылок на карточки товаров, пропущено {skipped} неизменившихся.")
+            else:
+                logging.info(f"Собрано {found} новых ссылок на карточки товаров.")
+    finally:
+        quit_driver(driver)
+
+
+def select_cards(article_index, page_entries, incremental=False):
+    """
+    Возвращает ссылки на карточки страницы каталога, которые нужно открыть.
+
+    В инкрементальном режиме карточки отбирает индекс артикулов, при полном обходе открываются все,
+    а индекс только запоминает данные каталога для следующего инкрементального обхода.
+
+    :return: tuple: (список ссылок для сбора, количество пропущенных карточек).
+    """
+    if incremental:
+        return article_index.select_for_fetch(page_entries)
+    article_index.record_listing(page_entries)
+    return [entry["url"] for entry in page_entries], 0
+
+
+def iter_queue_cards(work_queue, article_index, incremental=False, driver_factory=setup_driver, max_pages=None,
+                     wait=False, poll_seconds=POLL_SECONDS):
+    """
+    Источник конвейера рабочего: задачи из общей очереди.
+
+    Задачи карточек передаются дальше по конвейеру (их завершение отмечают этапы конвейера),
+    задачи категорий и страниц каталога выполняются здесь же в отдельном браузере:
+    страница добавляет в очередь свои карточки и следующую страницу.
+    Источник завершается, когда в очереди не осталось невыполненных задач (или ждёт новых, если wait).
+    """
+    driver = None
+    try:
+        while True:
+            task = work_queue.lease()
+            if task is None:
+                if work_queue.is_idle() and not wait:
+                    return
+                # Карточки отмечаются выполненными только после сброса товаров на диск:
+                # без сброса последние задачи остались бы арендованными, а очередь - не пустой
+                flush_parquet_writers()
+                time.sleep(poll_seconds)
+                continue
+            if task.kind == TASK_CARD:
+                yield task.url
+                continue
+
+            try:
+                if task.kind == TASK_CATEGORY:
+                    work_queue.enqueue(TASK_PAGE, listing_page_url(task.url, 1), {"category": task.url, "page": 1},
+                                       requeue_done=True)
+                elif task.kind == TASK_PAGE:
+                    category, page_number = task.payload["category"], task.payload["page"]
+                    if driver is None:
+                        driver = driver_factory()
+                    page_entries, has_next = read_listing_page(driver, category, page_number)
+                    cards_to_fetch, skipped = select_cards(article_index, page_entries, incremental)
+                    new_urls = work_queue.enqueue(TASK_CARD, cards_to_fetch, requeue_done=incremental)
+                    logging.info("Страница %d (%s): в очередь добавлено %d карточек, пропущено %d.",
+                                 page_number, category, len(new_urls), skipped)
+                    if has_next and (max_pages is None or page_number < max_pages):
+                        work_queue.enqueue(TASK_PAGE, listing_page_url(category, page_number + 1),
+                                           {"category": category, "page": page_number + 1}, requeue_done=True)
+                work_queue.complete(task.id)
+            except Exception as e:
+                logging.error(f"Ошибка при выполнении задачи {task}: {e}")
+                work_queue.fail(task.id, e)
+                if driver is not None and not is_driver_alive(driver):
+                    quit_driver(driver)
+                    driver = None
+    finally:
+        if driver is not None:
+            quit_driver(driver)
+
+
+def scrape_card_stage(pool, journal, snapshots=False):
+    """
+    Этап конвейера "карточки": открывает карточку в браузере текущего потока и по мере чтения
+    выдаёт ("product", url, product_data), порции ("reviews", url, article, batch) и ("done", url, article).
+    Если обработка карточки прервалась ошибкой, перед исключением выдаётся ("failed", url).
+
+    :param snapshots: Перед "done" выдавать ("snapshot", url, article, block) - сжатый HTML карточки
+                      для архива снимков (сжатие выполняется здесь, в потоке браузера).
+    """
+    def handle(url):
+        with metrics_card():
+            yield from scrape_card(url)
+
+    def scrape_card(url):
+        try:
+            driver = pool.local_driver()
+            snapshot = {} if snapshots else None
+            product_data = get_product_data(driver, url, snapshot=snapshot)
+            if product_data.is_empty():
+                raise RuntimeError("не удалось извлечь ни одного поля товара")
+            yield ("product", url, product_data)
+
+            article = product_data.product_article
+            if open_reviews_section(driver):
+                batch = []
+                for review_data in iter_reviews_with_photos(driver):
+                    batch.append(review_data)
+                    if len(batch) >= REVIEW_BATCH_SIZE:
+                        yield ("reviews", url, article, batch)
+                        batch = []
+                if batch:
+                    yield ("reviews", url, article, batch)
+                capture(snapshot, "reviews", lambda: driver.page_source)
+            if snapshot is not None:
+                yield ("snapshot", url, article, encode_snapshot(url, snapshot))
+            yield ("done", url, article)
+        except Exception as e:
+            journal.mark_card_failed(url, e)
+            pool.discard_local_driver_if_dead()
+            yield ("failed", url)
+            raise
+    return handle
+
+
+def persist_stage(journal, article_index, product_parquet_file, review_parquet_file, archive=None):
+    """
+    Этап конвейера "запись": сохраняет товары и отзывы в Parquet, снимки страниц в архив `archive`,
+    отмечает карточки в журнале и передаёт ссылки на фотографии этапу скачивания.
+
+    Данные карточки копятся до "done" и записываются вместе, поэтому карточка, обработка которой
+    прервалась ошибкой или аварийным завершением, не оставляет частичных строк, и повторная попытка
+    не записывает их второй раз. Отзывы товара записываются одним файлом-частью, заменяющим отзывы
+    из прошлых обходов. Товары пишутся буфером, поэтому карточка отмечается обработанной только после
+    сброса буфера с её товаром (см. BufferedParquetWriter.when_flushed).
+    """
+    product_writer = get_product_writer(product_parquet_file)
+    cards = {}  # url -> данные карточки, собранные до "done"
+
+    def handle(item):
+        kind, url = item[0], item[1]
+        if kind == "product":
+            cards[url] = {"product": item[2], "reviews": [], "snapshot": None}
+        elif kind == "reviews":
+            cards[url]["reviews"].extend(item[3])
+        elif kind == "snapshot":
+            cards[url]["snapshot"] = item[3]
+        elif kind == "failed":
+            cards.pop(url, None)
+        elif kind == "done":
+            card, article = cards.pop(url), item[2]
+            try:
+                save_product_data_to_parquet(card["product"], product_parquet_file)
+                logging.debug("Данные о товаре сохранены: %s", card["product"].name)
+                save_review_data_to_parquet(card["reviews"], review_parquet_file, article, replace=True)
+                if archive is not None and card["snapshot"] is not None:
+                    archive.append(url, card["snapshot"], article=article)
+            except Exception as e:
+                journal.mark_card_failed(url, e)
+                raise
+            product_writer.when_flushed(functools.partial(mark_card_saved, journal, article_index, url, article),
+                                        on_error=functools.partial(journal.mark_card_failed, url))
+            photo_urls = [photo_url for review_data in card["reviews"] for photo_url in review_data.photo_urls]
+            if photo_urls:
+                yield photo_urls
+    return handle
+
+
+def download_stage(image_store):
+    """Этап конвейера "изображения" (последний): скачивает фотографии порции отзывов в хранилище."""
+    def handle(photo_urls):
+        image_store.download(photo_urls)
+    return handle
+
+
+def run_crawl_pipeline(source, pool, journal, article_index, image_store, product_parquet_file,
+                       review_parquet_file, workers, archive=None):
+    """
+    Запускает конвейер обхода: карточки (N браузеров) -> запись в Parquet -> скачивание изображений.
+    Этапы связаны ограниченными очередями, поэтому скачивание и запись идут одновременно со сбором.
+
+    :param archive: SnapshotArchive для снимков страниц (None - снимки не сохраняются).
+    """
+    pipeline = Pipeline(queue_size=QUEUE_SIZE)
+    pipeline.add_stage("cards", scrape_card_stage(pool, journal, snapshots=archive is not None), workers=workers,
+                       queue_size=workers)
+    pipeline.add_stage("persist", persist_stage(journal, article_index, product_parquet_file, review_parquet_file,
+                                                archive))
+    pipeline.add_stage("images", download_stage(image_store))
+    result = pipeline.run(source)
+    rates = ", ".join(f"{name} {rate:.2f}/с" for name, rate in RATE_LIMITER.rates().items())
+    logging.info(f"Скорость запросов к сайту в конце обхода: {rates or 'не ограничивалась'}.")
+    return result
+
+
+def open_snapshot_archive(args, paths):
+    """Открывает архив снимков страниц рабочего или возвращает None, если снимки отключены."""
+    if args.no_snapshots:
+        return None
+    archive = SnapshotArchive(paths.snapshots)
+    logging.info(f"Снимки страниц сохраняются в {paths.snapshots}.")
+    return archive
+
+
+def make_driver_factory(args):
+    """Фабрика браузеров с параметрами из командной строки."""
+    return functools.partial(setup_driver, headless=not args.headful, block_resources=not args.load_all_resources,
+                             profile_dir=args.profile_dir or None)
+
+
+def postprocess(paths, journal=None):
+    """
+    Завершающие этапы после обхода: докачивает изображения из всех наборов отзывов,
+    ищет почти одинаковые фотографии и собирает шарды для обучения.
+    """
+    # Итоговая проверка: изображения, не скачанные конвейером (например, в прошлых запусках)
+    logging.info("Проверка скачанных изображений из отзывов.")
+    if not os.path.exists(paths.reviews_dir):
+        logging.warning(f"Набор отзывов {paths.reviews_dir} не найден. Пропуск скачивания изображений.")
+        return
+    summary = download_images_from_reviews(paths.reviews_dir, paths.images)
+    if journal is not None:
+        journal.set_stage("images")
+    logging.info(f"Изображения скачаны в директорию {paths.images}: {summary}")
+
+    # Поиск почти одинаковых фотографий (повторные публикации, одинаковые фото товара)
+    find_duplicates(paths.images)
+    if journal is not None:
+        journal.set_stage("dedup")
+
+    # Упаковка изображений в шарды фиксированного размера для обучения
+    preprocess_images(paths.reviews_dir, paths.images, paths.shards)
+    if journal is not None:
+        journal.set_stage("shards")
+
+
+def log_incremental_summary(args, article_index):
+    """Сообщает итог инкрементального обхода: сколько карточек отобрано и сколько пропущено."""
+    if args.incremental:
+        logging.info(f"Инкрементальный обход: к сбору {article_index.selected} карточек, "
+                     f"пропущено {article_index.skipped} неизменившихся.")
+
+
+def run_crawl(args, paths):
+    """Команда crawl: обход заданных категорий одним процессом с журналом для продолжения."""
+    os.makedirs(args.data_dir, exist_ok=True)
+    if args.fresh and os.path.exists(paths.journal):
+        os.remove(paths.journal)
+    journal = CrawlJournal(paths.journal)
+    exporter = MetricsExporter(paths.metrics, format=args.metrics_format).start()
+    article_index = ArticleIndex(paths.index, ttl_hours=args.ttl_hours)
+
+    try:
+        if journal.stats():
+            # Продолжение прерванного обхода: проверяем, что "готовые" карточки действительно сохранены
+            journal.reconcile(read_product_articles(os.path.dirname(paths.products)))
+            logging.info(f"Продолжение обхода по журналу {paths.journal}: {journal.stats()}")
+
+        # Конвейер: сбор ссылок, обработка карточек, запись и скачивание изображений идут одновременно
+        driver_factory = make_driver_factory(args)
+        pool = DriverPool(driver_factory=driver_factory)
+        image_store = ImageStore(paths.images)
+        archive = open_snapshot_archive(args, paths)
+        try:
+            run_crawl_pipeline(iter_card_urls(journal, article_index, paths.products, args.category,
+                                              args.incremental, driver_factory, args.max_pages),
+                               pool, journal, article_index, image_store, paths.products, paths.reviews,
+                               args.workers, archive)
+
+            # Повторная попытка для карточек, обработка которых завершилась ошибкой
+            failed_cards = journal.failed_cards(MAX_CARD_ATTEMPTS)
+            if failed_cards:
+                logging.info(f"Повторная обработка {len(failed_cards)} карточек с ошибками.")
+                run_crawl_pipeline(failed_cards, pool, journal, article_index, image_store, paths.products,
+                                   paths.reviews, args.workers, archive)
+        finally:
+            pool.close()
+            image_store.close()
+            if archive is not None:
+                archive.close()
+
+        # Дописываем буферы в файлы (и отмечаем их карточки) перед чтением отзывов
+        close_parquet_writers()
+        logging.info(f"Состояние карточек: {journal.stats()}")
+        log_incremental_summary(args, article_index)
+        postprocess(paths, journal)
+    finally:
+        close_parquet_writers()
+        journal.close()
+        article_index.close()
+        exporter.close()
+
+
+def run_work(args, paths):
+    """
+    Команда work: рабочий процесс общей очереди.
+
+    Рабочих можно запускать сколько угодно (в том числе на разных хостах с общим каталогом данных);
+    каждый пишет товары и отзывы в свою секцию, а задачи упавшего рабочего после истечения аренды
+    достаются остальным.
+    """
+    work_queue = WorkQueue(paths.queue, paths.worker_id)
+    logging.info(f"Рабочий {work_queue.worker_id}: товары в {paths.products}, отзывы в {paths.reviews}.")
+    exporter = MetricsExporter(paths.metrics, format=args.metrics_format).start()
+    article_index = ArticleIndex(paths.index, ttl_hours=args.ttl_hours)
+    lease_keeper = LeaseKeeper(work_queue).start()
+    driver_factory = make_driver_factory(args)
+    pool = DriverPool(driver_factory=driver_factory)
+    image_store = ImageStore(paths.images)
+    archive = open_snapshot_archive(args, paths)
+    try:
+        if os.path.exists(paths.products_dir):
+            article_index.seed(read_product_articles(paths.products_dir))
+        run_crawl_pipeline(iter_queue_cards(work_queue, article_index, args.incremental, driver_factory,
+                                            args.max_pages, args.wait),
+                           pool, work_queue, article_index, image_store, paths.products, paths.reviews,
+                           args.workers, archive)
+        close_parquet_writers()
+        logging.info(f"Очередь пуста: {work_queue.stats()}")
+        log_incremental_summary(args, article_index)
+        if args.postprocess:
+            postprocess(paths)
+    finally:
+        pool.close()
+        image_store.close()
+        if archive is not None:
+            archive.close()
+        close_parquet_writers()
+        lease_keeper.close()
+        # Незавершённые задачи (например, при остановке по сигналу) сразу возвращаются в очередь
+        released = work_queue.release()
+        if released:
+            logging.info(f"В очередь возвращено {released} незавершённых задач.")
+        work_queue.close()
+        article_index.close()
+        exporter.close()
@@ -0,0 +1,229 @@
+import os  # Для работы с операционной системой
+import logging  # Для ведения логов
+from concurrent.futures import ProcessPoolExecutor  # Для вычисления хешей в нескольких процессах
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from PIL import Image
+
+from image_store import ImageStore
+
+HASH_WORKERS = os.cpu_count() or 1  # Количество процессов для вычисления хешей
+HASH_BLOCK_SIZE = 4096  # Сколько файлов отдавать пулу процессов за раз
+PHASH_SIZE = 32  # Сторона уменьшенного изображения для pHash
+PHASH_LOW_FREQUENCIES = 8  # Сторона блока низких частот DCT (8x8 = 64 бита)
+PHASH_THRESHOLD = 6  # Максимальное расстояние Хэмминга между pHash дубликатов
+DHASH_THRESHOLD = 10  # Максимальное расстояние Хэмминга между dHash дубликатов
+PAIR_BLOCK_SIZE = 2048  # Размер блока при попарном сравнении внутри одной корзины
+MAX_BUCKET_SIZE = 20000  # Корзины полосы больше этого размера не сравниваются попарно (см. find_duplicate_clusters)
+DUPLICATES_FILE = "duplicates.parquet"  # Файл кластеров дубликатов внутри каталога хранилища
+
+DUPLICATES_SCHEMA = pa.schema([
+    ("cluster", pa.int32()),
+    ("content_hash", pa.string()),
+    ("phash", pa.uint64()),
+])
+
+
+def _dct_matrix(size):
+    """Матрица DCT-II: dct(x) = C @ x для вектора длины size."""
+    n = np.arange(size)
+    matrix = np.cos(np.pi / size * (n[None, :] + 0.5) * n[:, None])
+    matrix[0] *= 1 / np.sqrt(2)
+    return matrix * np.sqrt(2 / size)
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+_BIT_WEIGHTS = np.uint64(1) << np.arange(64, dtype=np.uint64)
+
+
+def _pack_bits(bits):
+    """Упаковывает 64 логических значения в одно uint64."""
+    return int(np.bitwise_or.reduce(_BIT_WEIGHTS[bits.ravel()]))
+
+
+def perceptual_hashes(path):
+    """
+    Вычисляет pHash (знаки низких частот DCT относительно медианы) и dHash (знаки горизонтальных
+    разностей яркости) изображения.
+
+    :return: tuple: (phash, dhash) - 64-битные беззнаковые целые.
+    """
+    with Image.open(path) as image:
+        gray = image.convert("L")
+        small = np.asarray(gray.resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.LANCZOS), dtype=np.float64)
+        dct = (_DCT @ small @ _DCT.T)[:PHASH_LOW_FREQUENCIES, :PHASH_LOW_FREQUENCIES]
+        phash = _pack_bits(dct > np.median(dct))
+        pixels = np.asarray(gray.resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+        dhash = _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+    return phash, dhash
+
+
+def _to_signed(value):
+    """uint64 -> int64 для хранения в SQLite."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _hash_job(job):
+    content_hash, path = job
+    try:
+        phash, dhash = perceptual_hashes(path)
+        return content_hash, _to_signed(phash), _to_signed(dhash), None
+    except Exception as e:
+        return content_hash, None, None, str(e)
+
+
+def compute_perceptual_hashes(store, workers=HASH_WORKERS):
+    """
+    Вычисляет перцептивные хеши для файлов хранилища, у которых их ещё нет, и сохраняет в индекс.
+
+    :return: Количество обработанных файлов.
+    """
+    hashed = store.hashed_contents()
+    jobs = [(content_hash, path) for content_hash, path in store.content_files() if content_hash not in hashed]
+    logging.info(f"Перцептивные хеши: к вычислению {len(jobs)} файлов, уже посчитано {len(hashed)}.")
+    if not jobs:
+        return 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(jobs), HASH_BLOCK_SIZE):
+            block = jobs[start:start + HASH_BLOCK_SIZE]
+            rows = list(executor.map(_hash_job, block, chunksize=max(1, len(block) // (workers * 4))))
+            store.save_perceptual_hashes(rows)
+            errors = sum(1 for row in rows if row[3] is not None)
+            logging.info(f"Перцептивные хеши: обработано {start + len(block)} из {len(jobs)}, ошибок {errors}.")
+    return len(jobs)
+
+
+def hamming_distance(left, right):
+    """Векторизованное расстояние Хэмминга между массивами uint64 (np.bitwise_count требует numpy 2)."""
+    return np.bitwise_count(np.bitwise_xor(left, right))
+
+
+def _band_masks(bands):
+    """Разбивает 64 бита на `bands` непересекающихся полос: возвращает (сдвиг, маска) для каждой."""
+    bounds = np.linspace(0, 64, bands + 1).astype(int)
+    return [(int(low), (1 << int(high - low)) - 1) for low, high in zip(bounds[:-1], bounds[1:])]
+
+
+class _DisjointSet:
+    """
+    Система непересекающихся множеств над индексами 0..n-1 с векторизованными операциями.
+
+    Корень множества - его наименьший индекс: родитель всегда меньше потомка, поэтому циклов нет.
+    """
+
+    def __init__(self, size):
+        self.parent = np.arange(size)
+
+    def find(self, items):
+        """Корни элементов массива `items` (со сжатием путей)."""
+        roots = self.parent[items]
+        while True:
+            grandparents = self.parent[roots]
+            if np.array_equal(grandparents, roots):
+                break
+            roots = grandparents
+        self.parent[items] = roots
+        return roots
+
+    def union(self, left, right):
+        """Объединяет множества пар (left[k], right[k]) массивов индексов."""
+        while len(left):
+            left, right = self.find(left), self.find(right)
+            differ = left != right
+            left, right = left[differ], right[differ]
+            # Больший корень подвешивается к наименьшему из связанных с ним; оставшиеся пары - на следующем шаге
+            np.minimum.at(self.parent, np.maximum(left, right), np.minimum(left, right))
+
+
+def find_duplicate_clusters(phashes, dhashes=None, phash_threshold=PHASH_THRESHOLD,
+                            dhash_threshold=DHASH_THRESHOLD):
+    """
+    Находит кластеры почти одинаковых изображений без перебора всех пар.
+
+    Используется многоиндексное хеширование: 64 бита pHash делятся на phash_threshold + 1 полос,
+    и у двух хешей с расстоянием не больше порога хотя бы одна полоса совпадает (принцип Дирихле).
+    Пары сравниваются только внутри корзин с одинаковой полосой, векторизованно; если переданы dHash,
+    пара считается дубликатом, только когда близки оба хеша.
+
+    Точные совпадения хешей (например, тысячи одинаковых заглушек) объединяются заранее, и в корзины
+    попадает по одному представителю. Ограничение: корзина, в которой и после этого больше MAX_BUCKET_SIZE
+    различных хешей, попарно не сравнивается (это квадратичная работа) - об этом пишется предупреждение.
+    Её пары ещё могут найтись по другим полосам, но полнота поиска для них не гарантируется.
+
+    :param phashes: Массив uint64.
+    :param dhashes: Массив uint64 той же длины или None.
+    :return: Список кластеров - массивов индексов (только кластеры из двух и более элементов).
+    """
+    phashes = np.asarray(phashes, dtype=np.uint64)
+    dhashes = None if dhashes is None else np.asarray(dhashes, dtype=np.uint64)
+    if not len(phashes):
+        return []
+    clusters = _DisjointSet(len(phashes))
+
+    # Одинаковые хеши сразу попадают в один кластер, дальше сравниваются только их представители
+    keys = phashes[:, None] if dhashes is None else np.stack([phashes, dhashes], axis=1)
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    clusters.union(np.arange(len(phashes)), first[inverse.ravel()])
+    candidates = np.sort(first)
+
+    oversized = 0
+    for shift, mask in _band_masks(phash_threshold + 1):
+        band = (phashes[candidates] >> np.uint64(shift)) & np.uint64(mask)
+        order = candidates[np.argsort(band, kind="stable")]
+        boundaries = np.flatnonzero(np.diff(np.sort(band))) + 1
+        for bucket in np.split(order, boundaries):
+            if len(bucket) < 2:
+                continue
+            if len(bucket) > MAX_BUCKET_SIZE:
+                oversized += 1
+                continue
+            for start in range(0, len(bucket), PAIR_BLOCK_SIZE):
+                rows = bucket[start:start + PAIR_BLOCK_SIZE]
+                columns = bucket[start:]  # Только пары (i, j) с j не раньше i в корзине
+                close = hamming_distance(phashes[rows, None], phashes[None, columns]) <= phash_threshold
+                if dhashes is not None:
+                    close &= hamming_distance(dhashes[rows, None], dhashes[None, columns]) <= dhash_threshold
+                row_positions, column_positions = np.nonzero(close)
+                later = column_positions > row_positions  # Пара с собой и пары ниже диагонали не нужны
+                clusters.union(rows[row_positions[later]], columns[column_positions[later]])
+    if oversized:
+        logging.warning(f"Дубликаты: {oversized} корзин больше {MAX_BUCKET_SIZE} хешей не сравнивались попарно.")
+
+    roots = clusters.find(np.arange(len(phashes)))
+    order = np.argsort(roots, kind="stable")
+    groups = np.split(order, np.flatnonzero(np.diff(roots[order])) + 1)
+    return [group for group in groups if len(group) > 1]
+
+
+def find_duplicates(image_dir, workers=HASH_WORKERS, phash_threshold=PHASH_THRESHOLD,
+                    dhash_threshold=DHASH_THRESHOLD):
+    """
+    Вычисляет недостающие перцептивные хеши в хранилище и записывает кластеры дубликатов
+    в `<image_dir>/duplicates.parquet` (номер кластера, content_hash, pHash).
+
+    :return: Список кластеров - списков content_hash.
+    """
+    with ImageStore(image_dir) as store:
+        compute_perceptual_hashes(store, workers)
+        rows = store.perceptual_hashes()
+    content_hashes = [row[0] for row in rows]
+    phashes = np.array([row[1] for row in rows], dtype=np.int64).view(np.uint64)
+    dhashes = np.array([row[2] for row in rows], dtype=np.int64).view(np.uint64)
+
+    groups = find_duplicate_clusters(phashes, dhashes, phash_threshold, dhash_threshold)
+    clusters = [[content_hashes[index] for index in group] for group in groups]
+    members = np.concatenate(groups) if groups else np.array([], dtype=np.int64)
+    table = pa.table({
+        "cluster": pa.array(np.repeat(np.arange(len(groups)), [len(group) for group in groups]), pa.int32()),
+        "content_hash": pa.array([content_hashes[index] for index in members], pa.string()),
+        "phash": pa.array(phashes[members], pa.uint64()),
+    }, schema=DUPLICATES_SCHEMA)
+    path = os.path.join(image_dir, DUPLICATES_FILE)
+    pq.write_table(table, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+    duplicates = sum(len(cluster) - 1 for cluster in clusters)
+    logging.info(f"Найдено {len(clusters)} кластеров почти одинаковых изображений, лишних копий: {duplicates}.")
+    return clusters
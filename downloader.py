@@ -0,0 +1,202 @@
+import os  # Для работы с операционной системой
+import time  # Для работы с временем
+import random  # Для генерации случайных чисел
+import logging  # Для ведения логов
+import threading  # Для сессий, привязанных к потокам
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED  # Для параллельного скачивания
+from dataclasses import dataclass, field
+
+from rate_limit import RATE_LIMITER, THROTTLE_STATUSES, retry_after_seconds
+
+# Параметры скачивания по умолчанию
+MAX_WORKERS = 8  # Количество одновременных загрузок
+CHUNK_SIZE = 64 * 1024  # Размер блока при потоковой записи на диск, байт
+REQUEST_TIMEOUT = (5, 30)  # Таймауты (соединение, чтение), секунд
+MAX_RETRIES = 3  # Количество повторных попыток после первой неудачи
+BACKOFF_BASE = 0.5  # Базовая задержка экспоненциального ожидания, секунд
+RETRY_STATUSES = {429, 500, 502, 503, 504}  # Коды ответа, после которых имеет смысл повторить запрос
+IN_FLIGHT_PER_WORKER = 4  # Сколько заданий на поток одновременно поставлено в пул
+
+# requests загружается при первом скачивании: модуль импортируется и командами, которые ничего не скачивают
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/85.0.4183.83 Safari/537.36"
+
+
+@dataclass
+class DownloadSummary:
+    """Итог работы загрузчика."""
+    ok: int = 0  # Успешно скачанные файлы
+    failed: int = 0  # Файлы, которые не удалось скачать
+    skipped: int = 0  # Файлы, пропущенные без обращения к сети (уже скачаны)
+    bytes: int = 0  # Общий объём скачанных данных
+    seconds: float = 0.0  # Время работы
+    errors: dict = field(default_factory=dict)  # URL -> текст последней ошибки
+
+    @property
+    def throughput(self):
+        """Скорость скачивания, байт в секунду."""
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"скачано {self.ok}, ошибок {self.failed}, пропущено {self.skipped}, "
+                f"{self.bytes / 1024 / 1024:.1f} МБ за {self.seconds:.1f} с ({self.throughput / 1024 / 1024:.2f} МБ/с)")
+
+
+class RetryableError(Exception):
+    """Ошибка, после которой запрос стоит повторить (например, ответ 502)."""
+
+
+class ThrottledError(RetryableError):
+    """Сервер просит снизить частоту запросов (429/503): паузу перед повтором назначает планировщик."""
+
+
+class ImageDownloader:
+    """
+    Параллельный загрузчик файлов.
+
+    Каждый поток использует собственную requests.Session с пулом keep-alive соединений,
+    тело ответа пишется на диск блоками через временный файл, неудачные запросы
+    повторяются с экспоненциальной задержкой. Если от прошлого запуска остался
+    недокачанный файл `<path>.part`, загрузка продолжается с его конца (заголовок Range).
+    Частоту запросов к каждому хосту задаёт планировщик `rate_limiter` (общий с браузерами).
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, chunk_size=CHUNK_SIZE, timeout=REQUEST_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, user_agent=USER_AGENT,
+                 rate_limiter=RATE_LIMITER):
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.user_agent = user_agent
+        self.rate_limiter = rate_limiter
+        self._local = threading.local()
+
+    def _session(self):
+        """Возвращает сессию текущего потока, создавая её при первом обращении."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests  # Для выполнения HTTP-запросов
+            from requests.adapters import HTTPAdapter  # Для пула keep-alive соединений
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = self.user_agent
+            self._local.session = session
+        return session
+
+    def fetch(self, url, path):
+        """
+        Скачивает один файл с повторными попытками.
+
+        :param url: Адрес файла.
+        :param path: Путь, по которому нужно сохранить файл.
+        :return: Количество байт, полученных по сети.
+        """
+        import requests
+        attempt = 0
+        while True:
+            try:
+                return self._fetch_once(url, path)
+            except ThrottledError as e:
+                # Ожидание перед повтором выполнит планировщик в следующем acquire
+                if attempt >= self.max_retries:
+                    raise
+                logging.warning("Повтор скачивания %s после паузы планировщика: %s", url, e)
+                attempt += 1
+            except (requests.ConnectionError, requests.Timeout, RetryableError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_base * (2 ** attempt) * random.uniform(0.5, 1.5)
+                logging.warning("Повтор скачивания %s через %.1f с: %s", url, delay, e)
+                time.sleep(delay)
+                attempt += 1
+
+    def _fetch_once(self, url, path):
+        import requests
+        tmp_path = f"{path}.part"
+        offset = os.path.getsize(tmp_path) if os.path.exists(tmp_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        self.rate_limiter.acquire(url)
+        started = time.perf_counter()
+        try:
+            response = self._session().get(url, stream=True, timeout=self.timeout, headers=headers)
+        except requests.Timeout:
+            # Таймаут - признак перегрузки сервера: планировщик снижает скорость, как после медленного ответа
+            self.rate_limiter.report(url, time.perf_counter() - started)
+            raise
+        with response:
+            # Время до заголовков ответа: от размера файла не зависит
+            seconds = time.perf_counter() - started
+            if response.status_code in THROTTLE_STATUSES:
+                retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+                self.rate_limiter.report(url, seconds, throttled=True, retry_after=retry_after)
+                raise ThrottledError(f"HTTP {response.status_code}")
+            self.rate_limiter.report(url, seconds)
+            if response.status_code in RETRY_STATUSES:
+                raise RetryableError(f"HTTP {response.status_code}")
+            if response.status_code == 416:
+                # Недокачанный файл не совпадает с ресурсом на сервере: начинаем заново
+                os.remove(tmp_path)
+                raise RetryableError("HTTP 416, докачка невозможна")
+            response.raise_for_status()
+            # 206 - сервер отдал продолжение, иначе файл пришёл целиком
+            mode = "ab" if response.status_code == 206 else "wb"
+            size = 0
+            with open(tmp_path, mode) as file:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    file.write(chunk)
+                    size += len(chunk)
+        os.replace(tmp_path, path)
+        return size
+
+    def download(self, jobs, on_result=None, summary=None):
+        """
+        Скачивает набор файлов в пуле потоков.
+
+        Задания берутся из `jobs` по мере освобождения потоков: в пуле одновременно не больше
+        max_workers * IN_FLIGHT_PER_WORKER заданий, поэтому `jobs` может быть генератором
+        произвольной длины - память не растёт вместе с ним.
+
+        :param jobs: Итерируемый набор пар (url, path); читается в вызывающем потоке.
+        :param on_result: Необязательная функция on_result(url, path, error), вызываемая
+                          в вызывающем потоке после завершения каждого задания (error равен None при успехе).
+        :param summary: DownloadSummary, в который добавляются итоги (по умолчанию создаётся новый).
+        :return: DownloadSummary с итогами.
+        """
+        summary = summary or DownloadSummary()
+        started = time.monotonic()
+        jobs = iter(jobs)
+        limit = self.max_workers * IN_FLIGHT_PER_WORKER
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+
+            def submit():
+                """Ставит в пул следующие задания до заполнения окна."""
+                for url, path in jobs:
+                    futures[executor.submit(self.fetch, url, path)] = (url, path)
+                    if len(futures) >= limit:
+                        return
+
+            submit()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, path = futures.pop(future)
+                    error = None
+                    try:
+                        summary.bytes += future.result()
+                        summary.ok += 1
+                    except Exception as e:
+                        error = e
+                        summary.failed += 1
+                        summary.errors[url] = str(e)
+                        logging.error(f"Ошибка при скачивании {url}: {e}")
+                    if on_result is not None:
+                        on_result(url, path, error)
+                submit()
+        summary.seconds += time.monotonic() - started
+        logging.info(f"Скачивание завершено: {summary}")
+        return summary
@@ -0,0 +1,55 @@
+import logging  # Для ведения логов
+import threading  # Для драйверов рабочих потоков
+
+from browser import setup_driver, is_driver_alive, quit_driver
+
+WORKERS = 2  # Количество браузеров по умолчанию
+
+
+class DriverPool:
+    """
+    Браузеры потоков, параллельно обрабатывающих карточки товаров.
+
+    Потоками управляет этап конвейера: каждый поток при первом обращении получает свой драйвер
+    (local_driver), а если драйвер перестал отвечать, он закрывается и создаётся заново.
+    """
+
+    def __init__(self, driver_factory=setup_driver):
+        self.driver_factory = driver_factory
+        self.restarts = 0  # Количество пересозданных драйверов
+        self._local = threading.local()  # Драйвер текущего потока (см. local_driver)
+        self._drivers = []  # Все драйверы, созданные через local_driver
+        self._drivers_lock = threading.Lock()
+
+    def local_driver(self):
+        """Возвращает драйвер, закреплённый за текущим потоком, создавая его при первом обращении."""
+        driver = getattr(self._local, "driver", None)
+        if driver is None:
+            driver = self.driver_factory()
+            self._local.driver = driver
+            with self._drivers_lock:
+                self._drivers.append(driver)
+        return driver
+
+    def discard_local_driver_if_dead(self):
+        """Закрывает драйвер текущего потока, если он перестал отвечать; следующий вызов local_driver создаст новый."""
+        driver = getattr(self._local, "driver", None)
+        if driver is None or is_driver_alive(driver):
+            return False
+        logging.warning("Поток %s: драйвер не отвечает, перезапуск.", threading.current_thread().name)
+        quit_driver(driver)
+        self._local.driver = None
+        with self._drivers_lock:
+            self._drivers.remove(driver)
+            self.restarts += 1
+        return True
+
+    def close(self):
+        """Закрывает все драйверы, созданные через local_driver."""
+        with self._drivers_lock:
+            drivers = list(self._drivers)
+            self._drivers.clear()
+        for driver in drivers:
+            quit_driver(driver)
+        if self.restarts:
+            logging.info(f"Пул драйверов: перезапусков драйвера {self.restarts}")
@@ -0,0 +1,131 @@
+import re  # Для нормализации пробелов
+import logging  # Для ведения логов
+from lxml import etree, html  # Для разбора HTML без браузера
+
+from products import POPUP_XPATH, PRODUCT_RAW_XPATHS, DESCRIPTION_RAW_XPATHS, description_from_raw, \
+    product_from_raw
+from reviews import REVIEW_ITEMS_XPATH, PHOTO_ITEMS_XPATH, REVIEW_RAW_XPATHS, review_from_raw
+
+# Извлечение данных из сохранённого HTML (driver.page_source) без браузера.
+# Используются те же XPath-выражения, что и в products/reviews, но скомпилированные lxml,
+# поэтому результат совпадает с записями ProductRecord и ReviewRecord из WebDriver-версий.
+# На вход нужен отрисованный DOM (page_source), а не исходный ответ сервера:
+# браузер добавляет, например, элементы tbody, на которые опираются XPath-выражения.
+
+_WHITESPACE = re.compile(r"[ \t\r\f\v]+")
+
+# Скомпилированные XPath-выражения страницы товара
+_POPUP = etree.XPath(POPUP_XPATH)
+_PRODUCT_FIELDS = {key: etree.XPath(xpath) for key, xpath in PRODUCT_RAW_XPATHS.items()}
+_DESCRIPTION_FIELDS = {key: etree.XPath(xpath) for key, xpath in DESCRIPTION_RAW_XPATHS.items()}
+
+# Скомпилированные XPath-выражения раздела отзывов
+_REVIEW_ITEMS = etree.XPath(REVIEW_ITEMS_XPATH)
+_PHOTO_ITEMS = etree.XPath(PHOTO_ITEMS_XPATH)
+_PHOTO_IMG = etree.XPath('.//img')
+_REVIEW_FIELDS = {key: etree.XPath(xpath) for key, xpath in REVIEW_RAW_XPATHS.items()}
+
+
+def parse_html(page_html):
+    """Разбирает HTML-строку (или байты) в дерево lxml."""
+    return html.fromstring(page_html)
+
+
+def element_text(element):
+    """
+    Возвращает текст элемента так же, как WebElement.text:
+    пробелы внутри строк схлопываются, пустые строки отбрасываются.
+    """
+    lines = (_WHITESPACE.sub(" ", line).strip() for line in element.text_content().splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _first_text(xpath, node):
+    """Возвращает текст первого найденного элемента или None."""
+    found = xpath(node)
+    return element_text(found[0]) if found else None
+
+
+def _first_attribute(xpath, node, attribute):
+    """Возвращает атрибут первого найденного элемента или None."""
+    found = xpath(node)
+    return found[0].get(attribute) if found else None
+
+
+def extract_description_data(popup_root):
+    """
+    Извлекает данные всплывающего окна характеристик (аналог products.get_description_data).
+
+    :param popup_root: Дерево lxml страницы с открытым окном или HTML-фрагмент окна.
+    :return: Словарь с найденными полями или None, если окно не найдено.
+    """
+    found = _POPUP(popup_root)
+    if found:
+        char_desc_elem = found[0]
+    elif popup_root.get("class") == "popup__content":
+        char_desc_elem = popup_root  # Передан сам фрагмент окна
+    else:
+        logging.warning("Всплывающее окно не найдено в HTML.")
+        return None
+    raw = {key: _first_text(xpath, char_desc_elem) for key, xpath in _DESCRIPTION_FIELDS.items()}
+    return description_from_raw(raw)
+
+
+def extract_product_data(page_html, popup_html=None):
+    """
+    Извлекает данные о товаре из HTML страницы (аналог products.get_product_data).
+
+    :param page_html: HTML страницы товара.
+    :param popup_html: HTML страницы с открытым окном характеристик (по умолчанию ищется в page_html).
+    :return: ProductRecord.
+    """
+    root = parse_html(page_html)
+    raw = {key: _first_text(xpath, root) for key, xpath in _PRODUCT_FIELDS.items()}
+    popup_root = parse_html(popup_html) if popup_html is not None else root
+    return product_from_raw(raw, extract_description_data(popup_root))
+
+
+def extract_review(review):
+    """
+    Извлекает данные одного отзыва (элемента li списка отзывов).
+
+    :return: ReviewRecord или None, если в отзыве нет фотографий.
+    """
+    photo_srcs = []
+    for photo in _PHOTO_ITEMS(review):
+        src = photo.get("src") or _first_attribute(_PHOTO_IMG, photo, "src")
+        if src:
+            photo_srcs.append(src)
+    if not photo_srcs:
+        return None
+
+    raw = {
+        "photo_srcs": photo_srcs,
+        "date_content": _first_attribute(_REVIEW_FIELDS["date"], review, "content"),
+        "rating_class": _first_attribute(_REVIEW_FIELDS["rating"], review, "class"),
+    }
+    for key in ("author", "pros", "cons", "comments"):
+        raw[key] = _first_text(_REVIEW_FIELDS[key], review)
+    return review_from_raw(raw)
+
+
+def extract_reviews_with_photos(page_html, max_reviews=100):
+    """
+    Извлекает отзывы с фотографиями из HTML раздела отзывов (аналог reviews.get_reviews_with_photos).
+
+    :param page_html: HTML страницы со списком отзывов.
+    :param max_reviews: Максимальное количество отзывов с фотографиями.
+    :return: Список ReviewRecord.
+    """
+    reviews_with_photos = []
+    for index, review in enumerate(_REVIEW_ITEMS(parse_html(page_html))):
+        if len(reviews_with_photos) >= max_reviews:
+            break
+        try:
+            review_data = extract_review(review)
+        except Exception as e:
+            logging.error(f"Ошибка при обработке отзыва {index + 1}: {e}")
+            continue
+        if review_data is not None:
+            reviews_with_photos.append(review_data)
+    return reviews_with_photos
@@ -0,0 +1,254 @@
+import os  # Для работы с операционной системой
+import time  # Для работы с временем
+import hashlib  # Для вычисления хешей URL и содержимого
+import sqlite3  # Для хранения индекса изображений
+import logging  # Для ведения логов
+from itertools import chain, islice  # Для разбиения потока URL на порции
+from urllib.parse import urlparse  # Для определения расширения файла по URL
+
+from downloader import ImageDownloader, DownloadSummary
+
+INDEX_FILE = "images.sqlite"  # Файл индекса внутри каталога хранилища
+INCOMING_DIR = ".incoming"  # Каталог для скачиваемых и недокачанных файлов
+HASH_CHUNK_SIZE = 1024 * 1024  # Размер блока при хешировании файла, байт
+LOOKUP_CHUNK = 500  # Сколько URL проверяется по индексу одним запросом
+
+# Статусы изображений в индексе
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def url_hash(url):
+    """Возвращает хеш URL, по которому называются недокачанные файлы."""
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def file_hash(path):
+    """Возвращает SHA-256 содержимого файла."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageStore:
+    """
+    Хранилище изображений с адресацией по содержимому.
+
+    Файл сохраняется как `<root>/<hash[:2]>/<hash><ext>`, где hash - SHA-256 его байтов,
+    поэтому одна и та же фотография хранится один раз, даже если встречается на разных карточках.
+    Индекс `images.sqlite` сопоставляет URL с хешем, путём, размером и статусом:
+    уже скачанные URL пропускаются без обращения к сети, недокачанные продолжаются с места остановки.
+    """
+
+    def __init__(self, root, downloader=None):
+        self.root = root
+        self.downloader = downloader or ImageDownloader()
+        os.makedirs(os.path.join(root, INCOMING_DIR), exist_ok=True)
+        # Хранилище может использоваться из рабочего потока конвейера (но не из нескольких потоков одновременно);
+        # индекс общий для рабочих процессов очереди задач, поэтому WAL и ожидание блокировки
+        self._connection = sqlite3.connect(os.path.join(root, INDEX_FILE), timeout=30.0, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS images (
+                url TEXT PRIMARY KEY,
+                url_hash TEXT NOT NULL,
+                content_hash TEXT,
+                path TEXT,
+                size INTEGER,
+                status TEXT NOT NULL,
+                error TEXT,
+                updated REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS images_content_hash ON images (content_hash)")
+        # Перцептивные хеши содержимого (см. dedup); 64-битные значения хранятся как знаковые целые SQLite
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS perceptual_hashes (
+                content_hash TEXT PRIMARY KEY,
+                phash INTEGER,
+                dhash INTEGER,
+                error TEXT
+            )
+            """
+        )
+        self._connection.commit()
+
+    def close(self):
+        """Закрывает индекс."""
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def lookup(self, url):
+        """Возвращает запись индекса для URL в виде словаря или None."""
+        return self.lookup_many([url]).get(url)
+
+    def lookup_many(self, urls):
+        """
+        Возвращает записи индекса для порции URL одним запросом.
+
+        :param urls: Список URL (не больше LOOKUP_CHUNK, чтобы не упереться в лимит параметров SQLite).
+        :return: Словарь {url: запись} только для URL, которые есть в индексе.
+        """
+        placeholders = ",".join("?" * len(urls))
+        cursor = self._connection.execute(
+            f"SELECT url, url_hash, content_hash, path, size, status, error FROM images WHERE url IN ({placeholders})",
+            urls,
+        )
+        keys = ("url", "url_hash", "content_hash", "path", "size", "status", "error")
+        return {row[0]: dict(zip(keys, row)) for row in cursor}
+
+    def is_done(self, url):
+        """Проверяет, что URL уже скачан и файл на месте."""
+        entry = self.lookup(url)
+        return (entry is not None and entry["status"] == STATUS_DONE
+                and os.path.exists(os.path.join(self.root, entry["path"])))
+
+    def _incoming_path(self, url):
+        return os.path.join(self.root, INCOMING_DIR, url_hash(url))
+
+    def _update(self, url, status, content_hash=None, path=None, size=None, error=None):
+        self._connection.execute(
+            """
+            INSERT INTO images (url, url_hash, content_hash, path, size, status, error, updated)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                content_hash = excluded.content_hash, path = excluded.path, size = excluded.size,
+                status = excluded.status, error = excluded.error, updated = excluded.updated
+            """,
+            (url, url_hash(url), content_hash, path, size, status, error, time.time()),
+        )
+
+    def add_file(self, url, downloaded_path):
+        """
+        Переносит скачанный файл в хранилище по хешу содержимого и отмечает URL как скачанный.
+
+        :return: Путь к файлу относительно корня хранилища.
+        """
+        content_hash = file_hash(downloaded_path)
+        extension = os.path.splitext(urlparse(url).path)[1] or ".jpg"
+        relative_path = os.path.join(content_hash[:2], f"{content_hash}{extension}")
+        target_path = os.path.join(self.root, relative_path)
+        size = os.path.getsize(downloaded_path)
+        if os.path.exists(target_path):
+            # Такое содержимое уже есть в хранилище: дубликат не сохраняем
+            os.remove(downloaded_path)
+        else:
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            os.replace(downloaded_path, target_path)
+        self._update(url, STATUS_DONE, content_hash, relative_path.replace(os.sep, "/"), size)
+        return relative_path
+
+    def _on_result(self, url, path, error):
+        if error is None:
+            self.add_file(url, path)
+        else:
+            self._update(url, STATUS_FAILED, error=str(error))
+        self._connection.commit()
+
+    def _statuses(self, urls):
+        """Возвращает {url: (status, path, updated)} для URL порции, которые уже есть в индексе."""
+        placeholders = ",".join("?" * len(urls))
+        cursor = self._connection.execute(
+            f"SELECT url, status, path, updated FROM images WHERE url IN ({placeholders})", urls
+        )
+        return {url: (status, path, updated) for url, status, path, updated in cursor}
+
+    def iter_jobs(self, urls, summary, since, chunk_size=LOOKUP_CHUNK):
+        """
+        Генератор заданий (url, путь во входящем каталоге) для URL, которых ещё нет в хранилище.
+
+        URL проверяются по индексу порциями по `chunk_size`, и каждая порция отмечается в индексе
+        как pending до того, как задания уйдут загрузчику. Поэтому повтор URL в следующих порциях
+        отсеивается по индексу (запись обновлена не раньше `since`), а не множеством в памяти.
+
+        :param urls: Итерируемый набор URL (повторы допускаются).
+        :param summary: DownloadSummary, в котором считаются URL, уже имеющиеся в хранилище.
+        :param since: Момент начала скачивания (time.time()).
+        """
+        urls = iter(urls)
+        while True:
+            chunk = list(dict.fromkeys(islice(urls, chunk_size)))
+            if not chunk:
+                return
+            known = self._statuses(chunk)
+            jobs = []
+            for url in chunk:
+                status, path, updated = known.get(url, (None, None, 0))
+                if updated >= since:
+                    # URL уже встречался в этом скачивании
+                    continue
+                if status == STATUS_DONE and os.path.exists(os.path.join(self.root, path)):
+                    summary.skipped += 1
+                    continue
+                incoming_path = self._incoming_path(url)
+                if os.path.exists(incoming_path):
+                    # Файл был докачан, но процесс завершился до записи в индекс
+                    self.add_file(url, incoming_path)
+                    summary.skipped += 1
+                    continue
+                self._update(url, STATUS_PENDING)
+                jobs.append((url, incoming_path))
+            self._connection.commit()
+            yield from jobs
+
+    def download(self, urls):
+        """
+        Скачивает в хранилище URL, которых ещё нет в индексе.
+
+        URL читаются и проверяются по индексу порциями по мере того, как загрузчик освобождается,
+        поэтому `urls` может быть генератором любой длины.
+
+        :param urls: Итерируемый набор URL (повторы допускаются).
+        :return: DownloadSummary; skipped - URL, уже имеющиеся в хранилище (URL, повторяющийся
+                 в разных порциях, считается в каждой из них).
+        """
+        summary = DownloadSummary()
+        jobs = self.iter_jobs(urls, summary, time.time())
+        first = next(jobs, None)
+        if first is not None:
+            self.downloader.download(chain([first], jobs), on_result=self._on_result, summary=summary)
+        logging.info(f"Скачано новых изображений: {summary.ok}, ошибок: {summary.failed}, "
+                     f"уже в хранилище: {summary.skipped}.")
+        return summary
+
+    def content_files(self):
+        """Возвращает список (content_hash, путь) всех скачанных файлов без повторов."""
+        cursor = self._connection.execute(
+            "SELECT content_hash, MIN(path) FROM images WHERE status = ? AND content_hash IS NOT NULL "
+            "GROUP BY content_hash", (STATUS_DONE,)
+        )
+        return [(content_hash, os.path.join(self.root, path)) for content_hash, path in cursor.fetchall()]
+
+    def hashed_contents(self):
+        """Возвращает множество content_hash, для которых уже посчитаны перцептивные хеши."""
+        return {row[0] for row in self._connection.execute("SELECT content_hash FROM perceptual_hashes")}
+
+    def save_perceptual_hashes(self, rows):
+        """Сохраняет перцептивные хеши: строки (content_hash, phash, dhash, error)."""
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO perceptual_hashes (content_hash, phash, dhash, error) VALUES (?, ?, ?, ?)", rows
+        )
+        self._connection.commit()
+
+    def perceptual_hashes(self):
+        """Возвращает список (content_hash, phash, dhash) для успешно обработанных файлов."""
+        cursor = self._connection.execute(
+            "SELECT content_hash, phash, dhash FROM perceptual_hashes WHERE error IS NULL ORDER BY content_hash"
+        )
+        return cursor.fetchall()
+
+    def stats(self):
+        """Возвращает количество URL в индексе по статусам."""
+        cursor = self._connection.execute("SELECT status, COUNT(*) FROM images GROUP BY status")
+        return dict(cursor.fetchall())
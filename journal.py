@@ -0,0 +1,164 @@
+import time  # Для работы с временем
+import sqlite3  # Для хранения журнала обхода
+import logging  # Для ведения логов
+import threading  # Для доступа к журналу из рабочих потоков
+
+# Состояния карточек товаров
+CARD_PENDING = "pending"
+CARD_DONE = "done"
+CARD_FAILED = "failed"
+
+# Состояния этапов обхода
+STAGE_DONE = "done"
+
+MAX_CARD_ATTEMPTS = 3  # Максимальное количество попыток обработки одной карточки
+
+
+class CrawlJournal:
+    """
+    Журнал обхода в SQLite: найденные ссылки, состояние каждой карточки и завершённые этапы.
+
+    Каждое изменение сразу фиксируется в базе (режим WAL), поэтому после аварийного
+    завершения перезапуск продолжает обход с того места, где он остановился.
+    """
+
+    def __init__(self, journal_file):
+        self.journal_file = journal_file
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(journal_file, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS stages (
+                name TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cards (
+                url TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                product_article TEXT,
+                error TEXT,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS cards_state ON cards (state);
+            """
+        )
+        self._connection.commit()
+
+    def close(self):
+        """Закрывает журнал."""
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _execute(self, sql, parameters=()):
+        with self._lock:
+            cursor = self._connection.execute(sql, parameters)
+            self._connection.commit()
+            return cursor
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def stage_done(self, name):
+        """Проверяет, завершён ли этап обхода (например, "links" или "images")."""
+        rows = self._query("SELECT state FROM stages WHERE name = ?", (name,))
+        return bool(rows) and rows[0][0] == STAGE_DONE
+
+    def set_stage(self, name, state=STAGE_DONE):
+        """Записывает состояние этапа обхода."""
+        self._execute(
+            "INSERT INTO stages (name, state, updated) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET state = excluded.state, updated = excluded.updated",
+            (name, state, time.time()),
+        )
+
+    def add_links(self, urls, requeue_done=False):
+        """
+        Добавляет найденные ссылки на карточки (уже известные ссылки не меняются).
+
+        :param requeue_done: Возвращать в очередь уже обработанные или неудачные карточки с теми же ссылками
+                             (инкрементальный обход: устаревшие и изменившиеся карточки).
+        :return: Список ссылок, которых раньше не было в журнале (или возвращённых в очередь).
+        """
+        added = []
+        with self._lock:
+            position = self._connection.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM cards").fetchone()[0]
+            now = time.time()
+            for url in urls:
+                cursor = self._connection.execute(
+                    "INSERT OR IGNORE INTO cards (url, position, state, updated) VALUES (?, ?, ?, ?)",
+                    (url, position + len(added), CARD_PENDING, now),
+                )
+                if not cursor.rowcount and requeue_done:
+                    cursor = self._connection.execute(
+                        "UPDATE cards SET state = ?, attempts = 0, error = NULL, updated = ? "
+                        "WHERE url = ? AND state IN (?, ?)",
+                        (CARD_PENDING, now, url, CARD_DONE, CARD_FAILED),
+                    )
+                if cursor.rowcount:
+                    added.append(url)
+            self._connection.commit()
+        return added
+
+    def pending_cards(self):
+        """Возвращает ссылки на ещё не обработанные карточки в порядке обнаружения."""
+        rows = self._query("SELECT url FROM cards WHERE state = ? ORDER BY position", (CARD_PENDING,))
+        return [row[0] for row in rows]
+
+    def failed_cards(self, max_attempts=MAX_CARD_ATTEMPTS):
+        """Возвращает карточки с ошибкой, у которых ещё остались попытки."""
+        rows = self._query(
+            "SELECT url FROM cards WHERE state = ? AND attempts < ? ORDER BY position",
+            (CARD_FAILED, max_attempts),
+        )
+        return [row[0] for row in rows]
+
+    def mark_card_done(self, url, product_article=None):
+        """Отмечает карточку как успешно обработанную."""
+        self._execute(
+            "UPDATE cards SET state = ?, attempts = attempts + 1, product_article = ?, error = NULL, updated = ? "
+            "WHERE url = ?",
+            (CARD_DONE, product_article, time.time(), url),
+        )
+
+    def mark_card_failed(self, url, error):
+        """Отмечает неудачную попытку обработки карточки."""
+        self._execute(
+            "UPDATE cards SET state = ?, attempts = attempts + 1, error = ?, updated = ? WHERE url = ?",
+            (CARD_FAILED, str(error), time.time(), url),
+        )
+
+    def reconcile(self, saved_articles):
+        """
+        Возвращает в очередь карточки, отмеченные как обработанные, но отсутствующие в сохранённых данных
+        (например, если процесс был убит до записи буфера на диск).
+
+        :param saved_articles: Множество артикулов, найденных в файле с товарами.
+        :return: Количество возвращённых в очередь карточек.
+        """
+        rows = self._query("SELECT url, product_article FROM cards WHERE state = ?", (CARD_DONE,))
+        lost = [url for url, article in rows if article not in saved_articles]
+        if lost:
+            with self._lock:
+                self._connection.executemany(
+                    "UPDATE cards SET state = ?, attempts = 0, updated = ? WHERE url = ?",
+                    ((CARD_PENDING, time.time(), url) for url in lost),
+                )
+                self._connection.commit()
+            logging.warning(f"{len(lost)} карточек отсутствуют в сохранённых данных и возвращены в очередь.")
+        return len(lost)
+
+    def stats(self):
+        """Возвращает количество карточек по состояниям."""
+        return dict(self._query("SELECT state, COUNT(*) FROM cards GROUP BY state"))
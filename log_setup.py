@@ -0,0 +1,120 @@
+import json  # Для записи логов в формате JSON lines
+import queue  # Для очереди записей между рабочими потоками и потоком записи
+import atexit  # Для остановки потока записи при завершении процесса
+import logging  # Для ведения логов
+import threading  # Для подсчёта записей в фильтре выборки
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = "wb_parser.log"  # Файл логов по умолчанию
+LOG_MAX_BYTES = 50 * 1024 * 1024  # Размер файла логов, после которого он ротируется
+LOG_BACKUPS = 5  # Сколько ротированных файлов хранить
+DEBUG_SAMPLE_EVERY = 100  # Из скольких DEBUG-записей одного места в коде в лог попадает одна
+CONSOLE_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"  # Формат сообщений в консоли
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Стандартные атрибуты LogRecord: всё остальное (extra=...) попадает в JSON как дополнительные поля
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None  # Поток записи, запущенный setup_logging
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись в одну компактную строку JSON."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "where": f"{record.module}:{record.lineno}",
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str, separators=(",", ":"))
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    Пропускает только каждую `every`-ю DEBUG-запись из одного места в коде (первая пропускается всегда).
+    Записи уровня INFO и выше не затрагиваются.
+    """
+
+    def __init__(self, every=DEBUG_SAMPLE_EVERY):
+        super().__init__()
+        self.every = every
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every <= 1:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % self.every == 0
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Кладёт запись в очередь без форматирования: сообщение собирается из шаблона и аргументов
+    только в потоке записи, поэтому рабочий поток тратит на лог лишь постановку в очередь.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(log_file=LOG_FILE, level=logging.INFO, console_level=logging.INFO,
+                  sample_every=DEBUG_SAMPLE_EVERY, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+    """
+    Настраивает неблокирующее логирование.
+
+    Обработчик корневого логгера только кладёт записи в неограниченную очередь; отдельный поток
+    (QueueListener) фильтрует их, пишет JSON lines в ротируемый файл и краткие сообщения в консоль.
+
+    :param level: Уровень логирования (logging.DEBUG включает выборочные подробные записи).
+    :param sample_every: Из скольких DEBUG-записей одного места в коде записывается одна.
+    :return: Запущенный QueueListener (останавливается stop_logging или при завершении процесса).
+    """
+    global _listener
+    stop_logging()
+
+    file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(console_level)
+    console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT, DATE_FORMAT))
+
+    # Выборка выполняется до постановки в очередь, чтобы отброшенные записи не доходили до потока записи
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSamplingFilter(sample_every))
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    logging.info("Логирование настроено.")
+    return _listener
+
+
+def stop_logging():
+    """Дописывает оставшиеся в очереди записи и останавливает поток записи."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -1,112 +1,333 @@
 # Импорт библиотек и модулей
 
-import requests  # Для выполнения HTTP-запросов
 import os  # Для работы с операционной системой
 import sys  # Для доступа к параметрам и функциям интерпретатора Python
+import glob  # Для поиска файлов данных в команде stats
+import shutil  # Для удаления пересобираемых наборов
 import codecs  # Для работы с кодировками
-from urllib.parse import urljoin  # Для объединения URL
-from selenium import webdriver  # Для работы с браузером через Selenium
-from selenium.webdriver.common.by import By  # Для поиска элементов на странице
-from selenium.webdriver.chrome.service import Service  # Для управления службой ChromeDriver
-from webdriver_manager.chrome import ChromeDriverManager  # Для автоматической установки ChromeDriver
-from selenium.webdriver.support.ui import WebDriverWait  # Для ожидания загрузки элементов
-from selenium.webdriver.support import expected_conditions as EC  # Для условий ожидания
+import signal  # Для корректного завершения по сигналу
+import argparse  # Для разбора аргументов командной строки
 import time  # Для работы с временем
-from datetime import datetime, timedelta
-import random  # Для генерации случайных чисел
-import csv  # Для работы с CSV-файлами
 import logging  # Для ведения логов
-from tqdm import tqdm
-import pandas as pd
 
-from utils import scroll_page_to_bottom, scroll_page_incrementally, scroll_popup_to_bottom,\
-    get_next_page_button
-from products import get_product_links, get_price, get_full_description_button,\
-    get_description_data, get_product_data, save_product_data_to_parquet
-from reviews import extract_date_time, get_author_name, get_review_date_and_rating,\
-    get_review_text, get_reviews_with_photos, save_review_data_to_parquet, download_images_from_reviews
+from browser import PROFILE_DIR
+from driver_pool import WORKERS
+from downloader import MAX_WORKERS
+from log_setup import setup_logging, stop_logging
+from work_queue import WorkQueue, default_worker_id, TASK_CATEGORY, TASK_PAGE, TASK_CARD, TASK_PENDING, \
+    TASK_LEASED, TASK_DONE, TASK_FAILED
+from article_index import TTL_HOURS, ArticleIndex
 
-TIMEOUT = (0.5, 2.0)
+# Здесь импортируются только лёгкие модули: команды без браузера (enqueue, watch, stats, export, download, reparse)
+# не загружают selenium, а pyarrow - только те из них, которым он нужен. Модули обхода (crawl)
+# и чтения данных импортируются внутри команд.
 
 # Обработка кодировки для вывода в консоль
 sys.stdout = codecs.getwriter("utf-8")(sys.stdout.detach())
 
-# Пользовательский агент для имитации браузера
-USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/85.0.4183.83 Safari/537.36"
-# URL начальной страницы для парсинга
-start_page_url = "https://www.wildberries.ru/catalog/detyam/tovary-dlya-malysha/podguzniki/podguzniki-detskie"
-
-
-def setup_logging(log_file: str = "wb_parser.log") -> None:
-    """Настраивает логирование."""
-    logging.basicConfig(
-        level=logging.INFO,     # Уровень логирования
-        format="%(asctime)s - %(levelname)s - %(message)s", # Формат сообщений
-        datefmt="%Y-%m-%d %H:%M:%S",
-        handlers=[
-        logging.FileHandler(log_file, encoding="utf-8"),  # Логирование в файл
-        logging.StreamHandler()  # Логирование в консоль
-        ]
+DATA_DIR = "data"  # Каталог данных по умолчанию
+LOCAL_WORKER_ID = "local"  # Идентификатор рабочего для обхода одним процессом (команда crawl)
+WATCH_SECONDS = 10.0  # Как часто команда watch выводит состояние очереди
+COMMANDS = ("crawl", "enqueue", "work", "watch", "download", "export", "stats", "reparse")
+REPARSED_DIR = "reparsed"  # Подкаталог данных для наборов, пересобранных из снимков (команда reparse)
+
+
+def data_paths(data_dir, worker_id=LOCAL_WORKER_ID):
+    """
+    Возвращает пути к данным внутри data_dir.
+
+    Товары и отзывы каждый рабочий пишет в свою секцию (`worker=<id>`), поэтому рабочие
+    не мешают друг другу; при чтении каталоги products_data и reviews_data открываются целиком.
+    Хранилище изображений, индекс артикулов и очередь задач общие.
+    """
+    worker = f"worker={worker_id}"
+    return argparse.Namespace(
+        worker_id=worker_id,
+        products_dir=os.path.join(data_dir, "products_data"),  # Товары всех рабочих
+        products=os.path.join(data_dir, "products_data", worker, "products.parquet"),  # Товары этого рабочего
+        reviews_dir=os.path.join(data_dir, "reviews_data"),  # Наборы отзывов всех рабочих
+        reviews=os.path.join(data_dir, "reviews_data", worker),  # Набор отзывов этого рабочего
+        snapshots_dir=os.path.join(data_dir, "snapshots"),  # Архивы снимков страниц всех рабочих
+        snapshots=os.path.join(data_dir, "snapshots", worker),  # Архив снимков этого рабочего
+        images=os.path.join(data_dir, "photos"),  # Хранилище изображений
+        shards=os.path.join(data_dir, "shards"),  # Шарды для обучения
+        journal=os.path.join(data_dir, "crawl_journal.sqlite"),  # Журнал обхода одним процессом
+        queue=os.path.join(data_dir, "work_queue.sqlite"),  # Общая очередь задач
+        index=os.path.join(data_dir, "article_index.sqlite"),  # Индекс артикулов
+        metrics=os.path.join(data_dir, f"wb_parser-{worker_id}.prom"),  # Метрики рабочего
     )
-    logging.info("Логирование настроено.")
 
 
-def setup_driver():
-    """Настраивает и возвращает экземпляр Selenium WebDriver с заданными параметрами."""
-    logging.info("Настройка веб-драйвера.")
-    options = webdriver.ChromeOptions()  # Создание объекта с опциями для Chrome
-    options.add_argument("--start-maximized")  # Запуск браузера в максимизированном режиме
-    options.add_argument("--disable-blink-features=AutomationControlled")  # Отключение автоматического управления
-    options.add_argument(f"user-agent={USER_AGENT}")  # Установка пользовательского агента
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)  # Инициализация драйвера
-    return driver  # Возврат настроенного драйвера
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+
+    Без имени команды выполняется crawl (обход одним процессом), например `main.py --category URL`.
+    """
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--data-dir", default=DATA_DIR, help=f"каталог данных (по умолчанию {DATA_DIR})")
+    common.add_argument("--log-level", choices=("DEBUG", "INFO", "WARNING"), default="INFO",
+                        help="уровень логирования; DEBUG включает выборочные подробные записи по каждой карточке")
+
+    crawler = argparse.ArgumentParser(add_help=False)
+    crawler.add_argument("--workers", type=int, default=WORKERS,
+                         help=f"количество браузеров для параллельной обработки карточек (по умолчанию {WORKERS})")
+    crawler.add_argument("--max-pages", type=int, default=None,
+                         help="сколько страниц каталога обходить в каждой категории (по умолчанию все)")
+    crawler.add_argument("--incremental", action="store_true",
+                         help="открывать только новые, устаревшие или изменившиеся в каталоге карточки")
+    crawler.add_argument("--headful", action="store_true", help="показывать окно браузера (по умолчанию без окна)")
+    crawler.add_argument("--load-all-resources", action="store_true",
+                         help="не блокировать картинки, видео, шрифты и счётчики на страницах")
+    crawler.add_argument("--profile-dir", default=PROFILE_DIR,
+                         help=f"каталог тёплых профилей Chrome (по умолчанию {PROFILE_DIR}); пустая строка - временный профиль")
+    crawler.add_argument("--metrics-format", choices=("prometheus", "json"), default="prometheus",
+                         help="формат файла метрик: Prometheus textfile или JSON (по умолчанию prometheus)")
+    crawler.add_argument("--ttl-hours", type=float, default=TTL_HOURS,
+                         help=f"срок, после которого карточка собирается заново (по умолчанию {TTL_HOURS} ч)")
+    crawler.add_argument("--no-snapshots", action="store_true",
+                         help="не сохранять снимки страниц карточек (без них команда reparse недоступна)")
+
+    parser = argparse.ArgumentParser(description="Парсер фотографий из отзывов Wildberries.")
+    commands = parser.add_subparsers(dest="command")
+
+    crawl = commands.add_parser("crawl", parents=[common, crawler], help="обход категорий одним процессом")
+    crawl.add_argument("--category", action="append", required=True, metavar="URL",
+                       help="URL категории каталога (можно указать несколько раз)")
+    crawl.add_argument("--fresh", action="store_true",
+                       help="начать обход заново, не продолжая по журналу предыдущего запуска")
+
+    enqueue = commands.add_parser("enqueue", parents=[common], help="добавить категории в общую очередь задач")
+    enqueue.add_argument("categories", nargs="+", metavar="URL", help="URL категорий каталога")
+    enqueue.add_argument("--again", action="store_true",
+                         help="пройти заново категории, которые уже были обойдены")
+
+    work = commands.add_parser("work", parents=[common, crawler], help="рабочий: выполнять задачи из общей очереди")
+    work.add_argument("--worker-id", default=None,
+                      help="идентификатор рабочего и его секций данных (по умолчанию хост-PID)")
+    work.add_argument("--wait", action="store_true",
+                      help="не завершаться, когда очередь пуста, а ждать новых задач")
+    work.add_argument("--postprocess", action="store_true",
+                      help="после опустошения очереди проверить изображения, найти дубликаты и собрать шарды")
+
+    watch = commands.add_parser("watch", parents=[common], help="показывать состояние общей очереди задач")
+    watch.add_argument("--interval", type=float, default=WATCH_SECONDS,
+                       help=f"период обновления, секунд (по умолчанию {WATCH_SECONDS})")
+    watch.add_argument("--once", action="store_true", help="вывести состояние один раз и завершиться")
+    watch.add_argument("--retry-failed", action="store_true",
+                       help="вернуть в очередь задачи, исчерпавшие попытки")
+
+    download = commands.add_parser("download", parents=[common],
+                                   help="скачать изображения из уже собранных отзывов (без браузера)")
+    download.add_argument("--max-workers", type=int, default=MAX_WORKERS,
+                          help=f"количество одновременных загрузок (по умолчанию {MAX_WORKERS})")
+
+    export = commands.add_parser("export", parents=[common],
+                                 help="выгрузить отзывы вместе с данными товаров в файл Parquet (без браузера)")
+    export.add_argument("output", help="файл Parquet для результата")
+    export.add_argument("--brand", action="append", help="только товары бренда (можно указать несколько раз)")
+    export.add_argument("--rating", type=int, action="append", choices=range(1, 6),
+                        help="только отзывы с оценкой (можно указать несколько раз)")
+    export.add_argument("--since", help="только отзывы, опубликованные не раньше даты (ISO, например 2024-11-01)")
+    export.add_argument("--until", help="только отзывы, опубликованные раньше даты (ISO)")
+    export.add_argument("--with-photos", action="store_true", help="только отзывы с фотографиями")
+    export.add_argument("--keep-unmatched", action="store_true",
+                        help="оставлять отзывы товаров, которых нет в данных о товарах (колонки товара пустые)")
+
+    commands.add_parser("stats", parents=[common], help="показать объём собранных данных и состояние очередей")
+
+    reparse = commands.add_parser("reparse", parents=[common],
+                                  help="пересобрать товары и отзывы из снимков страниц (без браузера)")
+    reparse.add_argument("--output-dir", default=None,
+                         help=f"каталог для пересобранных наборов (по умолчанию <data-dir>/{REPARSED_DIR})")
+    reparse.add_argument("--processes", type=int, default=None,
+                         help="количество процессов разбора (по умолчанию по числу процессоров)")
+    reparse.add_argument("--overwrite", action="store_true",
+                         help="удалить наборы товаров и отзывов, уже имеющиеся в каталоге результата")
+
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ("-h", "--help")):
+        argv = ["crawl"] + argv
+    return parser.parse_args(argv)
+
+
+def handle_termination(signum, frame):
+    """Превращает SIGTERM в обычное завершение, чтобы отработали блоки finally и atexit."""
+    logging.warning(f"Получен сигнал {signum}, завершаем работу.")
+    sys.exit(1)
+
+
+def run_crawl(args):
+    """Команда crawl: обход заданных категорий одним процессом с журналом для продолжения (см. crawl.run_crawl)."""
+    import crawl  # Модули обхода загружаются только командами с браузером
+    crawl.run_crawl(args, data_paths(args.data_dir))
+
 
+def run_work(args):
+    """Команда work: рабочий процесс общей очереди (см. crawl.run_work)."""
+    import crawl  # Модули обхода загружаются только командами с браузером
+    crawl.run_work(args, data_paths(args.data_dir, args.worker_id or default_worker_id()))
 
-def main():
-    """Основная функция для запуска процесса парсинга и сохранения данных."""
-    setup_logging()
-    logging.info("Запуск основного процесса.")
-    driver = setup_driver()  # Настройка веб-драйвера
-    product_parquet_file = r"d:\Projects\CurrentProjects\WB-ML-Photo-Classification\products_data.parquet"  # Путь для сохранения данных о товарах
-    review_parquet_file = r"d:\Projects\CurrentProjects\WB-ML-Photo-Classification\reviews_data.parquet"  # Путь для сохранения данных о отзывах
-    dir_to_save = r"d:\Projects\CurrentProjects\WB-ML-Photo-Classification\wb-diapers-photos"  # Директория для сохранения изображений
 
+def run_enqueue(args):
+    """Команда enqueue: добавляет категории в общую очередь задач."""
+    with WorkQueue(data_paths(args.data_dir).queue) as work_queue:
+        added = work_queue.enqueue(TASK_CATEGORY, args.categories, requeue_done=args.again)
+        logging.info(f"В очередь добавлено категорий: {len(added)} из {len(args.categories)}.")
+        logging.info(f"Состояние очереди: {work_queue.stats()}")
+
+
+def run_download(args):
+    """Команда download: скачивает изображения из уже собранных отзывов без запуска браузера."""
+    paths = data_paths(args.data_dir)
+    if not os.path.isdir(paths.reviews_dir):
+        logging.warning(f"Набор отзывов {paths.reviews_dir} не найден.")
+        return
+    from reviews import download_images_from_reviews
+    summary = download_images_from_reviews(paths.reviews_dir, paths.images, args.max_workers)
+    logging.info(f"Изображения скачаны в директорию {paths.images}: {summary}")
+
+
+def run_reparse(args):
+    """Команда reparse: пересобирает товары и отзывы из архива снимков страниц (см. reparse)."""
+    from reparse import reparse_snapshots
+    paths = data_paths(args.data_dir)
+    output = data_paths(args.output_dir or os.path.join(args.data_dir, REPARSED_DIR))
+    existing = [path for path in (output.products_dir, output.reviews_dir) if os.path.exists(path)]
+    if existing and not args.overwrite:
+        logging.error(f"Наборы уже существуют: {', '.join(existing)}. Укажите --overwrite или другой --output-dir.")
+        return
+    for path in existing:
+        shutil.rmtree(path)
+    reparse_snapshots(paths.snapshots_dir, output.products, output.reviews, args.processes)
+    logging.info(f"Пересобранные наборы: {output.products_dir}, {output.reviews_dir}")
+
+
+def run_export(args):
+    """Команда export: отзывы, соединённые с данными товаров, в один файл Parquet (см. query)."""
+    paths = data_paths(args.data_dir)
+    if not os.path.isdir(paths.reviews_dir):
+        logging.warning(f"Набор отзывов {paths.reviews_dir} не найден.")
+        return
+    from query import iter_reviews_with_products, review_filter, product_filter, write_batches
+    reviews_where = review_filter(rating=args.rating, since=args.since, until=args.until,
+                                  with_photos=args.with_photos)
+    batches = iter_reviews_with_products(paths.reviews_dir, paths.products_dir, reviews_where=reviews_where,
+                                         products_where=product_filter(brand=args.brand),
+                                         inner=not args.keep_unmatched)
+    write_batches(batches, args.output)
+
+
+def run_stats(args):
+    """
+    Команда stats: объём собранных данных и состояние журнала и очереди.
+
+    Строки товаров берутся из метаданных файлов Parquet (из данных читается только колонка артикулов:
+    повторно собранный товар занимает несколько строк, при чтении остаётся последняя), отзывы - из манифестов
+    наборов.
+    """
+    import pyarrow.parquet as pq
+    from storage import read_manifest, parquet_files
+    from reviews import REVIEW_PARTITION_COLUMN
+    from image_store import ImageStore, INDEX_FILE
+    from journal import CrawlJournal
+    from snapshots import find_archives, read_index, ARCHIVE_FILE
+    paths = data_paths(args.data_dir)
+
+    # Временные файлы писателей и копии нечитаемых файлов не учитываются
+    product_files = parquet_files(paths.products_dir) if os.path.isdir(paths.products_dir) else []
+    product_rows = 0
+    articles = set()
+    for product_file in product_files:
+        try:
+            product_rows += pq.read_metadata(product_file).num_rows
+            articles.update(pq.read_table(product_file, columns=["product_article"]).column(0).to_pylist())
+        except Exception as e:
+            logging.warning(f"Не удалось прочитать {product_file}: {e}")
+    print(f"товары: {len(articles)} артикулов, {product_rows} строк в {len(product_files)} файлах")
+
+    review_roots = [paths.reviews_dir] + glob.glob(os.path.join(paths.reviews_dir, "worker=*"))
+    entries = [entry for root in review_roots for entry in read_manifest(root)]
+    reviewed = {entry.get(REVIEW_PARTITION_COLUMN) for entry in entries}
+    print(f"отзывы с фотографиями: {sum(entry['rows'] for entry in entries)} у {len(reviewed)} товаров, "
+          f"файлов-частей {len(entries)}")
+
+    archives = find_archives(paths.snapshots_dir)
+    if archives:
+        snapshots = sum(len(read_index(root)) for root in archives)
+        size = sum(os.path.getsize(os.path.join(root, ARCHIVE_FILE)) for root in archives
+                   if os.path.exists(os.path.join(root, ARCHIVE_FILE)))
+        print(f"снимки страниц: {snapshots} в {len(archives)} архивах, {size / 1024 / 1024:.1f} МБ")
+
+    if os.path.exists(os.path.join(paths.images, INDEX_FILE)):
+        with ImageStore(paths.images) as store:
+            print("изображения: " + ", ".join(f"{status} {count}" for status, count in sorted(store.stats().items())))
+    if os.path.exists(paths.index):
+        with ArticleIndex(paths.index) as article_index:
+            skip_stats = article_index.skip_stats()
+        if skip_stats["runs"]:
+            print(f"инкрементальный обход: в последнем запуске к сбору {skip_stats['last_selected']}, "
+                  f"пропущено {skip_stats['last_skipped']}; всего пропущено {skip_stats['total_skipped']} "
+                  f"за {skip_stats['runs']} запусков")
+    if os.path.exists(paths.journal):
+        with CrawlJournal(paths.journal) as journal:
+            print(f"журнал обхода: {journal.stats()}")
+    if os.path.exists(paths.queue):
+        with WorkQueue(paths.queue) as work_queue:
+            print("очередь задач:")
+            print(format_queue_stats(work_queue.stats()))
+
+
+def format_queue_stats(stats):
+    """Форматирует состояние очереди: строка на каждый вид задач."""
+    lines = []
+    for kind in (TASK_CATEGORY, TASK_PAGE, TASK_CARD):
+        counts = stats.get(kind, {})
+        lines.append(f"{kind:>8}: " + ", ".join(
+            f"{state} {counts.get(state, 0)}" for state in (TASK_PENDING, TASK_LEASED, TASK_DONE, TASK_FAILED)))
+    return "\n".join(lines)
+
+
+def run_watch(args):
+    """Команда watch: периодически выводит состояние общей очереди и активных рабочих."""
+    with WorkQueue(data_paths(args.data_dir).queue) as work_queue:
+        if args.retry_failed:
+            logging.info(f"В очередь возвращено {work_queue.retry_failed()} неудачных задач.")
+        previous_done, previous_time = None, None
+        while True:
+            stats = work_queue.stats()
+            done = stats.get(TASK_CARD, {}).get(TASK_DONE, 0)
+            now = time.monotonic()
+            rate = ""
+            if previous_done is not None:
+                rate = f", {(done - previous_done) / (now - previous_time) * 60:.1f} карточек/мин"
+            previous_done, previous_time = done, now
+            print(time.strftime("%Y-%m-%d %H:%M:%S") + rate)
+            print(format_queue_stats(stats))
+            workers = work_queue.active_workers()
+            print(f"рабочих: {len(workers)}" + "".join(f"\n  {worker}: {count} задач" for worker, count in workers.items()))
+            for kind, url, attempts, error in work_queue.recent_errors(3):
+                print(f"  ошибка ({kind}, попыток {attempts}): {url}: {error}")
+            if args.once or (work_queue.is_idle() and stats):
+                break
+            time.sleep(args.interval)
+
+
+def main(argv=None):
+    """Основная функция: разбирает команду и запускает её."""
+    args = parse_args(argv)
+    setup_logging(level=args.log_level)
+    signal.signal(signal.SIGTERM, handle_termination)
+    logging.info(f"Запуск команды {args.command}.")
+    commands = {"crawl": run_crawl, "enqueue": run_enqueue, "work": run_work, "watch": run_watch,
+                "download": run_download, "export": run_export, "stats": run_stats, "reparse": run_reparse}
     try:
-        # Получение ссылок на карточки товаров
-        logging.info("Начало сбора ссылок на карточки товаров.")
-        product_cards_list = get_product_links(driver, start_page_url)
-        logging.info(f"Собрано {len(product_cards_list)} ссылок на карточки товаров.")
-        
-        # Проход по каждой карточке товара
-        for product_card in product_cards_list:
-            try:
-                # Сбор данных о товаре
-                product_data = get_product_data(driver, product_card)
-                save_product_data_to_parquet(product_data, product_parquet_file)
-                logging.info(f"Данные о товаре сохранены: {product_data['name']}")
-                
-                # Сбор данных об отзывах
-                reviews_with_photos = get_reviews_with_photos(driver)
-                save_review_data_to_parquet(reviews_with_photos, review_parquet_file)
-                logging.info(f"Данные о {len(reviews_with_photos)} отзывах сохранены.")
-            except Exception as e:
-                logging.error(f"Ошибка обработки карточки товара {product_card}: {e}")
-        
-        # Скачивание изображений из сохраненного файла отзывов
-        logging.info("Начало скачивания изображений из отзывов.")
-        if os.path.exists(review_parquet_file):
-            download_images_from_reviews(review_parquet_file, dir_to_save)
-            logging.info(f"Изображения успешно скачаны в директорию: {dir_to_save}")
-        else:
-            logging.warning(f"Файл отзывов {review_parquet_file} не найден. Пропуск скачивания изображений.")
-    
+        commands[args.command](args)
     except Exception as e:
         logging.error(f"Ошибка в основном процессе: {e}")
     finally:
-        # Закрытие драйвера
-        driver.quit()
         logging.info("Процесс завершен.")
-
+        stop_logging()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,331 @@
+import os  # Для работы с операционной системой
+import json  # Для экспорта в JSON
+import time  # Для работы с временем
+import bisect  # Для поиска корзины гистограммы
+import logging  # Для ведения логов
+import functools  # Для декоратора timed
+import threading  # Для потокобезопасных счётчиков и фонового экспорта
+from contextlib import contextmanager  # Для контекстов этапа и карточки
+
+# Границы корзин гистограмм длительности, секунд (как у Prometheus, плюс длинные операции браузера)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Границы корзин гистограммы количества запросов к браузеру на карточку
+CALL_BUCKETS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+EXPORT_SECONDS = 15.0  # Как часто записывать метрики в файл
+METRIC_PREFIX = "wb_parser"  # Префикс имён метрик
+
+# Методы WebDriver и WebElement, вызовы которых считаются и замеряются
+DRIVER_METHODS = {"get", "find_element", "find_elements", "execute_script", "execute_async_script", "refresh",
+                  "back"}
+ELEMENT_METHODS = {"find_element", "find_elements", "click", "get_attribute", "is_displayed"}
+
+_context = threading.local()  # Текущий этап и карточка потока
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: количество, сумма и накопительные счётчики по корзинам."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Последняя корзина - "+Inf"
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """Возвращает пары (граница, накопленное количество), включая "+Inf"."""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик процесса: гистограммы и счётчики с метками.
+
+    Запись - одна блокировка и bisect по короткому списку корзин, поэтому реестр можно держать
+    включённым в рабочем режиме.
+    """
+
+    def __init__(self):
+        self._histograms = {}  # (имя, метки) -> Histogram
+        self._counters = {}  # (имя, метки) -> число
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        """Добавляет наблюдение в гистограмму `name` с метками `labels`."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def increment(self, name, value=1, **labels):
+        """Увеличивает счётчик `name` с метками `labels`."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Замеряет длительность блока в гистограмму `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self):
+        """Возвращает копию всех метрик в виде словаря, пригодного для JSON."""
+        with self._lock:
+            histograms = [
+                {"name": name, "labels": dict(labels), "count": histogram.count, "sum": histogram.sum,
+                 "buckets": {str(bound): count for bound, count in histogram.cumulative()}}
+                for (name, labels), histogram in self._histograms.items()
+            ]
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in self._counters.items()]
+        return {"timestamp": time.time(), "histograms": histograms, "counters": counters}
+
+    def to_prometheus(self):
+        """Возвращает метрики в текстовом формате Prometheus (для textfile collector node_exporter)."""
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+            return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+                for (metric, labels), value in self._counters.items():
+                    if metric == name:
+                        lines.append(f"{METRIC_PREFIX}_{name}{format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} histogram")
+                for (metric, labels), histogram in self._histograms.items():
+                    if metric != name:
+                        continue
+                    for bound, count in histogram.cumulative():
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{METRIC_PREFIX}_{name}_bucket{format_labels(labels, [('le', le)])} {count}")
+                    lines.append(f"{METRIC_PREFIX}_{name}_sum{format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{METRIC_PREFIX}_{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()  # Реестр процесса по умолчанию
+
+
+def current_stage():
+    """Возвращает имя этапа, выполняющегося в текущем потоке ("other" вне этапов)."""
+    stack = getattr(_context, "stages", None)
+    return stack[-1] if stack else "other"
+
+
+@contextmanager
+def stage(name, registry=REGISTRY):
+    """Помечает блок как этап `name`: его длительность и все вызовы драйвера внутри получают метку stage."""
+    stack = getattr(_context, "stages", None)
+    if stack is None:
+        stack = _context.stages = []
+    stack.append(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stack.pop()
+        registry.observe("stage_duration_seconds", time.perf_counter() - started, stage=name)
+
+
+def timed(name):
+    """Декоратор: выполняет функцию как этап `name` (см. stage)."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _CardTotals:
+    def __init__(self):
+        self.calls = 0
+        self.driver_seconds = 0.0
+        self.sleep_seconds = 0.0
+
+
+@contextmanager
+def card(registry=REGISTRY):
+    """
+    Собирает итоги по одной карточке товара: общее время, количество и время запросов к браузеру, паузы.
+    Итоги попадают в гистограммы card_*, а не в отдельные метки на каждый товар.
+    """
+    totals = _context.card = _CardTotals()
+    started = time.perf_counter()
+    try:
+        yield totals
+    finally:
+        _context.card = None
+        registry.observe("card_duration_seconds", time.perf_counter() - started)
+        registry.observe("card_driver_calls", totals.calls, buckets=CALL_BUCKETS)
+        registry.observe("card_driver_seconds", totals.driver_seconds)
+        registry.observe("card_sleep_seconds", totals.sleep_seconds)
+
+
+def record_call(method, seconds, registry=REGISTRY):
+    """Учитывает один запрос к браузеру."""
+    registry.observe("driver_call_seconds", seconds, method=method, stage=current_stage())
+    totals = getattr(_context, "card", None)
+    if totals is not None:
+        totals.calls += 1
+        totals.driver_seconds += seconds
+
+
+def record_sleep(seconds, registry=REGISTRY):
+    """Учитывает паузу парсера."""
+    registry.observe("sleep_seconds", seconds, stage=current_stage())
+    totals = getattr(_context, "card", None)
+    if totals is not None:
+        totals.sleep_seconds += seconds
+
+
+def _unwrap(value):
+    return value._element if isinstance(value, InstrumentedElement) else value
+
+
+def _wrap(value):
+    """Оборачивает найденные элементы (и списки элементов), чтобы их вызовы тоже учитывались."""
+    if isinstance(value, list):
+        return [_wrap(item) for item in value]
+    if hasattr(value, "find_element") and hasattr(value, "get_attribute") and not isinstance(value, InstrumentedElement):
+        return InstrumentedElement(value)
+    return value
+
+
+def _instrumented(method, name):
+    def call(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return _wrap(method(*[_unwrap(arg) for arg in args], **kwargs))
+        finally:
+            record_call(name, time.perf_counter() - started)
+    return call
+
+
+class InstrumentedElement:
+    """Обёртка WebElement, замеряющая его запросы к браузеру."""
+
+    def __init__(self, element):
+        self._element = element
+
+    @property
+    def text(self):
+        started = time.perf_counter()
+        try:
+            return self._element.text
+        finally:
+            record_call("element.text", time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        attribute = getattr(self._element, name)
+        if name in ELEMENT_METHODS:
+            return _instrumented(attribute, f"element.{name}")
+        return attribute
+
+    def __eq__(self, other):
+        return _unwrap(other) == self._element
+
+    def __hash__(self):
+        return hash(self._element)
+
+
+class InstrumentedDriver:
+    """
+    Обёртка WebDriver: считает и замеряет get, find_element(s), execute_script и т.п.
+    с меткой текущего этапа. Остальные атрибуты передаются драйверу без изменений.
+    """
+
+    def __init__(self, driver):
+        self._driver = driver
+
+    def __getattr__(self, name):
+        attribute = getattr(self._driver, name)
+        if name in DRIVER_METHODS:
+            return _instrumented(attribute, name)
+        return attribute
+
+    def __setattr__(self, name, value):
+        if name == "_driver":
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._driver, name, value)
+
+    @property
+    def wrapped_driver(self):
+        """Исходный WebDriver."""
+        return self._driver
+
+
+def instrument_driver(driver):
+    """Возвращает драйвер, вызовы которого учитываются в реестре метрик."""
+    return driver if isinstance(driver, InstrumentedDriver) else InstrumentedDriver(driver)
+
+
+class MetricsExporter:
+    """
+    Периодически записывает метрики в файл (формат Prometheus textfile или JSON).
+
+    Файл заменяется атомарно, поэтому сборщик никогда не читает его наполовину записанным.
+    """
+
+    def __init__(self, path, registry=REGISTRY, interval=EXPORT_SECONDS, format="prometheus"):
+        self.path = path
+        self.registry = registry
+        self.interval = interval
+        self.format = format
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def export(self):
+        """Записывает текущие метрики в файл."""
+        if self.format == "json":
+            content = json.dumps(self.registry.snapshot(), ensure_ascii=False)
+        else:
+            content = self.registry.to_prometheus()
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            file.write(content)
+        os.replace(temporary_path, self.path)
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.export()
+            except Exception as e:
+                logging.warning(f"Не удалось записать метрики в {self.path}: {e}")
+
+    def close(self):
+        """Останавливает экспорт и записывает итоговые значения."""
+        self._stopping.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        try:
+            self.export()
+        except Exception as e:
+            logging.warning(f"Не удалось записать метрики в {self.path}: {e}")
@@ -0,0 +1,203 @@
+import time  # Для работы с временем
+import queue  # Для ограниченных очередей между этапами
+import logging  # Для ведения логов
+import threading  # Для рабочих потоков этапов
+
+QUEUE_SIZE = 16  # Размер очереди перед этапом по умолчанию (ограничивает память и создаёт обратное давление)
+REPORT_SECONDS = 30.0  # Как часто писать в лог счётчики этапов
+SOURCE_STOP_SECONDS = 10.0  # Сколько ждать остановки источника, занятого следующим элементом
+
+_STOP = object()  # Маркер завершения входного потока этапа
+
+
+class StageStats:
+    """Счётчики одного этапа конвейера."""
+
+    def __init__(self, name):
+        self.name = name
+        self.received = 0  # Полученные элементы
+        self.emitted = 0  # Переданные следующему этапу элементы
+        self.errors = 0  # Элементы, обработка которых завершилась ошибкой
+        self.busy = 0.0  # Суммарное время работы обработчиков, секунд
+        self.started = time.monotonic()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add(self, received=0, emitted=0, errors=0, busy=0.0):
+        with self._lock:
+            self.received += received
+            self.emitted += emitted
+            self.errors += errors
+            self.busy += busy
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def throughput(self):
+        """Обработанные элементы в минуту."""
+        return self.received / self.elapsed * 60 if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"{self.name}: получено {self.received}, передано {self.emitted}, ошибок {self.errors}, "
+                f"{self.throughput:.1f}/мин, занятость {self.busy:.0f} с")
+
+
+class _Stage:
+    def __init__(self, name, handler, workers, queue_size):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.input = queue.Queue(maxsize=queue_size)
+        self.stats = StageStats(name)
+        self.active_workers = workers
+        self.lock = threading.Lock()
+
+
+class Pipeline:
+    """
+    Конвейер из этапов, связанных ограниченными очередями.
+
+    Каждый этап обрабатывает элементы в своих потоках: обработчик handler(item) возвращает
+    итерируемый набор элементов для следующего этапа (или None). Если обработчик - генератор,
+    его результаты передаются дальше по мере появления. Заполненная очередь блокирует
+    предыдущий этап (обратное давление), поэтому быстрые этапы не накапливают данные в памяти.
+    Когда источник исчерпан, маркер завершения проходит по всем этапам, и конвейер останавливается.
+    """
+
+    def __init__(self, queue_size=QUEUE_SIZE, report_seconds=REPORT_SECONDS):
+        self.queue_size = queue_size
+        self.report_seconds = report_seconds
+        self._stages = []
+        self._stopping = threading.Event()
+        self.source_stats = StageStats("source")
+
+    def add_stage(self, name, handler, workers=1, queue_size=None):
+        """Добавляет этап в конец конвейера."""
+        self._stages.append(_Stage(name, handler, workers, queue_size or self.queue_size))
+        return self
+
+    def stop(self):
+        """Просит конвейер завершиться: источник прекращает выдачу, необработанные элементы отбрасываются."""
+        self._stopping.set()
+
+    def run(self, source):
+        """
+        Пропускает элементы источника через все этапы и ждёт завершения.
+
+        :param source: Итерируемый источник элементов для первого этапа.
+        :return: Список StageStats по этапам (первым идёт источник).
+        """
+        threads = [threading.Thread(target=self._feed, args=(source,), name="pipeline-source", daemon=True)]
+        for index, stage in enumerate(self._stages):
+            for number in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, args=(index,),
+                                                name=f"pipeline-{stage.name}-{number}", daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            last_report = time.monotonic()
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1.0)
+                    if time.monotonic() - last_report >= self.report_seconds:
+                        self.report()
+                        last_report = time.monotonic()
+        except KeyboardInterrupt:
+            logging.warning("Остановка конвейера по запросу пользователя.")
+            raise
+        except BaseException as e:
+            logging.error(f"Остановка конвейера из-за ошибки: {e!r}")
+            raise
+        finally:
+            # При любом прерывании (KeyboardInterrupt, SystemExit по SIGTERM, ошибка) этапы опустошают
+            # очереди и передают маркеры завершения, а вызывающий код закрывает писателей только после них
+            if any(thread.is_alive() for thread in threads):
+                self.stop()
+                # Источник может ждать следующего элемента сколь угодно долго (например, новых задач очереди),
+                # поэтому этапы получают маркеры завершения, не дожидаясь его
+                self._finish_input(0)
+                for thread in threads[1:]:
+                    thread.join()
+                threads[0].join(timeout=SOURCE_STOP_SECONDS)
+                if threads[0].is_alive():
+                    logging.warning("Источник конвейера не остановился, поток оставлен.")
+            self.report()
+        return [self.source_stats] + [stage.stats for stage in self._stages]
+
+    def report(self):
+        """Пишет в лог счётчики всех этапов."""
+        logging.info("Конвейер: " + "; ".join(
+            str(stats) for stats in [self.source_stats] + [stage.stats for stage in self._stages]))
+
+    def _put(self, index, item):
+        """
+        Передаёт элемент этапу `index` (за последним этапом элементы отбрасываются).
+
+        Если все рабочие этапа уже завершились (конвейер остановлен из-за ошибки), элемент отбрасывается,
+        а не блокирует отправителя на заполненной очереди.
+        """
+        if index >= len(self._stages):
+            return
+        stage = self._stages[index]
+        while True:
+            try:
+                stage.input.put(item, timeout=1.0)
+                return
+            except queue.Full:
+                if stage.active_workers == 0:
+                    return
+
+    def _finish_input(self, index):
+        """Передаёт маркеры завершения всем рабочим этапа `index`."""
+        if index < len(self._stages):
+            for _ in range(self._stages[index].workers):
+                self._put(index, _STOP)
+
+    def _feed(self, source):
+        try:
+            for item in source:
+                if self._stopping.is_set():
+                    break
+                self.source_stats.add(received=1, emitted=1)
+                self._put(0, item)
+        except Exception as e:
+            self.source_stats.add(errors=1)
+            logging.error(f"Ошибка источника конвейера: {e}")
+        finally:
+            self.source_stats.finished = time.monotonic()
+            self._finish_input(0)
+
+    def _work(self, index):
+        stage = self._stages[index]
+        try:
+            while True:
+                item = stage.input.get()
+                if item is _STOP:
+                    break
+                if self._stopping.is_set():
+                    continue  # Опустошаем очередь, чтобы предыдущий этап не блокировался
+                started = time.monotonic()
+                emitted = 0
+                try:
+                    for output in stage.handler(item) or ():
+                        self._put(index + 1, output)
+                        emitted += 1
+                    stage.stats.add(received=1, emitted=emitted, busy=time.monotonic() - started)
+                except Exception as e:
+                    stage.stats.add(received=1, emitted=emitted, errors=1, busy=time.monotonic() - started)
+                    logging.error(f"Этап {stage.name}: ошибка обработки элемента: {e}")
+        except BaseException as e:
+            # Рабочий погиб не на ошибке элемента: останавливаем весь конвейер
+            logging.error(f"Этап {stage.name}: рабочий поток завершился с ошибкой {e!r}, остановка конвейера.")
+            self.stop()
+        finally:
+            # Последний завершившийся рабочий передаёт маркер завершения следующему этапу
+            with stage.lock:
+                stage.active_workers -= 1
+                last_worker = stage.active_workers == 0
+            if last_worker:
+                stage.stats.finished = time.monotonic()
+                self._finish_input(index + 1)
@@ -0,0 +1,272 @@
+import os  # Для работы с операционной системой
+import glob  # Для поиска файлов шардов
+import logging  # Для ведения логов
+from itertools import islice  # Для чтения вхождений порциями
+from concurrent.futures import ProcessPoolExecutor  # Для декодирования изображений в нескольких процессах
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from PIL import Image, ImageOps
+
+from reviews import open_review_dataset, review_key
+from image_store import ImageStore, STATUS_DONE, LOOKUP_CHUNK
+from dedup import DUPLICATES_FILE
+
+IMAGE_SIZES = (224,)  # Размеры (сторона квадрата, пикселей), в которые приводятся изображения
+SHARD_ROWS = 2048  # Количество изображений в одном шарде
+PREPROCESS_WORKERS = os.cpu_count() or 1  # Количество процессов для декодирования
+MIN_IMAGE_SIDE = 32  # Изображения с меньшей стороной считаются битыми
+SHARD_INDEX_FILE = "index.parquet"  # Таблица соответствия строк шардов отзывам
+OCCURRENCE_CHUNK = 16384  # Сколько вхождений фотографий читается за раз при предобработке
+
+# Одна строка на каждое вхождение фотографии в отзыв; одинаковые по содержимому фотографии
+# хранятся в шардах один раз, и их вхождения ссылаются на одну и ту же строку (shard, row)
+SHARD_INDEX_SCHEMA = pa.schema([
+    ("shard", pa.int32()),
+    ("row", pa.int32()),
+    ("content_hash", pa.string()),
+    ("product_article", pa.string()),
+    ("review_key", pa.string()),
+    ("photo_index", pa.int16()),
+    ("photo_url", pa.string()),
+    ("width", pa.int32()),
+    ("height", pa.int32()),
+    ("duplicate_cluster", pa.int32()),  # Кластер почти одинаковых фотографий (см. dedup) или null
+])
+
+# Поля вхождения, известные до декодирования (хранятся по столбцам, пока пишутся шарды)
+OCCURRENCE_SCHEMA = pa.schema([SHARD_INDEX_SCHEMA.field(name) for name in
+                               ("content_hash", "product_article", "review_key", "photo_index", "photo_url")])
+
+
+def shard_directory(output_dir, image_size):
+    """Возвращает каталог шардов для заданного размера изображений."""
+    return os.path.join(output_dir, f"{image_size}x{image_size}")
+
+
+def load_image(path, image_sizes=IMAGE_SIZES):
+    """
+    Декодирует изображение и приводит его к каждому из размеров (RGB, квадрат с обрезкой по центру).
+
+    :return: tuple: (список массивов uint8 формы (size, size, 3), (ширина, высота) исходного изображения).
+    """
+    with Image.open(path) as image:
+        image.load()  # Полное декодирование: обрезанные файлы вызывают исключение здесь
+        width, height = image.size
+        if min(width, height) < MIN_IMAGE_SIDE:
+            raise ValueError(f"слишком маленькое изображение {width}x{height}")
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        arrays = [np.asarray(ImageOps.fit(image, (size, size), Image.Resampling.BICUBIC), dtype=np.uint8)
+                  for size in image_sizes]
+    return arrays, (width, height)
+
+
+def _load_job(job):
+    """Задача для процесса-обработчика: возвращает (массивы, размеры, ошибка)."""
+    path, image_sizes = job
+    try:
+        arrays, dimensions = load_image(path, image_sizes)
+        return arrays, dimensions, None
+    except Exception as e:
+        return None, None, f"{path}: {e}"
+
+
+class ShardWriter:
+    """
+    Записывает изображения одного размера в шарды фиксированной формы (shard_rows, size, size, 3).
+
+    Шард - файл .npy, открытый через numpy.memmap, поэтому при обучении его строки читаются
+    без копирования. Последний шард при закрытии обрезается до фактического количества строк.
+    """
+
+    def __init__(self, directory, image_size, shard_rows=SHARD_ROWS):
+        self.directory = directory
+        self.image_size = image_size
+        self.shard_rows = shard_rows
+        self.shard = -1
+        self.row = shard_rows  # Первый append откроет новый шард
+        self._memmap = None
+        os.makedirs(directory, exist_ok=True)
+        for old_shard in glob.glob(os.path.join(directory, "shard-*.npy")):
+            os.remove(old_shard)  # Шарды пересобираются целиком
+
+    def _path(self, shard):
+        return os.path.join(self.directory, f"shard-{shard:05d}.npy")
+
+    def _open_next(self):
+        self._flush()
+        self.shard += 1
+        self.row = 0
+        shape = (self.shard_rows, self.image_size, self.image_size, 3)
+        self._memmap = np.lib.format.open_memmap(self._path(self.shard), mode="w+", dtype=np.uint8, shape=shape)
+
+    def _flush(self):
+        if self._memmap is not None:
+            self._memmap.flush()
+            self._memmap = None
+
+    def append(self, array):
+        """Добавляет изображение и возвращает его адрес (shard, row)."""
+        if self.row >= self.shard_rows:
+            self._open_next()
+        self._memmap[self.row] = array
+        self.row += 1
+        return self.shard, self.row - 1
+
+    def close(self):
+        """Сбрасывает данные на диск и обрезает последний неполный шард."""
+        if self._memmap is None:
+            return
+        if self.row < self.shard_rows:
+            rows = np.array(self._memmap[:self.row])
+            self._memmap = None
+            np.save(self._path(self.shard), rows)
+        else:
+            self._flush()
+
+
+def iter_photo_occurrences(review_dataset_dir, store):
+    """
+    Генератор вхождений скачанных фотографий в отзывы: словари с ключами полей OCCURRENCE_SCHEMA
+    и путём к файлу в хранилище.
+
+    Ссылки проверяются по индексу хранилища порциями по LOOKUP_CHUNK, одним запросом на порцию.
+    """
+    columns = ["product_article", "author_name", "published_at", "photo_urls"]
+    pending = []  # Вхождения, ссылки которых ещё не проверены по индексу
+    urls = set()
+    for batch in open_review_dataset(review_dataset_dir).to_batches(columns=columns):
+        for review in batch.to_pylist():
+            key = review_key(review["product_article"], review["author_name"], review["published_at"])
+            for photo_index, url in enumerate(review["photo_urls"] or ()):
+                pending.append({
+                    "product_article": review["product_article"],
+                    "review_key": key,
+                    "photo_index": photo_index,
+                    "photo_url": url,
+                })
+                urls.add(url)
+                if len(urls) >= LOOKUP_CHUNK:
+                    yield from _resolve_occurrences(store, pending, urls)
+                    pending, urls = [], set()
+    yield from _resolve_occurrences(store, pending, urls)
+
+
+def _resolve_occurrences(store, pending, urls):
+    """Дополняет порцию вхождений данными индекса хранилища; нескачанные фотографии отбрасываются."""
+    if not pending:
+        return
+    entries = store.lookup_many(list(urls))
+    for occurrence in pending:
+        entry = entries.get(occurrence["photo_url"])
+        if entry is None or entry["status"] != STATUS_DONE:
+            continue
+        yield dict(occurrence, content_hash=entry["content_hash"], path=os.path.join(store.root, entry["path"]))
+
+
+def preprocess_images(review_dataset_dir, image_dir, output_dir, image_sizes=IMAGE_SIZES,
+                      shard_rows=SHARD_ROWS, workers=PREPROCESS_WORKERS):
+    """
+    Декодирует скачанные фотографии из отзывов в пуле процессов и упаковывает их в шарды.
+
+    Для каждого размера из image_sizes создаётся каталог `<output_dir>/<size>x<size>` с шардами;
+    строки шардов разных размеров совпадают. Таблица `<output_dir>/index.parquet` сопоставляет
+    строку шарда с артикулом, отзывом и ссылкой на фотографию.
+
+    :param review_dataset_dir: Каталог набора данных с отзывами.
+    :param image_dir: Каталог хранилища изображений (см. image_store.ImageStore).
+    :return: Словарь с количеством записанных изображений, вхождений и битых файлов.
+    """
+    # Вхождения читаются порциями и хранятся по столбцам; каждое уникальное содержимое декодируется один раз
+    paths = {}
+    occurrence_batches = []
+    with ImageStore(image_dir) as store:
+        occurrences = iter_photo_occurrences(review_dataset_dir, store)
+        while True:
+            chunk = list(islice(occurrences, OCCURRENCE_CHUNK))
+            if not chunk:
+                break
+            for occurrence in chunk:
+                paths.setdefault(occurrence["content_hash"], occurrence["path"])
+            occurrence_batches.append(pa.RecordBatch.from_pylist(chunk, schema=OCCURRENCE_SCHEMA))
+    content_hashes = list(paths)
+    total_occurrences = sum(batch.num_rows for batch in occurrence_batches)
+    logging.info(f"Предобработка изображений: {len(content_hashes)} уникальных из {total_occurrences} вхождений.")
+
+    writers = [ShardWriter(shard_directory(output_dir, size), size, shard_rows) for size in image_sizes]
+    placement = {}  # content_hash -> (shard, row, width, height)
+    invalid = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Задачи подаются блоками, чтобы не создавать future на каждое изображение сразу
+            for start in range(0, len(content_hashes), shard_rows):
+                block = content_hashes[start:start + shard_rows]
+                jobs = [(paths[content_hash], tuple(image_sizes)) for content_hash in block]
+                results = executor.map(_load_job, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+                for content_hash, (arrays, dimensions, error) in zip(block, results):
+                    if error is not None:
+                        invalid += 1
+                        logging.warning(f"Изображение пропущено: {error}")
+                        continue
+                    for writer, array in zip(writers, arrays):
+                        shard, row = writer.append(array)
+                    placement[content_hash] = (shard, row) + dimensions
+                logging.info(f"Предобработано {start + len(block)} из {len(content_hashes)} изображений.")
+    finally:
+        for writer in writers:
+            writer.close()
+
+    # Кластеры дубликатов позволяют не разносить копии одной фотографии по обучающей и тестовой выборкам
+    duplicates_path = os.path.join(image_dir, DUPLICATES_FILE)
+    duplicate_clusters = {}
+    if os.path.exists(duplicates_path):
+        duplicates = pq.read_table(duplicates_path, columns=["cluster", "content_hash"]).to_pydict()
+        duplicate_clusters = dict(zip(duplicates["content_hash"], duplicates["cluster"]))
+
+    index_path = os.path.join(output_dir, SHARD_INDEX_FILE)
+    written = 0
+    with pq.ParquetWriter(index_path + ".tmp", SHARD_INDEX_SCHEMA) as index_writer:
+        for batch in occurrence_batches:
+            found = [placement.get(content_hash) for content_hash in batch.column("content_hash").to_pylist()]
+            placed = [index for index, place in enumerate(found) if place is not None]
+            if not placed:
+                continue
+            batch = batch.take(pa.array(placed, pa.int64()))
+            places = [found[index] for index in placed]
+            columns = {name: batch.column(name) for name in OCCURRENCE_SCHEMA.names}
+            columns.update(shard=[place[0] for place in places], row=[place[1] for place in places],
+                           width=[place[2] for place in places], height=[place[3] for place in places],
+                           duplicate_cluster=[duplicate_clusters.get(content_hash)
+                                              for content_hash in columns["content_hash"].to_pylist()])
+            index_writer.write_table(pa.table({name: columns[name] for name in SHARD_INDEX_SCHEMA.names},
+                                              schema=SHARD_INDEX_SCHEMA))
+            written += len(placed)
+    os.replace(index_path + ".tmp", index_path)
+
+    summary = {"images": len(placement), "occurrences": written, "invalid": invalid}
+    logging.info(f"Шарды записаны в {output_dir}: {summary}")
+    return summary
+
+
+def open_shards(output_dir, image_size=IMAGE_SIZES[0]):
+    """Открывает шарды заданного размера только для чтения (без загрузки в память)."""
+    paths = sorted(glob.glob(os.path.join(shard_directory(output_dir, image_size), "shard-*.npy")))
+    return [np.load(path, mmap_mode="r") for path in paths]
+
+
+def read_shard_index(output_dir):
+    """Читает таблицу соответствия строк шардов отзывам."""
+    return pq.read_table(os.path.join(output_dir, SHARD_INDEX_FILE))
+
+
+def iter_shard_batches(output_dir, image_size=IMAGE_SIZES[0], batch_size=256):
+    """
+    Генератор пакетов изображений для обучения: кортежи (shard, первая строка, массив).
+
+    Массив - срез memmap, то есть данные читаются с диска по мере обращения без копирования.
+    Строку пакета можно сопоставить с отзывом по (shard, row) в таблице read_shard_index.
+    """
+    for shard, images in enumerate(open_shards(output_dir, image_size)):
+        for start in range(0, len(images), batch_size):
+            yield shard, start, images[start:start + batch_size]
@@ -1,71 +1,263 @@
 
 import os  # Для работы с операционной системой
-from urllib.parse import urljoin  # Для объединения URL
-from selenium.webdriver.common.by import By  # Для поиска элементов на странице
-from selenium.webdriver.support.ui import WebDriverWait  # Для ожидания загрузки элементов
-from selenium.webdriver.support import expected_conditions as EC  # Для условий ожидания
-import time  # Для работы с временем
-import random  # Для генерации случайных чисел
+import re  # Для разбора артикула и чисел из текста
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode  # Для работы с URL
 import logging  # Для ведения логов
-import pandas as pd
+import pyarrow.parquet as pq
+
+from utils import By, scroll_page_to_bottom, get_next_page_button, get_texts_by_xpath, get_outer_html, open_page, \
+    wait_for_xpath
+from storage import get_parquet_writer, parquet_files
+from records import ProductRecord, PRODUCT_SCHEMA, PRODUCT_RAW_SCHEMA, normalize_products
+from metrics import timed
+from snapshots import capture
+
+# XPath-выражения страницы товара (общие для WebDriver и разбора HTML без браузера, см. html_extract)
+PRODUCT_LINK_XPATH = '//article/div/a'
+ARTICLE_XPATH = '//*[@id="productNmId"]'
+BRAND_XPATH = '//*[@class="product-page__header"]/a'
+NAME_XPATH = '//*[@class="product-page__header"]/h1'
+PRICE_XPATH = '//*[@class="product-page__price-block product-page__price-block--common hide-mobile"]/div/div/div/div/p/span/ins'
+POPUP_XPATH = '/html/body/div[1]/div[@class="popup__content"]'
+
+# Артикул в ссылке на карточку товара
+ARTICLE_URL_PATTERN = re.compile(r"/catalog/(\d+)/")
+# CSS-селекторы цены и количества отзывов внутри карточки каталога
+LISTING_SELECTORS = {
+    "price": ".price__lower-price",
+    "reviews_count": ".product-card__count",
+}
+# Скрипт, собирающий ссылки, цены и количество отзывов всех карточек страницы каталога.
+# arguments[0] - XPath ссылок на карточки, arguments[1] - LISTING_SELECTORS.
+LISTING_SCRIPT = """
+const linkXpath = arguments[0], selectors = arguments[1];
+const snapshot = document.evaluate(linkXpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+const entries = [];
+for (let i = 0; i < snapshot.snapshotLength; i++) {
+    const link = snapshot.snapshotItem(i);
+    if (!link.href) continue;
+    const card = link.closest("article") || link.parentElement;
+    const text = selector => { const node = card.querySelector(selector); return node ? node.innerText : null; };
+    entries.push({url: link.href, price: text(selectors.price), reviews_count: text(selectors.reviews_count)});
+}
+return entries;
+"""
+
+# Поля всплывающего окна характеристик: (ключ, XPath относительно окна, название для логов)
+DESCRIPTION_FIELDS = [
+    ("color", './/table[1]//td/span', "Цвет товара"),
+    ("number_of_units", './/table[2]//td/span', "Количество единиц в упаковке"),
+    ("diapers_type", './/table[3]//tbody/tr[1]/td/span', "Тип товара"),
+    ("weight_category", './/table[3]//tbody/tr[2]/td/span', "Весовая категория"),
+    ("shipping_weight", './/table[3]//tbody/tr[3]/td/span', "Вес товара с упаковкой"),
+    ("producing_country", './/table[3]//tbody/tr[4]/td/span', "Страна производства"),
+    ("equipment", './/table[3]//tbody/tr[5]/td/span', "Комплектация"),
+]
+# Размеры упаковки (длина, высота, ширина) и описание товара
+SIZE_KEYS = ("length", "height", "width")
+SIZE_XPATHS = [
+    './/table[4]//tbody/tr[1]/td/span',
+    './/table[4]//tbody/tr[2]/td/span',
+    './/table[4]//tbody/tr[3]/td/span',
+]
+DESCRIPTION_XPATH = './/section/p'
+
+# Все XPath окна характеристик по ключам сырых данных (см. description_from_raw)
+DESCRIPTION_RAW_XPATHS = {
+    **{key: xpath for key, xpath, _ in DESCRIPTION_FIELDS},
+    **dict(zip(SIZE_KEYS, SIZE_XPATHS)),
+    "description": DESCRIPTION_XPATH,
+}
+# XPath основных полей страницы товара по ключам сырых данных
+PRODUCT_RAW_XPATHS = {
+    "product_article": ARTICLE_XPATH,
+    "brand": BRAND_XPATH,
+    "name": NAME_XPATH,
+    "price": PRICE_XPATH,
+}
+
+
+def parse_price(price_text):
+    """
+    Преобразует текст цены (например, "2 437 ₽") в число.
+
+    :return: Цена в рублях или None, если текст пустой.
+    :raises ValueError: Если текст не удаётся преобразовать в число.
+    """
+    if not price_text.strip():
+        return None
+    # Убираем пробелы и символ рубля, затем преобразуем в число
+    return int(price_text.replace("\u00A0", "").replace("₽", "").strip())
 
-from utils import scroll_page_to_bottom, get_next_page_button
-TIMEOUT = (0.5, 2.0)
 
-def get_product_links(driver, start_page):
-    """Собирает ссылки на карточки товаров со страниц, начиная с заданного URL."""
-    product_links = []  # Список для хранения ссылок на товары
+def format_overall_size(length, height, width):
+    """Собирает габариты упаковки в строку "ДхВхШ" из текстов вида "30 см"."""
+    return "x".join(value.strip().replace(' см', '') for value in (length, height, width))
+
+
+def description_from_raw(raw):
+    """
+    Собирает данные окна характеристик из сырых текстов.
+
+    :param raw: Словарь {ключ из DESCRIPTION_RAW_XPATHS: текст или None}.
+    :return: Словарь popup_data (ненайденные поля отсутствуют, как в get_description_data).
+    """
+    popup_data = {}
+    for key, _, label in DESCRIPTION_FIELDS:
+        if raw.get(key) is not None:
+            popup_data[key] = raw[key]
+        else:
+            logging.warning("Не удалось извлечь поле '%s'.", label)
+
+    sizes = [raw.get(key) for key in SIZE_KEYS]
+    if None not in sizes:
+        popup_data["overall_size"] = format_overall_size(*sizes)
+    else:
+        logging.warning("Не удалось извлечь размеры упаковки.")
+
+    if raw.get("description") is not None:
+        popup_data["description"] = raw["description"]
+    else:
+        logging.warning("Не удалось извлечь описание товара.")
+    return popup_data
+
+
+def product_from_raw(raw, popup_data=None):
+    """
+    Собирает запись о товаре из сырых текстов основных полей и данных окна характеристик.
+
+    :param raw: Словарь {ключ из PRODUCT_RAW_XPATHS: текст или None}.
+    :param popup_data: Результат description_from_raw или get_description_data.
+    :return: ProductRecord.
+    """
+    price = None
+    price_text = raw.get("price")
+    if price_text is not None:
+        try:
+            price = parse_price(price_text)
+        except ValueError as ve:
+            logging.error(f"Ошибка преобразования текста цены: '{price_text}' в число: {ve}")
+
+    return ProductRecord(
+        product_article=raw.get("product_article"),
+        brand=raw.get("brand"),
+        name=raw.get("name"),
+        price=price,
+        **(popup_data or {}),
+    )
+
+
+def parse_article_from_url(url):
+    """Извлекает артикул товара из ссылки вида .../catalog/123456/detail.aspx (None, если не найден)."""
+    match = ARTICLE_URL_PATTERN.search(url or "")
+    return match.group(1) if match else None
+
+
+def parse_count(text):
+    """Извлекает целое число из текста вида "1 234 оценки" или "2 437 ₽" (None, если цифр нет)."""
+    digits = re.sub(r"\D", "", text or "")
+    return int(digits) if digits else None
+
+
+@timed("listing")
+def get_listing_entries(driver):
+    """
+    Возвращает данные карточек текущей страницы каталога одним вызовом execute_script.
+
+    :return: Список словарей с ключами url, product_article, price, reviews_count.
+    """
+    raw_entries = driver.execute_script(LISTING_SCRIPT, PRODUCT_LINK_XPATH, LISTING_SELECTORS) or []
+    return [
+        {
+            "url": raw["url"],
+            "product_article": parse_article_from_url(raw["url"]),
+            "price": parse_count(raw["price"]),
+            "reviews_count": parse_count(raw["reviews_count"]),
+        }
+        for raw in raw_entries
+    ]
+
+
+def listing_page_url(category_url, page_number):
+    """Возвращает URL страницы каталога с номером page_number (остальные параметры запроса сохраняются)."""
+    parts = urlsplit(category_url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key != "page"]
+    query.append(("page", str(page_number)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def read_listing_page(driver, category_url, page_number):
+    """
+    Открывает страницу каталога и собирает данные её карточек.
+
+    :return: tuple: (список словарей, см. get_listing_entries; есть ли следующая страница).
+    """
+    current_page_url = listing_page_url(category_url, page_number)
+    logging.info("Собираем ссылки со страницы %d (%s).", page_number, current_page_url)
+    open_page(driver, current_page_url)  # Переход на страницу с учётом ограничения частоты запросов
+    scroll_page_to_bottom(driver, PRODUCT_LINK_XPATH)  # Прокрутка, пока подгружаются карточки
+
+    page_entries = get_listing_entries(driver)
+    if not page_entries:
+        return page_entries, False
+    logging.info("На странице %d найдено %d ссылок.", page_number, len(page_entries))
+    # Следующая страница открывается по URL, кнопка только показывает, что она есть
+    return page_entries, get_next_page_button(driver) is not None
+
+
+def iter_product_listing(driver, start_page, max_pages=None):
+    """
+    Генератор данных карточек товаров по страницам каталога, начиная с заданного URL.
+
+    Для каждой страницы отдаётся список словарей (см. get_listing_entries): кроме ссылки
+    в нём есть артикул, цена и количество отзывов, по которым инкрементальный обход
+    (см. article_index) решает, нужно ли открывать карточку.
+
+    :param max_pages: Максимальное количество страниц (None - до последней страницы каталога).
+    """
     page_number = 1  # Номер текущей страницы
+    total = 0  # Всего найдено карточек
 
-    while page_number < 4:
-        current_page_url = f"{start_page}?page={page_number}"
-        
-        logging.info(f"Собираем ссылки со страницы {page_number} ({current_page_url}).")
-        driver.get(current_page_url)  # Переход на страницу
-        time.sleep(random.uniform(*TIMEOUT))  # Ожидание загрузки страницы
-        scroll_page_to_bottom(driver)  # Прокрутка страницы до конца
-
-        # Поиск элементов с товарами
-        products = driver.find_elements(By.XPATH, '//article/div/a')
-        if not products:
-            logging.warning(f"На странице {page_number} не найдено товаров. Прерывание.")
+    while max_pages is None or page_number <= max_pages:
+        # Данные карточек товаров со страницы
+        page_entries, has_next = read_listing_page(driver, start_page, page_number)
+        if not page_entries:
+            logging.warning("На странице %d не найдено товаров. Прерывание.", page_number)
             break
 
-        # Получение ссылок
-        page_links = [product.get_attribute("href") for product in products if product.get_attribute("href")]
-        logging.info(f"На странице {page_number} найдено {len(page_links)} ссылок.")
-
-        product_links.extend(page_links)  # Добавление ссылок в общий список
+        total += len(page_entries)
+        yield page_entries
 
-        # Проверяем наличие кнопки "Следующая страница"
-        next_button = get_next_page_button(driver)
-        if next_button:
-            logging.info("Переход на следующую страницу.")
-            next_button.click()  # Переход на следующую страницу
-            time.sleep(random.uniform(*TIMEOUT))  # Ожидание загрузки следующей страницы
-            page_number += 1  # Увеличение номера страницы
-        else:
+        if not has_next:
             logging.info("Последняя страница достигнута. Завершаем сбор ссылок.")
             break
+        logging.info("Переход на следующую страницу.")
+        page_number += 1  # Увеличение номера страницы
+
+    logging.info(f"Сбор завершён. Всего собрано {total} ссылок.")
+
+
+def get_product_listing(driver, start_page, max_pages=None):
+    """Собирает данные карточек товаров со всех страниц каталога одним списком."""
+    return [entry for page_entries in iter_product_listing(driver, start_page, max_pages) for entry in page_entries]
 
-    logging.info(f"Сбор завершён. Всего собрано {len(product_links)} ссылок.")
-    return product_links  # Возврат списка ссылок на товары
+
+def get_product_links(driver, start_page, max_pages=None):
+    """Собирает ссылки на карточки товаров со страниц, начиная с заданного URL."""
+    return [entry["url"] for entry in get_product_listing(driver, start_page, max_pages)]
 
 
 def get_price(driver):
     """Извлекает и форматирует цену товара."""
     try:
         # Находим элемент цены с использованием точного XPath
-        price_element = driver.find_element(By.XPATH, '//*[@class="product-page__price-block product-page__price-block--common hide-mobile"]/div/div/div/div/p/span/ins')
+        price_element = driver.find_element(By.XPATH, PRICE_XPATH)
         price_text = price_element.text  # Получаем текст, например, "2 437 ₽"
 
+        price = parse_price(price_text)
         # Проверяем, что текст цены не пуст
-        if not price_text.strip():
+        if price is None:
             logging.error("Текст цены пустой. Проверьте XPath или структуру страницы.")
-            return None
-
-        # Убираем пробелы и символ рубля, затем преобразуем в число
-        price = int(price_text.replace("\u00A0", "").replace("₽", "").strip())
         return price
     except ValueError as ve:
         # Логируем ошибку преобразования текста в число
@@ -82,8 +274,7 @@ def get_full_description_button(driver):
     try:
         button = driver.find_element(By.XPATH, '//button[contains(text(), "Все характеристики и описание")]')
         button.click()
-        logging.info("Кнопка 'Все характеристики и описание' найдена и нажата.")
-        time.sleep(random.uniform(*TIMEOUT))  # Ожидание открытия всплывающего окна
+        logging.debug("Кнопка 'Все характеристики и описание' найдена и нажата.")
     except Exception as e:
         logging.error(f"Не удалось найти или нажать кнопку 'Все характеристики и описание': {e}")
 
@@ -94,90 +285,49 @@ def close_description_window(driver):
         # Проверяем, существует ли кнопка закрытия всплывающего окна
         close_button = driver.find_element(By.XPATH, '/html/body/div[1]/a')
         close_button.click()
-        logging.info("Всплывающее окно успешно закрыто.")
+        logging.debug("Всплывающее окно успешно закрыто.")
     except Exception as e:
         logging.error(f"Не удалось закрыть всплывающее окно: {e}")
 
 
+@timed("description")
 def get_description_data(driver):
     """Извлекает данные из всплывающего окна после его открытия."""
     try:
         # Подождем загрузку окна
-        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.XPATH, '/html/body/div[1]/div')))
-        logging.info("Всплывающее окно успешно загружено.")
+        wait_for_xpath(driver, POPUP_XPATH, 10)
+        logging.debug("Всплывающее окно успешно загружено.")
 
         # Находим родительский элемент
-        char_desc_elem = driver.find_element(By.XPATH, '/html/body/div[1]/div[@class="popup__content"]')
+        char_desc_elem = driver.find_element(By.XPATH, POPUP_XPATH)
 
         popup_data = {}
 
         # Извлечение данных по каждому элементу
-        try:
-            color = char_desc_elem.find_element(By.XPATH, './/table[1]//td/span').text
-            popup_data["color"] = color
-            logging.info(f"Цвет товара: {color}")
-        except Exception as e:
-            logging.warning(f"Не удалось извлечь цвет товара: {e}")
-        
-        try:
-            number_units = char_desc_elem.find_element(By.XPATH, './/table[2]//td/span').text
-            popup_data["number_of_units"] = number_units
-            logging.info(f"Количество единиц в упаковке: {number_units}")
-        except Exception as e:
-            logging.warning(f"Не удалось извлечь количество единиц: {e}")
-
-        try:
-            product_type = char_desc_elem.find_element(By.XPATH, './/table[3]//tbody/tr[1]/td/span').text
-            popup_data["diapers_type"] = product_type
-            logging.info(f"Тип товара: {product_type}")
-        except Exception as e:
-            logging.warning(f"Не удалось извлечь тип товара: {e}")
-
-        try:
-            weight_category = char_desc_elem.find_element(By.XPATH, './/table[3]//tbody/tr[2]/td/span').text
-            popup_data["weight_category"] = weight_category
-            logging.info(f"Весовая категория: {weight_category}")
-        except Exception as e:
-            logging.warning(f"Не удалось извлечь весовую категорию: {e}")
-
-        try:
-            shipping_weight = char_desc_elem.find_element(By.XPATH, './/table[3]//tbody/tr[3]/td/span').text
-            popup_data["shipping_weight"] = shipping_weight
-            logging.info(f"Вестовара с упаковкой: {shipping_weight}")
-        except Exception as e:
-            logging.warning(f"Не удалось извлечь вестовара с упаковкой: {e}")
-
-        try:
-            producing_country = char_desc_elem.find_element(By.XPATH, './/table[3]//tbody/tr[4]/td/span').text
-            popup_data["producing_country"] = producing_country
-            logging.info(f"Страна производства: {producing_country}")
-        except Exception as e:
-            logging.warning(f"Не удалось извлечь страну производства: {e}")
-
-        try:
-            equipment = char_desc_elem.find_element(By.XPATH, './/table[3]//tbody/tr[5]/td/span').text
-            popup_data["equipment"] = equipment
-            logging.info(f"Комплектация: {equipment}")
-        except Exception as e:
-            logging.warning(f"Не удалось извлечь комплектацию: {e}")
+        for key, xpath, label in DESCRIPTION_FIELDS:
+            try:
+                value = char_desc_elem.find_element(By.XPATH, xpath).text
+                popup_data[key] = value
+                logging.debug("%s: %s", label, value)
+            except Exception as e:
+                logging.warning("Не удалось извлечь поле '%s': %s", label, e)
 
         # Извлечение размеров упаковки
         try:
-            length = char_desc_elem.find_element(By.XPATH, './/table[4]//tbody/tr[1]/td/span').text.strip().replace(' см', '')
-            height = char_desc_elem.find_element(By.XPATH, './/table[4]//tbody/tr[2]/td/span').text.strip().replace(' см', '')
-            width = char_desc_elem.find_element(By.XPATH, './/table[4]//tbody/tr[3]/td/span').text.strip().replace(' см', '')
-            overall_size = f"{length}x{height}x{width}"
+            overall_size = format_overall_size(
+                *(char_desc_elem.find_element(By.XPATH, xpath).text for xpath in SIZE_XPATHS)
+            )
             popup_data["overall_size"] = overall_size
-            logging.info(f"Габариты товара, см (ДхВхШ): {overall_size}")
+            logging.debug("Габариты товара, см (ДхВхШ): %s", overall_size)
         except Exception as e:
-            logging.warning(f"Не удалось извлечь размеры упаковки: {e}")
+            logging.warning("Не удалось извлечь размеры упаковки: %s", e)
 
         try:
-            description = char_desc_elem.find_element(By.XPATH, './/section/p').text
+            description = char_desc_elem.find_element(By.XPATH, DESCRIPTION_XPATH).text
             popup_data["description"] = description
-            logging.info(f"Описание товара: {description}")
+            logging.debug("Описание товара: %.80s", description)
         except Exception as e:
-            logging.warning(f"Не удалось извлечь описание товара: {e}")
+            logging.warning("Не удалось извлечь описание товара: %s", e)
 
         return popup_data
 
@@ -186,38 +336,90 @@ def get_description_data(driver):
         return None
 
 
+@timed("description")
+def get_description_data_js(driver):
+    """Извлекает данные из открытого всплывающего окна одним вызовом execute_script."""
+    try:
+        wait_for_xpath(driver, POPUP_XPATH, 10)
+        raw = get_texts_by_xpath(driver, DESCRIPTION_RAW_XPATHS, POPUP_XPATH)
+        if raw is None:
+            logging.error("Всплывающее окно не найдено.")
+            return None
+        return description_from_raw(raw)
+    except Exception as e:
+        logging.error(f"Ошибка при извлечении данных из всплывающего окна: {e}")
+        return None
+
+
+def get_product_data_js(driver, product_url, snapshot=None):
+    """
+    Извлекает всю информацию о товаре, читая поля страницы и окна характеристик
+    одним вызовом execute_script на каждое (вместо отдельного find_element на каждое поле).
+
+    :param snapshot: Словарь, в который сохраняется HTML страницы ("page") и окна характеристик
+                     ("popup") для архива снимков (см. snapshots).
+    """
+    logging.debug("Открываем страницу товара: %s", product_url)
+    open_page(driver, product_url)
+
+    try:
+        raw = get_texts_by_xpath(driver, PRODUCT_RAW_XPATHS)
+    except Exception as e:
+        logging.error(f"Не удалось извлечь основные данные товара: {e}")
+        raw = {}
+    capture(snapshot, "page", lambda: driver.page_source)
+
+    # Открываем всплывающее окно и извлекаем данные
+    get_full_description_button(driver)
+    popup_data = get_description_data_js(driver)
+    capture(snapshot, "popup", lambda: get_outer_html(driver, POPUP_XPATH))
+    close_description_window(driver)
+
+    product_data = product_from_raw(raw, popup_data)
+    logging.debug("Собраны данные о товаре %s: %s", product_data.product_article, product_data.name)
+    return product_data
+
+
+@timed("product")
+def get_product_data(driver, product_url, use_js=True, snapshot=None):
+    """
+    Извлекает всю информацию о товаре, включая данные из всплывающего окна, в ProductRecord.
 
-def get_product_data(driver, product_url):
-    """Извлекает всю информацию о товаре, включая данные из всплывающего окна."""
-    logging.info(f"Открываем страницу товара: {product_url}")
-    driver.get(product_url)
-    time.sleep(random.uniform(*TIMEOUT))
+    :param use_js: Читать поля одним execute_script (get_product_data_js) вместо отдельных find_element.
+    :param snapshot: Словарь для HTML страницы и окна характеристик (см. get_product_data_js).
+    """
+    if use_js:
+        return get_product_data_js(driver, product_url, snapshot)
+
+    logging.debug("Открываем страницу товара: %s", product_url)
+    open_page(driver, product_url)
+    capture(snapshot, "page", lambda: driver.page_source)
     
     # Извлекаем основные данные на странице товара
     try:
-        product_id = driver.find_element(By.XPATH, '//*[@id="productNmId"]').text
-        logging.info(f"Артикул товара: {product_id}")
+        product_id = driver.find_element(By.XPATH, ARTICLE_XPATH).text
+        logging.debug("Артикул товара: %s", product_id)
     except Exception as e:
         logging.error(f"Не удалось извлечь артикул товара: {e}")
         product_id = None
     
     try:
-        brand = driver.find_element(By.XPATH, '//*[@class="product-page__header"]/a').text
-        logging.info(f"Бренд товара: {brand}")
+        brand = driver.find_element(By.XPATH, BRAND_XPATH).text
+        logging.debug("Бренд товара: %s", brand)
     except Exception as e:
         logging.error(f"Не удалось извлечь бренд товара: {e}")
         brand = None
     
     try:
-        name = driver.find_element(By.XPATH, '//*[@class="product-page__header"]/h1').text
-        logging.info(f"Название товара: {name}")
+        name = driver.find_element(By.XPATH, NAME_XPATH).text
+        logging.debug("Название товара: %s", name)
     except Exception as e:
         logging.error(f"Не удалось извлечь название товара: {e}")
         name = None
     
     try:
         price = get_price(driver)  # Используем отдельную функцию для цены
-        logging.info(f"Цена товара: {price}")
+        logging.debug("Цена товара: %s", price)
     except Exception as e:
         logging.error(f"Не удалось извлечь цену товара: {e}")
         price = None
@@ -226,47 +428,58 @@ def get_product_data(driver, product_url):
     try:
         get_full_description_button(driver)
         popup_data = get_description_data(driver)
-        logging.info("Данные из всплывающего окна успешно извлечены.")
+        logging.debug("Данные из всплывающего окна успешно извлечены.")
+        capture(snapshot, "popup", lambda: get_outer_html(driver, POPUP_XPATH))
         close_description_window(driver)    # Закрываем всплывающее окно
     except Exception as e:
         logging.error(f"Не удалось извлечь данные из всплывающего окна: {e}")
         popup_data = {}
 
-    # Объединяем данные
-    product_data = {
-        "product_article": product_id,
-        "brand": brand,
-        "name": name,
-        "price": price
-    }
-    
-    # Если данные из всплывающего окна успешно получены, добавляем их к product_data
-    if popup_data:
-        product_data.update(popup_data)
+    # Объединяем данные с данными всплывающего окна (если они получены)
+    product_data = ProductRecord(product_article=product_id, brand=brand, name=name, price=price,
+                                 **(popup_data or {}))
     
-    logging.info(f"Собраны данные о товаре: {product_data}")
+    logging.debug("Собраны данные о товаре %s: %s", product_data.product_article, product_data.name)
     return product_data
 
 
+def get_product_writer(parquet_file):
+    """Возвращает писатель товаров для файла products.parquet (см. storage.BufferedParquetWriter)."""
+    return get_parquet_writer(parquet_file, PRODUCT_SCHEMA, raw_schema=PRODUCT_RAW_SCHEMA,
+                              normalize=normalize_products)
+
+
+@timed("save_product")
 def save_product_data_to_parquet(product_data, parquet_file):
-    """Сохраняет данные о товаре в файл products.parquet."""
-    try:
-        # Создаем DataFrame для добавления данных о товаре
-        df_product = pd.DataFrame([product_data])
-        
-        # Если файл существует, то добавляем новые данные, иначе создаем новый
-        if os.path.exists(parquet_file):
-            # Загружаем существующие данные
-            existing_data = pd.read_parquet(parquet_file)
-            # Добавляем новые данные с помощью concat
-            updated_data = pd.concat([existing_data, df_product], ignore_index=True)
-            # Сохраняем обновленные данные обратно в файл
-            updated_data.to_parquet(parquet_file, index=False)
-        else:
-            # Если файл не существует, создаем новый
-            df_product.to_parquet(parquet_file, index=False)
-        
-        logging.info(f"Данные о товаре сохранены в {parquet_file}.")
-    except Exception as e:
-        logging.error(f"Ошибка при сохранении данных о товаре: {e}")
-        
\ No newline at end of file
+    """
+    Сохраняет данные о товаре рядом с файлом products.parquet.
+
+    Запись попадает в буфер долгоживущего писателя и сбрасывается на диск отдельными файлами-частями,
+    поэтому стоимость вызова не зависит от количества уже сохранённых товаров. До сброса запись
+    только в памяти: отмечать товар сохранённым нужно через get_product_writer(...).when_flushed.
+    При сбросе буфера поля приводятся к типам PRODUCT_SCHEMA (см. records.normalize_products).
+
+    Ошибка записи (в том числе сброса буфера, случившегося при этом вызове) не перехватывается:
+    карточка, товар которой не попал на диск, должна быть отмечена неудачной.
+
+    :param product_data: ProductRecord (или словарь с теми же ключами).
+    """
+    get_product_writer(parquet_file).write(product_data)
+    logging.debug("Данные о товаре добавлены в буфер %s.", parquet_file)
+
+
+def read_product_articles(path):
+    """
+    Возвращает множество артикулов, сохранённых в файле или каталоге с товарами
+    (читается только одна колонка, временные файлы писателей пропускаются).
+    """
+    articles = set()
+    if not os.path.exists(path):
+        return articles
+    for parquet_file in parquet_files(path):
+        try:
+            table = pq.read_table(parquet_file, columns=["product_article"])
+            articles.update(table.column("product_article").to_pylist())
+        except Exception as e:
+            logging.error(f"Не удалось прочитать артикулы из {parquet_file}: {e}")
+    return articles
@@ -0,0 +1,259 @@
+import os  # Для работы с операционной системой
+import logging  # Для ведения логов
+from datetime import datetime, date, timezone  # Для границ окна дат
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from records import PRODUCT_SCHEMA, UTC_SECONDS
+from reviews import open_review_dataset
+from storage import parquet_files
+
+# Запросы к собранным данным без загрузки всего набора в pandas.
+#
+# Товары (один файл Parquet) и отзывы (набор с секциями по product_article) открываются через
+# pyarrow.dataset: читаются только нужные колонки, условия передаются сканеру, который отбрасывает
+# лишние группы строк по статистике, а лишние секции отзывов - по пути каталога. Результат отдаётся
+# пакетами (RecordBatch), поэтому память не зависит от объёма набора.
+#
+# Условия строятся через pyarrow.compute (те же выражения, что и ds.field), а сам pyarrow.dataset
+# вместе с pandas, который он импортирует, загружается только при открытии набора.
+
+BATCH_SIZE = 65536  # Максимальное количество строк в одном пакете
+
+# Колонки товара, добавляемые к отзывам при соединении по умолчанию
+JOIN_PRODUCT_COLUMNS = ("brand", "name", "price", "diapers_type", "weight_category")
+
+
+def open_product_dataset(product_file):
+    """
+    Открывает файл или каталог с товарами как pyarrow.dataset со схемой PRODUCT_SCHEMA.
+
+    Читаются только законченные файлы .parquet: временные файлы писателей и копии нечитаемых
+    файлов (имена с точкой в начале) пропускаются, поэтому запрос работает и во время обхода.
+    """
+    import pyarrow.dataset as ds  # Загружается только для чтения наборов: вместе с ним импортируется pandas
+    return ds.dataset(parquet_files(product_file), format="parquet", schema=PRODUCT_SCHEMA)
+
+
+def _all(conditions):
+    """Объединяет условия через И (None, если условий нет)."""
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def _utc_timestamp(value):
+    """Приводит datetime, date или ISO-строку к скаляру времени UTC (наивное время считается UTC)."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return pa.scalar(value, type=UTC_SECONDS)
+
+
+def _values(value):
+    """Одно значение или последовательность значений -> список."""
+    return list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+
+
+def product_filter(brand=None, min_price=None, max_price=None, articles=None, diapers_type=None,
+                   weight_category=None):
+    """
+    Собирает условие отбора товаров для сканера.
+
+    :param brand: Бренд или список брендов.
+    :param min_price: Минимальная цена (включительно).
+    :param max_price: Максимальная цена (включительно).
+    :param articles: Список артикулов.
+    :return: Выражение pyarrow.dataset или None, если условий нет.
+    """
+    conditions = []
+    if brand is not None:
+        conditions.append(pc.field("brand").isin(_values(brand)))
+    if min_price is not None:
+        conditions.append(pc.field("price") >= min_price)
+    if max_price is not None:
+        conditions.append(pc.field("price") <= max_price)
+    if articles is not None:
+        conditions.append(pc.field("product_article").isin([str(article) for article in _values(articles)]))
+    if diapers_type is not None:
+        conditions.append(pc.field("diapers_type").isin(_values(diapers_type)))
+    if weight_category is not None:
+        conditions.append(pc.field("weight_category").isin(_values(weight_category)))
+    return _all(conditions)
+
+
+def review_filter(rating=None, min_rating=None, max_rating=None, since=None, until=None, articles=None,
+                  with_photos=False):
+    """
+    Собирает условие отбора отзывов для сканера.
+
+    :param rating: Оценка или список оценок.
+    :param since: Начало окна дат публикации (включительно): datetime, date или ISO-строка.
+    :param until: Конец окна дат публикации (не включительно).
+    :param articles: Список артикулов: секции остальных товаров не читаются.
+    :param with_photos: Только отзывы хотя бы с одной фотографией.
+    :return: Выражение pyarrow.dataset или None, если условий нет.
+    """
+    conditions = []
+    if articles is not None:
+        conditions.append(pc.field("product_article").isin([str(article) for article in _values(articles)]))
+    if rating is not None:
+        conditions.append(pc.field("rating").isin(_values(rating)))
+    if min_rating is not None:
+        conditions.append(pc.field("rating") >= min_rating)
+    if max_rating is not None:
+        conditions.append(pc.field("rating") <= max_rating)
+    if since is not None:
+        conditions.append(pc.field("published_at") >= _utc_timestamp(since))
+    if until is not None:
+        conditions.append(pc.field("published_at") < _utc_timestamp(until))
+    if with_photos:
+        conditions.append(pc.list_value_length(pc.field("photo_urls")) > 0)
+    return _all(conditions)
+
+
+def iter_product_batches(product_file, columns=None, filter=None, batch_size=BATCH_SIZE):
+    """
+    Генератор пакетов товаров.
+
+    :param columns: Читаемые колонки (по умолчанию все).
+    :param filter: Условие отбора (см. product_filter).
+    """
+    if not os.path.exists(product_file):
+        return
+    scanner = open_product_dataset(product_file).scanner(columns=columns, filter=filter, batch_size=batch_size)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch
+
+
+def iter_review_batches(review_dir, columns=None, filter=None, batch_size=BATCH_SIZE):
+    """
+    Генератор пакетов отзывов (колонка product_article восстанавливается из пути секции).
+
+    :param columns: Читаемые колонки (по умолчанию все).
+    :param filter: Условие отбора (см. review_filter).
+    """
+    if not os.path.isdir(review_dir):
+        return
+    scanner = open_review_dataset(review_dir).scanner(columns=columns, filter=filter, batch_size=batch_size)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch
+
+
+class ProductLookup:
+    """
+    Таблица товаров, проиндексированная по артикулу, для соединения с отзывами.
+
+    Строится один раз: при повторных обходах в файле может быть несколько строк одного товара,
+    остаётся последняя записанная. Соединение пакета отзывов - один поиск index_in по колонке
+    артикулов и выборка take, без словарей Python на каждую строку.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.articles = table.column("product_article").combine_chunks()
+
+    @classmethod
+    def load(cls, product_file, columns=JOIN_PRODUCT_COLUMNS, filter=None):
+        """Читает из файла с товарами только колонки `columns` товаров, подходящих под `filter`."""
+        columns = ["product_article"] + [column for column in columns if column != "product_article"]
+        batches = list(iter_product_batches(product_file, columns, filter))
+        if not batches:
+            return cls(pa.Table.from_batches([], PRODUCT_SCHEMA).select(columns))
+        table = pa.Table.from_batches(batches)
+        # Последняя строка каждого артикула
+        positions = table.append_column("__row", pa.array(range(table.num_rows), pa.int64()))
+        latest = positions.group_by("product_article").aggregate([("__row", "max")]).column("__row_max")
+        table = table.take(latest)
+        logging.info(f"Загружено {table.num_rows} товаров для соединения с отзывами.")
+        return cls(table)
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def article_list(self):
+        """Список артикулов таблицы (для отбора секций отзывов)."""
+        return self.articles.to_pylist()
+
+    def join(self, batch, inner=True):
+        """
+        Добавляет к пакету отзывов колонки товара по product_article.
+
+        :param inner: Отбрасывать отзывы товаров, которых нет в таблице; иначе их колонки товара - null.
+        :return: pyarrow.Table.
+        """
+        indices = pc.index_in(batch.column("product_article"), value_set=self.articles)
+        reviews = pa.Table.from_batches([batch])
+        if inner:
+            found = pc.is_valid(indices)
+            reviews = reviews.filter(found)
+            indices = indices.filter(found)
+        products = self.table.take(indices)
+        for name in products.column_names:
+            if name != "product_article" and name not in reviews.column_names:
+                reviews = reviews.append_column(products.schema.field(name), products.column(name))
+        return reviews
+
+
+def iter_reviews_with_products(review_dir, product_file, review_columns=None,
+                               product_columns=JOIN_PRODUCT_COLUMNS, reviews_where=None, products_where=None,
+                               inner=True, batch_size=BATCH_SIZE):
+    """
+    Генератор пакетов отзывов, соединённых с данными товаров по артикулу.
+
+    Если задано условие на товары, читаются только секции отзывов отобранных товаров.
+    Пример - все отзывы с фотографиями и оценкой 1 бренда X:
+
+        iter_reviews_with_products(review_dir, product_file,
+                                   reviews_where=review_filter(rating=1, with_photos=True),
+                                   products_where=product_filter(brand="X"))
+
+    :param review_columns: Колонки отзывов (по умолчанию все); product_article добавляется всегда.
+    :param product_columns: Добавляемые колонки товара.
+    :param inner: Отбрасывать отзывы товаров, которых нет в файле с товарами.
+    :return: Генератор pyarrow.Table.
+    """
+    lookup = ProductLookup.load(product_file, product_columns, products_where)
+    if products_where is not None:
+        if not len(lookup):
+            return
+        articles_where = pc.field("product_article").isin(lookup.article_list())
+        reviews_where = articles_where if reviews_where is None else reviews_where & articles_where
+    if review_columns is not None and "product_article" not in review_columns:
+        review_columns = list(review_columns) + ["product_article"]
+    for batch in iter_review_batches(review_dir, review_columns, reviews_where, batch_size):
+        joined = lookup.join(batch, inner)
+        if joined.num_rows:
+            yield joined
+
+
+def write_batches(batches, parquet_file, compression="snappy"):
+    """
+    Записывает поток пакетов (RecordBatch или Table) в файл Parquet, не собирая их в памяти.
+
+    :return: Количество записанных строк.
+    """
+    writer = None
+    rows = 0
+    tmp_file = f"{parquet_file}.tmp"
+    try:
+        for batch in batches:
+            table = batch if isinstance(batch, pa.Table) else pa.Table.from_batches([batch])
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_file, table.schema, compression=compression)
+            writer.write_table(table)
+            rows += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(tmp_file, parquet_file)
+    logging.info(f"В {parquet_file} записано {rows} строк.")
+    return rows
@@ -0,0 +1,189 @@
+import re  # Для сопоставления хостов с группами
+import time  # Для работы с временем
+import logging  # Для ведения логов
+import threading  # Для общего планировщика потоков
+from dataclasses import dataclass  # Для параметров групп хостов
+from urllib.parse import urlsplit  # Для определения хоста по URL
+
+from metrics import REGISTRY, record_sleep
+
+# Ограничение частоты запросов к сайту.
+#
+# Запросы к каждой группе хостов (страницы каталога и CDN изображений) проходят через свой
+# "ведро с токенами": токены пополняются со скоростью rate в секунду, запас не больше burst.
+# Скорость подстраивается по схеме AIMD: после каждого быстрого успешного ответа она растёт
+# на постоянную величину, медленный ответ уменьшает её в несколько раз, а ответ 429/503
+# или страница с капчей - вдвое, с паузой для всей группы. Планировщик один на процесс
+# (RATE_LIMITER) и общий для пула браузеров и загрузчика изображений.
+
+THROTTLE_STATUSES = {429, 503}  # Коды ответа, означающие, что сайт просит снизить частоту
+
+
+@dataclass(frozen=True)
+class HostLimits:
+    """Параметры ограничения частоты для группы хостов."""
+    rate: float  # Начальная скорость, запросов в секунду
+    min_rate: float  # Нижняя граница скорости
+    max_rate: float  # Верхняя граница скорости
+    burst: float  # Сколько запросов можно сделать подряд без ожидания
+    increase: float  # На сколько растёт скорость после успешного ответа, запросов в секунду
+    slow_seconds: float  # Ответ дольше - признак перегрузки сайта
+    slow_factor: float = 0.8  # Во сколько раз снижается скорость после медленного ответа
+    throttle_factor: float = 0.5  # Во сколько раз снижается скорость после 429/503 или капчи
+    cooldown: float = 5.0  # Пауза группы после первой блокировки, секунд (удваивается при повторных)
+    max_cooldown: float = 300.0  # Максимальная пауза группы, секунд
+
+
+# Группы хостов: (имя, шаблон имени хоста). Хосты вне групп не ограничиваются.
+HOST_GROUPS = (
+    ("images", re.compile(r"(^|\.)(wbbasket\.ru|wbstatic\.net|wbcontent\.net)$")),  # CDN изображений
+    ("catalog", re.compile(r"(^|\.)wildberries\.ru$")),  # Страницы каталога и товаров
+)
+
+HOST_LIMITS = {
+    "catalog": HostLimits(rate=0.5, min_rate=0.05, max_rate=3.0, burst=2, increase=0.02, slow_seconds=8.0),
+    "images": HostLimits(rate=10.0, min_rate=0.5, max_rate=50.0, burst=10, increase=0.2, slow_seconds=3.0,
+                         cooldown=2.0),
+}
+
+
+class HostBucket:
+    """Ведро токенов одной группы хостов с адаптивной скоростью (не потокобезопасно, см. RateLimiter)."""
+
+    def __init__(self, name, limits, now):
+        self.name = name
+        self.limits = limits
+        self.rate = limits.rate
+        self.tokens = float(limits.burst)
+        self.updated = now  # Момент, до которого токены уже начислены (в паузе - её конец)
+        self.strikes = 0  # Блокировки подряд
+
+    def reserve(self, now):
+        """Забирает один токен и возвращает, сколько секунд нужно подождать до запроса."""
+        if now > self.updated:
+            self.tokens = min(self.limits.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+        self.tokens -= 1
+        return self.updated - now + max(0.0, -self.tokens) / self.rate
+
+    def success(self, seconds):
+        """Аддитивный рост скорости после быстрого ответа, мультипликативное снижение после медленного."""
+        self.strikes = 0
+        if seconds > self.limits.slow_seconds:
+            self.rate = max(self.limits.min_rate, self.rate * self.limits.slow_factor)
+        else:
+            self.rate = min(self.limits.max_rate, self.rate + self.limits.increase)
+
+    def throttled(self, now, retry_after=None):
+        """
+        Снижает скорость и приостанавливает группу после блокировки.
+
+        Ответы на запросы, отправленные до начала паузы, скорость повторно не снижают.
+        :return: Длительность паузы, секунд (0, если группа уже на паузе).
+        """
+        if now < self.updated:
+            return 0.0
+        self.strikes += 1
+        self.rate = max(self.limits.min_rate, self.rate * self.limits.throttle_factor)
+        cooldown = min(self.limits.max_cooldown, self.limits.cooldown * 2 ** (self.strikes - 1))
+        if retry_after:
+            cooldown = max(cooldown, min(self.limits.max_cooldown, retry_after))
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = now + cooldown
+        return cooldown
+
+
+class RateLimiter:
+    """
+    Планировщик запросов: перед запросом вызывается acquire(url), после ответа - report(url, ...).
+
+    acquire блокирует вызывающий поток, пока у группы хоста не появится токен; ожидание
+    учитывается в метриках как пауза парсера. Ограничение действует в пределах процесса.
+    """
+
+    def __init__(self, groups=HOST_GROUPS, limits=HOST_LIMITS, clock=time.monotonic):
+        self.groups = groups
+        self.limits = limits
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def group(self, url):
+        """Возвращает имя группы хоста URL или None, если хост не ограничивается."""
+        host = urlsplit(url).hostname or ""
+        for name, pattern in self.groups:
+            if pattern.search(host):
+                return name if name in self.limits else None
+        return None
+
+    def _bucket(self, url):
+        name = self.group(url)
+        if name is None:
+            return None
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = self._buckets[name] = HostBucket(name, self.limits[name], self.clock())
+        return bucket
+
+    def acquire(self, url):
+        """
+        Ждёт разрешения на запрос к хосту URL.
+
+        :return: Время ожидания, секунд.
+        """
+        with self._lock:
+            bucket = self._bucket(url)
+            if bucket is None:
+                return 0.0
+            wait = bucket.reserve(self.clock())
+        if wait > 0:
+            time.sleep(wait)
+            record_sleep(wait)
+        return wait
+
+    def report(self, url, seconds, throttled=False, retry_after=None):
+        """
+        Сообщает результат запроса к хосту URL.
+
+        :param seconds: Длительность запроса, секунд.
+        :param throttled: Сайт ответил 429/503 или показал капчу.
+        :param retry_after: Пауза, запрошенная сервером (заголовок Retry-After), секунд.
+        """
+        with self._lock:
+            bucket = self._bucket(url)
+            if bucket is None:
+                return
+            if not throttled:
+                bucket.success(seconds)
+                return
+            cooldown = bucket.throttled(self.clock(), retry_after)
+            rate = bucket.rate
+        if cooldown:
+            REGISTRY.increment("rate_limit_throttled_total", group=bucket.name)
+            logging.warning("Сайт ограничивает запросы к группе '%s': пауза %.0f с, "
+                            "скорость снижена до %.2f запросов/с.", bucket.name, cooldown, rate)
+
+    def rates(self):
+        """Текущая скорость по группам, запросов в секунду."""
+        with self._lock:
+            return {name: bucket.rate for name, bucket in self._buckets.items()}
+
+    def reset(self, clock=None, groups=None):
+        """Сбрасывает состояние всех групп (и при необходимости меняет источник времени и группы хостов)."""
+        with self._lock:
+            if clock is not None:
+                self.clock = clock
+            if groups is not None:
+                self.groups = groups
+            self._buckets.clear()
+
+
+RATE_LIMITER = RateLimiter()  # Планировщик процесса по умолчанию
+
+
+def retry_after_seconds(value):
+    """Разбирает заголовок Retry-After в секундах (дата в заголовке не поддерживается)."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,234 @@
+from dataclasses import dataclass, field, fields  # Для записей с фиксированным набором полей
+from datetime import datetime, timezone  # Для времени сбора
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Записи товаров и отзывов и их схемы.
+#
+# Парсер заполняет записи сырыми значениями со страницы (тексты, цена, ISO-строка даты).
+# Перед записью в Parquet пачка записей превращается в таблицу со "сырой" схемой и одним
+# векторизованным проходом (normalize_products / normalize_reviews) приводится к типизированной
+# схеме: числа, категориальные колонки со словарным кодированием и время в UTC.
+# Так схема файлов не зависит от того, какие поля удалось найти на странице, а потребителям
+# не нужно разбирать строки заново.
+
+CATEGORY = pa.dictionary(pa.int32(), pa.string())  # Тип категориальных колонок
+UTC_SECONDS = pa.timestamp("s", tz="UTC")
+UTC_MILLISECONDS = pa.timestamp("ms", tz="UTC")
+
+# Число с необязательной дробной частью через точку или запятую
+_NUMBER = r"\d+(?:[.,]\d+)?"
+
+
+@dataclass(slots=True)
+class ProductRecord:
+    """Данные карточки товара в том виде, в каком они прочитаны со страницы."""
+    product_article: str = None
+    brand: str = None
+    name: str = None
+    price: int = None  # Рублей
+    color: str = None
+    number_of_units: str = None  # Например, "48 шт."
+    diapers_type: str = None
+    weight_category: str = None  # Например, "4-9 кг"
+    shipping_weight: str = None  # Например, "850 г"
+    producing_country: str = None
+    equipment: str = None
+    overall_size: str = None  # "ДхВхШ" в сантиметрах, см. products.format_overall_size
+    description: str = None
+    scraped_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def is_empty(self):
+        """True, если со страницы не удалось извлечь ни одного поля."""
+        return not any(getattr(self, item.name) for item in fields(self) if item.name != "scraped_at")
+
+
+@dataclass(slots=True)
+class ReviewRecord:
+    """Данные отзыва с фотографиями; артикул товара хранится в пути секции набора данных."""
+    photo_urls: list = field(default_factory=list)
+    author_name: str = None
+    published_at: str = None  # ISO-строка из атрибута content, например "2024-11-21T11:29:09Z"
+    rating: int = None
+    review_text: str = None
+
+
+# Схемы сырых записей (таблица, которая строится из пачки записей перед нормализацией)
+PRODUCT_RAW_SCHEMA = pa.schema([
+    ("product_article", pa.string()),
+    ("brand", pa.string()),
+    ("name", pa.string()),
+    ("price", pa.int64()),
+    ("color", pa.string()),
+    ("number_of_units", pa.string()),
+    ("diapers_type", pa.string()),
+    ("weight_category", pa.string()),
+    ("shipping_weight", pa.string()),
+    ("producing_country", pa.string()),
+    ("equipment", pa.string()),
+    ("overall_size", pa.string()),
+    ("description", pa.string()),
+    ("scraped_at", UTC_MILLISECONDS),
+])
+
+REVIEW_RAW_SCHEMA = pa.schema([
+    ("photo_urls", pa.list_(pa.string())),
+    ("author_name", pa.string()),
+    ("published_at", pa.string()),
+    ("rating", pa.int64()),
+    ("review_text", pa.string()),
+])
+
+# Схема файла с товарами
+PRODUCT_SCHEMA = pa.schema([
+    ("product_article", pa.string()),
+    ("brand", CATEGORY),
+    ("name", pa.string()),
+    ("price", pa.int32()),
+    ("color", CATEGORY),
+    ("number_of_units", pa.int32()),
+    ("diapers_type", CATEGORY),
+    ("weight_category", CATEGORY),
+    ("weight_min_kg", pa.float32()),  # Границы весовой категории
+    ("weight_max_kg", pa.float32()),
+    ("shipping_weight_g", pa.float32()),
+    ("producing_country", CATEGORY),
+    ("equipment", pa.string()),
+    ("length_cm", pa.float32()),  # Габариты упаковки
+    ("height_cm", pa.float32()),
+    ("width_cm", pa.float32()),
+    ("description", pa.string()),
+    ("scraped_at", UTC_MILLISECONDS),
+])
+
+# Схема набора данных с отзывами; product_article является колонкой секционирования
+REVIEW_SCHEMA = pa.schema([
+    ("product_article", pa.string()),
+    ("photo_urls", pa.list_(pa.string())),
+    ("author_name", pa.string()),
+    ("published_at", UTC_SECONDS),
+    ("rating", pa.int8()),
+    ("review_text", pa.string()),
+])
+
+
+def records_to_table(records, schema):
+    """
+    Собирает таблицу со схемой `schema` из записей (dataclass или словарей) по колонкам,
+    без промежуточного словаря на каждую запись. Недостающие поля становятся null.
+    """
+    if records and isinstance(records[0], dict):
+        columns = {name: [record.get(name) for record in records] for name in schema.names}
+    else:
+        columns = {name: [getattr(record, name, None) for record in records] for name in schema.names}
+    return pa.table(columns, schema=schema)
+
+
+def _column(table, name, type=pa.string()):
+    """Возвращает колонку таблицы как массив или массив null, если колонки нет."""
+    if name in table.column_names:
+        return table.column(name).combine_chunks().cast(type)
+    return pa.nulls(table.num_rows, type=type)
+
+
+def _to_number(strings, type=pa.float32()):
+    """Приводит строки вида "1,5" к числам; null остаётся null."""
+    return pc.replace_substring(strings, ",", ".").cast(type)
+
+
+def _extract_number(strings, type=pa.float32()):
+    """Первое число в строке (пробелы между разрядами, например "1 200", допускаются)."""
+    compact = pc.replace_substring_regex(strings, r"(\d)[\s\x{00A0}]+(\d)", r"\1\2")
+    match = pc.extract_regex(compact, f"(?P<value>{_NUMBER})")
+    return _to_number(pc.struct_field(match, "value"), type)
+
+
+def _category(strings):
+    """Словарное кодирование строковой колонки (пробелы по краям отбрасываются)."""
+    return pc.utf8_trim_whitespace(strings).dictionary_encode().cast(CATEGORY)
+
+
+def normalize_products(table):
+    """
+    Векторизованно приводит таблицу сырых записей товаров (или старый файл со строковыми полями)
+    к схеме PRODUCT_SCHEMA.
+    """
+    units = _column(table, "number_of_units")
+    weight_category = _column(table, "weight_category")
+    shipping_weight = _column(table, "shipping_weight")
+    overall_size = _column(table, "overall_size")
+
+    # Весовая категория: "4-9 кг", "от 15 кг" или "до 5 кг"
+    weight_range = pc.extract_regex(weight_category, rf"(?P<low>{_NUMBER})\s*[-–—]\s*(?P<high>{_NUMBER})")
+    single_weight = _extract_number(weight_category)
+    upper_only = pc.fill_null(pc.match_substring(weight_category, "до"), False)
+    weight_min = pc.coalesce(_to_number(pc.struct_field(weight_range, "low")),
+                             pc.if_else(upper_only, pa.scalar(None, pa.float32()), single_weight))
+    weight_max = pc.coalesce(_to_number(pc.struct_field(weight_range, "high")),
+                             pc.if_else(upper_only, single_weight, pa.scalar(None, pa.float32())))
+
+    # Вес с упаковкой в граммах: "850 г" или "1,2 кг"
+    in_kilograms = pc.fill_null(pc.match_substring(shipping_weight, "кг"), False)
+    shipping_grams = _extract_number(shipping_weight)
+    shipping_grams = pc.if_else(in_kilograms, pc.multiply(shipping_grams, pa.scalar(1000.0, pa.float32())),
+                                shipping_grams)
+
+    # Габариты "ДхВхШ" (латинская или кириллическая "х")
+    sizes = pc.extract_regex(pc.utf8_lower(overall_size),
+                             rf"^\s*(?P<length>{_NUMBER})\s*[xх×]\s*(?P<height>{_NUMBER})\s*[xх×]\s*(?P<width>{_NUMBER})")
+
+    columns = {
+        "product_article": pc.utf8_trim_whitespace(_column(table, "product_article")),
+        "brand": _category(_column(table, "brand")),
+        "name": _column(table, "name"),
+        "price": _column(table, "price", pa.int64()).cast(pa.int32()),
+        "color": _category(_column(table, "color")),
+        "number_of_units": _extract_number(units, pa.int32()),
+        "diapers_type": _category(_column(table, "diapers_type")),
+        "weight_category": _category(weight_category),
+        "weight_min_kg": weight_min,
+        "weight_max_kg": weight_max,
+        "shipping_weight_g": shipping_grams,
+        "producing_country": _category(_column(table, "producing_country")),
+        "equipment": _column(table, "equipment"),
+        "length_cm": _to_number(pc.struct_field(sizes, "length")),
+        "height_cm": _to_number(pc.struct_field(sizes, "height")),
+        "width_cm": _to_number(pc.struct_field(sizes, "width")),
+        "description": _column(table, "description"),
+        "scraped_at": _column(table, "scraped_at", UTC_MILLISECONDS),
+    }
+    return pa.table(columns, schema=PRODUCT_SCHEMA)
+
+
+def parse_timestamps(strings):
+    """
+    Разбирает ISO-строки вида "2024-11-21T11:29:09Z" или "2024-11-21T14:29:09+03:00" во время UTC.
+    Нераспознанные строки становятся null.
+    """
+    with_offset = pc.replace_substring_regex(pc.utf8_trim_whitespace(strings), "Z$", "+0000")
+    parsed = pc.strptime(with_offset, format="%Y-%m-%dT%H:%M:%S%z", unit="s", error_is_null=True)
+    return parsed.cast(UTC_SECONDS)
+
+
+def normalize_reviews(table):
+    """
+    Векторизованно приводит таблицу сырых записей отзывов к схеме REVIEW_SCHEMA.
+
+    В старых файлах момент публикации хранился тремя строками date, time и timezone
+    (московское время); из них собирается то же время в UTC.
+    """
+    if "published_at" in table.column_names:
+        published_at = _column(table, "published_at")
+    else:
+        zone = pc.fill_null(_column(table, "timezone"), "+03:00")
+        published_at = pc.binary_join_element_wise(_column(table, "date"), "T", _column(table, "time"), zone, "")
+
+    columns = {
+        "product_article": _column(table, "product_article"),
+        "photo_urls": _column(table, "photo_urls", pa.list_(pa.string())),
+        "author_name": _column(table, "author_name"),
+        "published_at": parse_timestamps(published_at),
+        "rating": _column(table, "rating", pa.int64()).cast(pa.int8()),
+        "review_text": _column(table, "review_text"),
+    }
+    return pa.table(columns, schema=REVIEW_SCHEMA)
@@ -0,0 +1,109 @@
+import os  # Для работы с операционной системой
+import time  # Для работы с временем
+import logging  # Для ведения логов
+from concurrent.futures import ProcessPoolExecutor  # Для разбора снимков в нескольких процессах
+from datetime import datetime, timezone  # Для времени сбора товара по времени снимка
+
+from html_extract import extract_product_data, extract_reviews_with_photos
+from products import save_product_data_to_parquet
+from reviews import save_review_data_to_parquet
+from storage import close_parquet_writers
+from snapshots import latest_snapshots, read_snapshot
+from log_setup import CONSOLE_FORMAT, DATE_FORMAT
+
+# Пересборка наборов товаров и отзывов из архива снимков страниц (команда reparse).
+#
+# Снимки разбираются функциями html_extract в пуле процессов: каждый процесс сам читает свой снимок
+# из архива по смещению из индекса, в родительский процесс возвращаются только записи. Записывает
+# наборы один родительский процесс, как этап "запись" конвейера обхода. Браузер и selenium не нужны.
+
+CHUNKSIZE = 16  # Сколько снимков передаётся процессу пула за раз
+PROGRESS_EVERY = 500  # Как часто сообщать о ходе пересборки, карточек
+MAX_REVIEWS = 100  # Максимальное количество отзывов с фотографиями на карточку (как при обходе)
+
+
+def _init_worker(level):
+    """
+    Настраивает логирование процесса пула: сообщения выводятся в консоль.
+
+    Поток записи логов родительского процесса (см. log_setup) в дочерний не переносится.
+    """
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(CONSOLE_FORMAT, DATE_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def reparse_snapshot(entry):
+    """
+    Извлекает товар и отзывы из одного снимка (выполняется в процессе пула).
+
+    :param entry: Запись индекса архива с ключом "root" (см. snapshots.latest_snapshots).
+    :return: (url, ProductRecord или None, список ReviewRecord, текст ошибки или None).
+    """
+    try:
+        snapshot = read_snapshot(entry["root"], entry["offset"], entry["length"])
+        if not snapshot.get("page"):
+            return entry["url"], None, [], "в снимке нет HTML страницы товара"
+        product_data = extract_product_data(snapshot["page"], snapshot.get("popup"))
+        product_data.scraped_at = datetime.fromtimestamp(snapshot["captured_at"], timezone.utc)
+        reviews = []
+        if snapshot.get("reviews"):
+            reviews = extract_reviews_with_photos(snapshot["reviews"], MAX_REVIEWS)
+        return entry["url"], product_data, reviews, None
+    except Exception as e:
+        return entry["url"], None, [], str(e)
+
+
+def reparse_snapshots(snapshots_dir, product_parquet_file, review_parquet_file, processes=None,
+                      chunksize=CHUNKSIZE):
+    """
+    Пересобирает товары и отзывы из всех архивов снимков каталога `snapshots_dir`.
+
+    Для каждой карточки берётся последний снимок.
+
+    :param product_parquet_file: Файл, в который записываются товары.
+    :param review_parquet_file: Каталог набора, в который записываются отзывы.
+    :param processes: Количество процессов пула (по умолчанию по числу процессоров).
+    :return: Словарь с итогами: cards, products, reviews, failed, seconds.
+    """
+    entries = latest_snapshots(snapshots_dir)
+    result = {"cards": len(entries), "products": 0, "reviews": 0, "failed": 0, "seconds": 0.0}
+    if not entries:
+        logging.warning(f"Снимки страниц в {snapshots_dir} не найдены.")
+        return result
+    processes = processes or os.cpu_count()
+    logging.info(f"Пересборка {len(entries)} карточек из снимков в {processes} процессах.")
+
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(logging.getLogger().level,)) as executor:
+            for done, (url, product_data, reviews, error) in enumerate(
+                    executor.map(reparse_snapshot, entries, chunksize=chunksize), 1):
+                if error is None and product_data.is_empty():
+                    error = "не удалось извлечь ни одного поля товара"
+                if error is None:
+                    try:
+                        save_product_data_to_parquet(product_data, product_parquet_file)
+                        save_review_data_to_parquet(reviews, review_parquet_file, product_data.product_article,
+                                                    replace=True)
+                    except Exception as e:
+                        error = f"ошибка записи: {e}"
+                if error is not None:
+                    result["failed"] += 1
+                    logging.error(f"Ошибка при разборе снимка {url}: {error}")
+                else:
+                    result["products"] += 1
+                    result["reviews"] += len(reviews)
+                if done % PROGRESS_EVERY == 0:
+                    logging.info(f"Разобрано {done} из {len(entries)} снимков.")
+    finally:
+        close_parquet_writers()
+    result["seconds"] = round(time.perf_counter() - started, 1)
+    logging.info(f"Пересборка завершена: товаров {result['products']}, отзывов {result['reviews']}, "
+                 f"ошибок {result['failed']} за {result['seconds']} с.")
+    return result
@@ -1,180 +1,313 @@
 
-import requests  # Для выполнения HTTP-запросов
-import os  # Для работы с операционной системой
-from urllib.parse import urljoin  # Для объединения URL
-from selenium.webdriver.common.by import By  # Для поиска элементов на странице
-from datetime import datetime, timedelta
-import random  # Для генерации случайных чисел
+from datetime import datetime
 import logging  # Для ведения логов
-import pandas as pd
 import time
+import hashlib  # Для ключа отзыва
+import pyarrow.compute as pc
+
+from utils import By, scroll_page_incrementally, scroll_until_loaded, wait_for_xpath, SCROLL_TIME_BUDGET
+from storage import get_dataset_writer, open_partitioned_dataset
+from downloader import ImageDownloader, MAX_WORKERS
+from image_store import ImageStore
+from metrics import timed, stage
+from records import ReviewRecord, REVIEW_SCHEMA, REVIEW_RAW_SCHEMA, normalize_reviews
+from rate_limit import RATE_LIMITER
+REVIEW_CHUNK_SIZE = 30  # Сколько новых элементов списка отзывов подгружать за одну прокрутку
+REVIEWS_WAIT_SECONDS = 5  # Сколько ждать появления кнопки и списка отзывов, секунд
+
+REVIEW_PARTITION_COLUMN = "product_article"  # Колонка секционирования набора данных с отзывами
+PHOTO_SCAN_BATCH_SIZE = 4096  # Сколько отзывов читается за один пакет при сборе ссылок на фотографии
+
+# XPath-выражения раздела отзывов (общие для WebDriver и разбора HTML без браузера, см. html_extract)
+REVIEWS_BUTTON_XPATH = '//a[contains(@class, "comments__btn-all") and @data-see-all="true"]'
+REVIEW_ITEMS_XPATH = '//ul[@class="comments__list"]/li'
+PHOTO_ITEMS_XPATH = './/ul[@class="feedback__photos j-feedback-photos-scroll"]/li'
+AUTHOR_XPATH = './/div/div[2]/div/p'
+DATE_XPATH = './/div[@class="feedback__date"]'
+RATING_XPATH = './/span[contains(@class, "stars-line")]'
+PROS_XPATH = './/p/span[@class="feedback__text--item feedback__text--item-pro"]'
+CONS_XPATH = './/p/span[@class="feedback__text--item feedback__text--item-con"]'
+COMMENTS_XPATH = './/p/span[@class="feedback__text--item"]'
+
+# XPath полей отзыва по ключам сырых данных (см. review_from_raw)
+REVIEW_RAW_XPATHS = {
+    "author": AUTHOR_XPATH,
+    "date": DATE_XPATH,
+    "rating": RATING_XPATH,
+    "pros": PROS_XPATH,
+    "cons": CONS_XPATH,
+    "comments": COMMENTS_XPATH,
+}
+
+# Скрипт, собирающий сырые данные отзывов с фотографиями за один вызов execute_script.
+# arguments[0] - {"items": XPath списка отзывов, "photos": XPath фотографий, ...REVIEW_RAW_XPATHS},
+# arguments[1] - максимальное количество отзывов с фотографиями,
+# arguments[2] - обрабатывать только ещё не просмотренные элементы списка (помечаются атрибутом data-wb-seen).
+# Возвращает {"reviews": [сырые данные отзывов], "scanned": количество просмотренных элементов}.
+REVIEWS_SCRIPT = """
+const xpaths = arguments[0], maxReviews = arguments[1], onlyNew = arguments[2];
+const first = (xpath, context) => document.evaluate(
+    xpath, context, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+const all = (xpath, context) => {
+    const snapshot = document.evaluate(xpath, context, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    const nodes = [];
+    for (let i = 0; i < snapshot.snapshotLength; i++) nodes.push(snapshot.snapshotItem(i));
+    return nodes;
+};
+const reviews = [];
+let scanned = 0;
+for (const review of all(xpaths.items, document)) {
+    if (reviews.length >= maxReviews) break;
+    if (onlyNew) {
+        if (review.dataset.wbSeen) continue;
+        review.dataset.wbSeen = "1";
+    }
+    scanned++;
+    const photoSrcs = all(xpaths.photos, review).map(photo => {
+        const image = photo.querySelector("img");
+        return photo.getAttribute("src") || (image ? image.src : null);
+    }).filter(Boolean);
+    if (!photoSrcs.length) continue;
+    const text = xpath => { const node = first(xpath, review); return node ? node.innerText : null; };
+    const attribute = (xpath, name) => { const node = first(xpath, review); return node ? node.getAttribute(name) : null; };
+    reviews.push({
+        photo_srcs: photoSrcs,
+        author: text(xpaths.author),
+        date_content: attribute(xpaths.date, "content"),
+        rating_class: attribute(xpaths.rating, "class"),
+        pros: text(xpaths.pros),
+        cons: text(xpaths.cons),
+        comments: text(xpaths.comments),
+    });
+}
+return {reviews: reviews, scanned: scanned};
+"""
+
+
+def parse_rating(rating_class):
+    """Извлекает оценку из класса элемента звёзд (например, "stars-line star5" -> 5)."""
+    return int(rating_class.split("star")[-1]) if "star" in rating_class else None
+
+
+def full_size_photo_url(src):
+    """Заменяет ссылку на превью фотографии ссылкой на полноразмерное изображение."""
+    return src.replace("ms.webp", "fs.webp") if "ms.webp" in src else src
+
+
+def build_review_text(pros=None, cons=None, comments=None):
+    """Собирает текст отзыва из достоинств, недостатков и комментария."""
+    full_text = ""
+    if pros is not None:
+        full_text += f"Достоинства: {pros}\n"
+    if cons is not None:
+        full_text += f"Недостатки: {cons}\n"
+    if comments is not None:
+        full_text += f"Комментарии: {comments}"
+    return full_text.strip()
+
+
+def review_key(product_article, author_name, published_at):
+    """
+    Возвращает ключ отзыва: у отзывов на сайте нет собственного идентификатора,
+    поэтому отзыв определяется товаром, автором и моментом публикации (колонка published_at).
+    """
+    if isinstance(published_at, datetime):
+        published_at = published_at.strftime("%Y-%m-%dT%H:%M:%S")
+    source = "|".join(str(value or "") for value in (product_article, author_name, published_at))
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+
+
+def review_from_raw(raw):
+    """
+    Собирает запись об отзыве из сырых данных отзыва.
+
+    :param raw: Словарь с ключами photo_srcs, author, date_content, rating_class, pros, cons, comments.
+    :return: ReviewRecord (как и в get_reviews_with_photos).
+    """
+    published_at = rating = None
+    # Как и в get_review_date_and_rating: без элементов даты и рейтинга оба значения пустые
+    if raw.get("date_content") is not None and raw.get("rating_class") is not None:
+        published_at = raw["date_content"]
+        rating = parse_rating(raw["rating_class"])
+
+    return ReviewRecord(
+        photo_urls=[full_size_photo_url(src) for src in raw["photo_srcs"]],
+        author_name=raw.get("author"),
+        published_at=published_at,
+        rating=rating,
+        review_text=build_review_text(raw.get("pros"), raw.get("cons"), raw.get("comments")),
+    )
 
-from utils import scroll_page_incrementally
-TIMEOUT = (0.5, 2.0)
 
 def extract_date_time(date_element):
     """
-    Извлекает дату и время из HTML-элемента и приводит их к нормальному формату.
+    Извлекает момент публикации отзыва из HTML-элемента.
     
     Args: date_element: WebElement содержащий атрибут 'content' с датой и временем.
-    Returns: tuple: (строка с датой, строка с временем в формате HH:MM:SS, строка с часовым поясом)
+    Returns: ISO-строка в UTC (например, "2024-11-21T11:29:09Z"); разбирается при записи, см. records.normalize_reviews
     """
     
     try:
-        # Извлекаем ISO-строку
-        date_time_iso = date_element.get_attribute("content").rstrip("Z")
-        
-        # Преобразуем ISO в объект datetime
-        date_time_obj = datetime.strptime(date_time_iso, "%Y-%m-%dT%H:%M:%S")
-        
-        # Добавляем 3 часа (часовой пояс Москвы)
-        date_time_obj_with_tz = date_time_obj + timedelta(hours=3)
-        
-        # Извлекаем дату и время в нужных форматах
-        date_str = date_time_obj_with_tz.strftime("%Y-%m-%d")
-        time_str = date_time_obj_with_tz.strftime("%H:%M:%S")
-        timezone_str = "+03:00"
-        
-        return date_str, time_str, timezone_str
+        return date_element.get_attribute("content")
     except Exception as e:
-        logging.warning(f"Ошибка при извлечении даты и времени: {e}")
-        return None, None, None
+        logging.warning("Ошибка при извлечении даты и времени: %s", e)
+        return None
+
+
+def get_photo_urls(review):
+    """Возвращает ссылки на полноразмерные фотографии отзыва (пустой список, если фотографий нет)."""
+    photo_urls = []
+    for photo in review.find_elements(By.XPATH, PHOTO_ITEMS_XPATH):
+        src = photo.get_attribute("src")
+        if not src:
+            # Ссылка хранится во вложенном изображении
+            src = photo.find_element(By.XPATH, './/img').get_attribute("src")
+        photo_urls.append(full_size_photo_url(src))
+    return photo_urls
 
 
 def get_author_name(review):
     try:
-        return review.find_element(By.XPATH, './/div/div[2]/div/p').text
+        return review.find_element(By.XPATH, AUTHOR_XPATH).text
     except Exception as e:
-        logging.warning(f"Ошибка при извлечении имени пользователя: {e}")
+        logging.warning("Ошибка при извлечении имени пользователя: %s", e)
         return None
 
 
 def get_review_date_and_rating(review):
     try:
-        date_element = review.find_element(By.XPATH, './/div[@class="feedback__date"]')
-        date, time, timezone = extract_date_time(date_element)
+        date_element = review.find_element(By.XPATH, DATE_XPATH)
+        published_at = extract_date_time(date_element)
 
-        rating_element = review.find_element(By.XPATH, './/span[contains(@class, "stars-line")]')
-        rating_class = rating_element.get_attribute("class")
-        rating = int(rating_class.split("star")[-1]) if "star" in rating_class else None
+        rating_element = review.find_element(By.XPATH, RATING_XPATH)
+        rating = parse_rating(rating_element.get_attribute("class"))
 
-        return date, time, timezone, rating
+        return published_at, rating
     except Exception as e:
-        logging.warning(f"Ошибка при извлечении данных о дате и рейтинге: {e}")
-        return None, None, None, None
+        logging.warning("Ошибка при извлечении данных о дате и рейтинге: %s", e)
+        return None, None
 
 
 def get_review_text(review):
     try:
-        full_text = ""
-        pros_element = review.find_elements(By.XPATH, './/p/span[@class="feedback__text--item feedback__text--item-pro"]')
-        if pros_element:
-            full_text += f"Достоинства: {pros_element[0].text}\n"
-
-        cons_element = review.find_elements(By.XPATH, './/p/span[@class="feedback__text--item feedback__text--item-con"]')
-        if cons_element:
-            full_text += f"Недостатки: {cons_element[0].text}\n"
-
-        comments_element = review.find_elements(By.XPATH, './/p/span[@class="feedback__text--item"]')
-        if comments_element:
-            full_text += f"Комментарии: {comments_element[0].text}"
-        
-        return full_text.strip()
+        texts = []
+        for xpath in (PROS_XPATH, CONS_XPATH, COMMENTS_XPATH):
+            elements = review.find_elements(By.XPATH, xpath)
+            texts.append(elements[0].text if elements else None)
+        return build_review_text(*texts)
     except Exception as e:
-        logging.warning(f"Ошибка при сборе текста отзыва: {e}")
+        logging.warning("Ошибка при сборе текста отзыва: %s", e)
         return None
 
 
-def get_reviews_with_photos(driver, max_reviews=100):
-    """Собирает только отзывы с фотографиями."""
+@timed("open_reviews")
+def open_reviews_section(driver):
+    """Прокручивает страницу товара и открывает раздел со всеми отзывами. Возвращает True при успехе."""
     try:
-        # Прокрутка страницы
+        # Прокрутка страницы: блок отзывов подгружается, когда до него доходит прокрутка
         scroll_page_incrementally(driver, 0.3)
-        time.sleep(random.uniform(*TIMEOUT))
     except Exception as e:
         logging.error(f"Ошибка при прокрутке страницы: {e}")
-    
-    # Переход к разделу отзывов
+
+    # Переход к разделу отзывов: загрузка раздела - запрос к сайту, поэтому он проходит через планировщик
     try:
-        reviews_button = driver.find_element(By.XPATH, '//a[contains(@class, "comments__btn-all") and @data-see-all="true"]')
+        reviews_button = wait_for_xpath(driver, REVIEWS_BUTTON_XPATH, REVIEWS_WAIT_SECONDS)
+        page_url = driver.current_url
+        RATE_LIMITER.acquire(page_url)
+        started = time.perf_counter()
         reviews_button.click()
-        time.sleep(random.uniform(*TIMEOUT))
+        wait_for_xpath(driver, REVIEW_ITEMS_XPATH, REVIEWS_WAIT_SECONDS)
+        RATE_LIMITER.report(page_url, time.perf_counter() - started)
+        return True
     except Exception as e:
-        logging.warning(f"Не удалось открыть раздел отзывов: {e}")
+        logging.warning("Не удалось открыть раздел отзывов: %s", e)
+        return False
+
+
+def iter_reviews_with_photos(driver, max_reviews=100, chunk_size=REVIEW_CHUNK_SIZE,
+                             time_budget=SCROLL_TIME_BUDGET):
+    """
+    Генератор отзывов с фотографиями из открытого раздела отзывов.
+
+    Список читается порциями: за один execute_script разбираются только ещё не просмотренные
+    элементы, после чего лента прокручивается до появления `chunk_size` новых элементов.
+    Каждый отзыв отдаётся сразу после разбора, сбор прекращается, как только набрано
+    `max_reviews` отзывов с фотографиями или лента перестала подгружаться.
+
+    :param driver: WebDriver с открытым разделом отзывов (см. open_reviews_section).
+    :param max_reviews: Максимальное количество отзывов с фотографиями.
+    :param chunk_size: Сколько новых элементов списка подгружать за одну прокрутку.
+    :param time_budget: Максимальное время одной прокрутки, секунд.
+    """
+    xpaths = {"items": REVIEW_ITEMS_XPATH, "photos": PHOTO_ITEMS_XPATH, **REVIEW_RAW_XPATHS}
+    collected = 0  # Отданные отзывы с фотографиями
+    scanned = 0  # Просмотренные элементы списка
+    while collected < max_reviews:
+        with stage("reviews"):
+            result = driver.execute_script(REVIEWS_SCRIPT, xpaths, max_reviews - collected, True)
+        scanned += result["scanned"]
+        for raw in result["reviews"]:
+            try:
+                review_data = review_from_raw(raw)
+            except Exception as e:
+                logging.error(f"Ошибка при обработке отзыва: {e}")
+                continue
+            collected += 1
+            yield review_data
+        if collected >= max_reviews:
+            break
+
+        # Подгружаем следующую порцию отзывов
+        loaded = scroll_until_loaded(driver, REVIEW_ITEMS_XPATH, scanned + chunk_size, time_budget)
+        if loaded["count"] <= scanned:
+            break
+    logging.info("Собрано %d отзывов с фотографиями (просмотрено %d).", collected, scanned)
+
+
+def get_reviews_with_photos(driver, max_reviews=100, use_js=True):
+    """
+    Собирает только отзывы с фотографиями.
+
+    :param use_js: Читать ленту отзывов порциями через execute_script (iter_reviews_with_photos)
+                   вместо отдельных запросов к драйверу на каждое поле каждого отзыва.
+    """
+    if not open_reviews_section(driver):
         return []
-    
+
+    if use_js:
+        reviews_with_photos = []
+        try:
+            for review_data in iter_reviews_with_photos(driver, max_reviews):
+                reviews_with_photos.append(review_data)
+        except Exception as e:
+            logging.error(f"Ошибка при извлечении отзывов: {e}")
+        return reviews_with_photos
+
     reviews_with_photos = []
     try:
-        reviews = driver.find_elements(By.XPATH, '//ul[@class="comments__list"]/li')
+        reviews = driver.find_elements(By.XPATH, REVIEW_ITEMS_XPATH)
 
         for index, review in enumerate(reviews):
             if len(reviews_with_photos) >= max_reviews:
                 break
 
             # Логируем начало обработки отзыва
-            logging.info(f"Обработка отзыва {index + 1} из {len(reviews)}")
+            logging.debug("Обработка отзыва %d из %d", index + 1, len(reviews))
 
             try:
-                photo_elements = review.find_elements(By.XPATH, './/ul[@class="feedback__photos j-feedback-photos-scroll"]/li')
-                if not photo_elements:
+                photo_urls = get_photo_urls(review)
+                if not photo_urls:
                     continue
 
                 # Собираем данные отзыва
-                review_data = {}
-                photo_urls = [
-                    photo.get_attribute("src").replace("ms.webp", "fs.webp") 
-                    if "ms.webp" in photo.get_attribute("src") else photo.get_attribute("src")
-                    for photo in photo_elements
-                ]
-                review_data["photo_urls"] = photo_urls
-
-                # Получение имени автора
-                try:
-                    author_name = review.find_element(By.XPATH, './/div/div[2]/div/p').text
-                    review_data["author_name"] = author_name
-                except Exception as e:
-                    logging.warning(f"Ошибка при извлечении имени пользователя для отзыва {index + 1}: {e}")
-                    review_data["author_name"] = None
-
-                # Дата и рейтинг
-                try:
-                    date_element = review.find_element(By.XPATH, './/div[@class="feedback__date"]')
-                    date, review_time, timezone = extract_date_time(date_element)
-                    review_data["date"] = date
-                    review_data["time"] = review_time
-                    review_data["timezone"] = timezone
-                    
-                    rating_element = review.find_element(By.XPATH, './/span[contains(@class, "stars-line")]')
-                    rating_class = rating_element.get_attribute("class")
-                    rating = int(rating_class.split("star")[-1]) if "star" in rating_class else None
-                    review_data["rating"] = rating
-                except Exception as e:
-                    logging.warning(f"Ошибка при извлечении даты, времени или рейтинга отзыва {index + 1}: {e}")
-                    review_data["date"] = None
-                    review_data["time"] = None
-                    review_data["timezone"] = None
-                    review_data["rating"] = None
-
-                # Текст отзыва
-                try:
-                    full_text = ""
-                    pros_element = review.find_elements(By.XPATH, './/p/span[@class="feedback__text--item feedback__text--item-pro"]')
-                    if pros_element:
-                        full_text += f"Достоинства: {pros_element[0].text}\n"
-
-                    cons_element = review.find_elements(By.XPATH, './/p/span[@class="feedback__text--item feedback__text--item-con"]')
-                    if cons_element:
-                        full_text += f"Недостатки: {cons_element[0].text}\n"
-
-                    comments_element = review.find_elements(By.XPATH, './/p/span[@class="feedback__text--item"]')
-                    if comments_element:
-                        full_text += f"Комментарии: {comments_element[0].text}"
-                    
-                    review_data["review_text"] = full_text.strip()
-                except Exception as e:
-                    logging.warning(f"Ошибка при сборе текста отзыва {index + 1}: {e}")
-                    review_data["review_text"] = None
-
+                published_at, rating = get_review_date_and_rating(review)
+                review_data = ReviewRecord(
+                    photo_urls=photo_urls,
+                    author_name=get_author_name(review),
+                    published_at=published_at,
+                    rating=rating,
+                    review_text=get_review_text(review),
+                )
                 reviews_with_photos.append(review_data)
             except Exception as e:
                 logging.error(f"Ошибка при обработке отзыва {index + 1}: {e}")
@@ -182,49 +315,73 @@ def get_reviews_with_photos(driver, max_reviews=100):
     except Exception as e:
         logging.error(f"Ошибка при извлечении отзывов: {e}")
     
-    logging.info(f"Собрано {len(reviews_with_photos)} отзывов с фотографиями.")
+    logging.info("Собрано %d отзывов с фотографиями.", len(reviews_with_photos))
     return reviews_with_photos
 
 
-def save_review_data_to_parquet(review_data, parquet_file):
-    """Сохраняет данные о отзыве в файл reviews.parquet."""
-    try:
-        # Создаем DataFrame для добавления данных отзыва
-        df_review = pd.DataFrame([review_data])
-        
-        # Если файл существует, то добавляем новые данные, иначе создаем новый
-        if os.path.exists(parquet_file):
-            df_review.to_parquet(parquet_file, append=True, index=False)
-        else:
-            df_review.to_parquet(parquet_file, index=False)
-        
-        logging.info(f"Данные отзыва сохранены в {parquet_file}.")
-    except Exception as e:
-        logging.error(f"Ошибка при сохранении данных отзыва: {e}")
+@timed("save_reviews")
+def save_review_data_to_parquet(review_data, dataset_dir, product_article=None, replace=False):
+    """
+    Сохраняет отзывы одного товара отдельным файлом-частью в секционированный набор reviews_data.
+
+    :param review_data: Список ReviewRecord (одна строка на отзыв); поля приводятся к REVIEW_SCHEMA при записи.
+    :param dataset_dir: Каталог набора данных с отзывами.
+    :param product_article: Артикул товара, по которому секционируется набор.
+    :param replace: Заменить отзывы товара, сохранённые раньше (повторно собранная карточка).
+    Ошибка записи не перехватывается: карточка, отзывы которой не попали на диск, должна быть отмечена неудачной.
+    """
+    writer = get_dataset_writer(dataset_dir, REVIEW_SCHEMA, REVIEW_PARTITION_COLUMN,
+                                raw_schema=REVIEW_RAW_SCHEMA, normalize=normalize_reviews)
+    part_path = writer.write(review_data, product_article, replace=replace)
+    if part_path:
+        logging.debug("Данные %d отзывов сохранены в %s/%s.", len(review_data), dataset_dir, part_path)
+    else:
+        logging.debug("Нет отзывов для сохранения (товар %s).", product_article)
+
+
+def open_review_dataset(dataset_dir):
+    """Открывает набор данных с отзывами как единый pyarrow.dataset с секциями по product_article."""
+    return open_partitioned_dataset(dataset_dir, REVIEW_PARTITION_COLUMN, schema=REVIEW_SCHEMA)
 
 
-def download_images_from_reviews(reviews_parquet_file, save_directory):
-    """Скачивает изображения из photo_urls, хранящихся в reviews.parquet, и сохраняет их в указанной директории."""
+def iter_photo_urls(dataset_dir, articles=None, batch_size=PHOTO_SCAN_BATCH_SIZE):
+    """
+    Генератор ссылок на фотографии из набора данных с отзывами.
+
+    Набор читается пакетами по `batch_size` отзывов: сканер читает только колонку photo_urls
+    (product_article берётся из пути секции и нужен лишь для отбора), отзывы без фотографий
+    отбрасываются условием сканера, а списки ссылок пакета разворачиваются и очищаются от
+    повторов векторизованно. В памяти одновременно находится не больше одного пакета.
+
+    :param articles: Список артикулов: секции остальных товаров не читаются.
+    :return: Генератор строк URL (повторы между пакетами отсеивает хранилище, см. ImageStore.iter_jobs).
+    """
+    condition = pc.list_value_length(pc.field("photo_urls")) > 0
+    if articles is not None:
+        condition &= pc.field(REVIEW_PARTITION_COLUMN).isin([str(article) for article in articles])
+    scanner = open_review_dataset(dataset_dir).scanner(columns=["photo_urls"], filter=condition,
+                                                       batch_size=batch_size)
+    for batch in scanner.to_batches():
+        if not batch.num_rows:
+            continue
+        urls = pc.unique(pc.drop_null(pc.list_flatten(batch.column("photo_urls"))))
+        logging.debug("Пакет отзывов: %d отзывов, %d ссылок", batch.num_rows, len(urls))
+        yield from urls.to_pylist()
+
+
+def download_images_from_reviews(reviews_parquet_file, save_directory, max_workers=MAX_WORKERS):
+    """
+    Скачивает изображения из photo_urls, хранящихся в наборе reviews_data, в хранилище save_directory.
+
+    Файлы именуются по хешу содержимого (см. image_store.ImageStore): повторный запуск
+    скачивает только новые фотографии, а недокачанные продолжает с места остановки.
+    Ссылки читаются из набора потоком (см. iter_photo_urls), поэтому память не зависит от его объёма.
+
+    :return: DownloadSummary с итогами или None при ошибке чтения отзывов.
+    """
     try:
-        # Загружаем DataFrame с отзывами
-        reviews_df = pd.read_parquet(reviews_parquet_file)
-        
-        # Обрабатываем каждый отзыв
-        for index, row in reviews_df.iterrows():
-            photo_urls = row.get("photo_urls", [])
-            if photo_urls:
-                for url in photo_urls:
-                    try:
-                        img_data = requests.get(url).content  # Получаем содержимое изображения
-                        img_name = f"review_{index + 1}_{photo_urls.index(url) + 1}.jpg"  # Генерация имени
-                        img_path = os.path.join(save_directory, img_name)  # Путь для сохранения изображения
-                        
-                        # Записываем данные изображения в файл
-                        with open(img_path, 'wb') as img_file:
-                            img_file.write(img_data)
-                        
-                        logging.info(f"Изображение сохранено: {img_path}")
-                    except Exception as e:
-                        logging.error(f"Ошибка при сохранении изображения {url}: {e}")
+        with ImageStore(save_directory, ImageDownloader(max_workers=max_workers)) as store:
+            return store.download(iter_photo_urls(reviews_parquet_file))
     except Exception as e:
         logging.error(f"Ошибка при скачивании изображений: {e}")
+        return None
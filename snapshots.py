@@ -0,0 +1,164 @@
+import os  # Для работы с операционной системой
+import gzip  # Для сжатия снимков
+import json  # Для записей снимков и индекса
+import time  # Для времени снимка
+import logging  # Для ведения логов
+import threading  # Для записи в архив из нескольких потоков
+
+# Архив снимков страниц.
+#
+# Для каждой обработанной карточки сохраняется отрисованный HTML: страница товара (page_source),
+# окно характеристик (outerHTML) и раздел отзывов. По архиву команда reparse заново извлекает
+# товары и отзывы без браузера (см. reparse), поэтому после изменения вёрстки сайта достаточно
+# поправить XPath-выражения и пересобрать наборы, а не обходить каталог заново.
+#
+# Архив - файл из склеенных gzip-блоков, по одному на карточку (весь файл читается и `gzip -dc`),
+# и индекс JSON lines со смещением и длиной каждого блока. Блок сжимается в потоке, собравшем
+# страницу; в файл дописываются готовые байты. Индексная строка пишется после блока, поэтому
+# после аварийного завершения недописанный хвост архива отбрасывается при следующем открытии.
+
+ARCHIVE_FILE = "pages.gz"  # Файл снимков внутри каталога архива
+INDEX_FILE = "pages.index.jsonl"  # Индекс снимков
+COMPRESS_LEVEL = 6  # Уровень сжатия gzip (страницы сжимаются примерно в 10 раз уже на уровне 6)
+
+
+def capture(snapshot, key, read):
+    """
+    Сохраняет в снимок `snapshot[key] = read()`, если снимок собирается (snapshot не None).
+
+    Ошибка чтения HTML только записывается в лог: снимок не должен мешать сбору данных.
+    """
+    if snapshot is None:
+        return
+    try:
+        snapshot[key] = read()
+    except Exception as e:
+        logging.warning(f"Не удалось сохранить HTML '{key}' для снимка: {e}")
+
+
+def encode_snapshot(url, snapshot, captured_at=None):
+    """
+    Сжимает снимок карточки в блок архива.
+
+    :param snapshot: Словарь с HTML: "page", "popup" и "reviews" (недостающие - None).
+    :return: Байты gzip-блока.
+    """
+    record = {
+        "url": url,
+        "captured_at": captured_at or time.time(),
+        "page": snapshot.get("page"),
+        "popup": snapshot.get("popup"),
+        "reviews": snapshot.get("reviews"),
+    }
+    return gzip.compress(json.dumps(record, ensure_ascii=False).encode("utf-8"), COMPRESS_LEVEL)
+
+
+def decode_snapshot(block):
+    """Распаковывает блок архива в словарь снимка (url, captured_at, page, popup, reviews)."""
+    return json.loads(gzip.decompress(block))
+
+
+def _valid_index_size(index_path):
+    """Размер индекса без недописанной последней строки."""
+    with open(index_path, "rb") as index:
+        content = index.read()
+    return content.rfind(b"\n") + 1
+
+
+def read_index(root):
+    """Возвращает список записей индекса архива (url, article, offset, length, captured_at)."""
+    index_path = os.path.join(root, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return []
+    entries = []
+    with open(index_path, encoding="utf-8") as index:
+        for line in index:
+            if not line.endswith("\n"):
+                break  # Строка, недописанная при аварийном завершении
+            line = line.strip()
+            if line:
+                entries.append(json.loads(line))
+    return entries
+
+
+def read_snapshot(root, offset, length):
+    """Читает и распаковывает один снимок архива по смещению и длине из индекса."""
+    with open(os.path.join(root, ARCHIVE_FILE), "rb") as archive:
+        archive.seek(offset)
+        return decode_snapshot(archive.read(length))
+
+
+def find_archives(snapshots_dir):
+    """Возвращает каталоги архивов (корневой и секции рабочих `worker=<id>`) с индексом."""
+    if not os.path.isdir(snapshots_dir):
+        return []
+    roots = [snapshots_dir] + [os.path.join(snapshots_dir, name) for name in sorted(os.listdir(snapshots_dir))]
+    return [root for root in roots if os.path.exists(os.path.join(root, INDEX_FILE))]
+
+
+def latest_snapshots(snapshots_dir):
+    """
+    Возвращает записи индекса всех архивов каталога, по одной на URL (самый поздний снимок).
+
+    В каждую запись добавляется ключ "root" - каталог архива.
+    """
+    latest = {}
+    for root in find_archives(snapshots_dir):
+        for entry in read_index(root):
+            previous = latest.get(entry["url"])
+            if previous is None or entry["captured_at"] >= previous["captured_at"]:
+                latest[entry["url"]] = dict(entry, root=root)
+    return list(latest.values())
+
+
+class SnapshotArchive:
+    """Архив снимков страниц в каталоге `root` (дописывается одним процессом)."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._repair()
+        self._archive = open(os.path.join(root, ARCHIVE_FILE), "ab")
+        self._index = open(os.path.join(root, INDEX_FILE), "a", encoding="utf-8")
+
+    def _repair(self):
+        """Отбрасывает недописанные хвосты индекса и архива после аварийного завершения."""
+        index_path = os.path.join(self.root, INDEX_FILE)
+        archive_path = os.path.join(self.root, ARCHIVE_FILE)
+        if os.path.exists(index_path):
+            valid_size = _valid_index_size(index_path)
+            if valid_size < os.path.getsize(index_path):
+                os.truncate(index_path, valid_size)
+        end = max((entry["offset"] + entry["length"] for entry in read_index(self.root)), default=0)
+        if os.path.exists(archive_path) and os.path.getsize(archive_path) > end:
+            logging.warning(f"Архив снимков {archive_path}: отброшено {os.path.getsize(archive_path) - end} байт "
+                            f"недописанного хвоста.")
+            os.truncate(archive_path, end)
+
+    def append(self, url, block, article=None):
+        """
+        Дописывает в архив сжатый снимок карточки (см. encode_snapshot).
+
+        :return: Смещение блока в архиве.
+        """
+        with self._lock:
+            offset = self._archive.tell()
+            self._archive.write(block)
+            self._archive.flush()
+            entry = {"url": url, "article": article, "offset": offset, "length": len(block),
+                     "captured_at": time.time()}
+            self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._index.flush()
+        return offset
+
+    def close(self):
+        with self._lock:
+            self._archive.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
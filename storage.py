@@ -0,0 +1,478 @@
+import os  # Для работы с операционной системой
+import time  # Для работы с временем
+import atexit  # Для закрытия файлов при завершении процесса
+import threading  # Для защиты буфера при записи из нескольких потоков
+import logging  # Для ведения логов
+import json  # Для записи манифеста
+import re  # Для разбора имён файлов-частей
+import uuid  # Для уникальных имён файлов-частей
+import functools  # Для обработчиков ошибок сброса
+from urllib.parse import quote  # Для экранирования значений секций в путях
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from records import records_to_table
+
+# Пороги сброса буфера по умолчанию
+FLUSH_ROWS = 500  # Количество записей, после которого буфер сбрасывается группой строк
+FLUSH_SECONDS = 30.0  # Максимальное время (в секундах) хранения записей в буфере
+PART_DIGITS = 5  # Разрядов в номере файла-части писателя
+
+# Открытые писатели по пути к файлу (закрываются при завершении процесса)
+_open_writers = {}
+_open_writers_lock = threading.Lock()
+
+
+def conform_table(table, schema):
+    """
+    Приводит таблицу к заданной схеме: недостающие колонки заполняются null, лишние отбрасываются.
+
+    :param table: Таблица pyarrow.
+    :param schema: Целевая схема pyarrow.
+    :return: Таблица со схемой `schema`.
+    """
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            columns.append(table.column(field.name).cast(field.type))
+        else:
+            columns.append(pa.nulls(table.num_rows, type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class BufferedParquetWriter:
+    """
+    Долгоживущий писатель Parquet на основе pyarrow.ParquetWriter.
+
+    Записи копятся в буфере и сбрасываются, когда буфер достигает `flush_rows` записей или с первой
+    записи прошло `flush_seconds` секунд. Каждый сброс - законченный файл-часть рядом с `parquet_file`
+    (`<имя>-<запуск>-<номер>.parquet`): часть пишется во временный файл, имя которого начинается
+    с точки, и переименовывается, поэтому сброшенные записи переживают аварийное завершение,
+    а читатели (pyarrow.dataset, parquet_files) не видят недописанных файлов. Уже существующие файлы
+    не переписываются. При закрытии части запуска объединяются в один файл `<имя>-<запуск>.parquet`.
+
+    Функция, переданная в `when_flushed`, вызывается, когда все записи, добавленные до неё,
+    уже лежат на диске: по ней отмечаются обработанные карточки. Если сброс не удался, записи буфера
+    отбрасываются, для каждой ожидавшей функции вызывается её `on_error(ошибка)`, а исключение
+    передаётся вызвавшему запись или сброс.
+
+    Если задана функция `normalize`, пачка записей при сбросе собирается в таблицу со схемой
+    `raw_schema` и приводится ею к схеме файла (см. records.normalize_products).
+    """
+
+    def __init__(self, parquet_file, schema, flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS,
+                 compression="snappy", raw_schema=None, normalize=None):
+        self.parquet_file = parquet_file
+        self.schema = schema
+        self.raw_schema = raw_schema or schema
+        self.normalize = normalize
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.compression = compression
+        self.rows_written = 0  # Количество записей, сброшенных в файлы-части этого запуска
+        self.directory = os.path.dirname(parquet_file) or "."
+        self.stem = os.path.splitext(os.path.basename(parquet_file))[0]
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self._parts = []  # Файлы-части этого запуска
+        self._buffer = []  # Буфер записей, ожидающих сброса
+        self._buffer_started = None  # Время появления первой записи в буфере
+        self._callbacks = []  # Функции, ожидающие сброса буфера
+        self._lock = threading.Lock()
+        self._opened = False
+
+    def open(self):
+        """Готовит каталог: убирает остатки аварийного завершения и приводит старый файл к схеме (один раз)."""
+        with self._lock:
+            if self._opened:
+                return self
+            os.makedirs(self.directory, exist_ok=True)
+            self._remove_leftovers()
+            self._upgrade_legacy_file()
+            self._opened = True
+        logging.info("Открыт писатель Parquet: %s", self.parquet_file)
+        return self
+
+    def _remove_leftovers(self):
+        """
+        Удаляет недописанные временные файлы и части запусков, уже объединённых в общий файл
+        (процесс завершился между переименованием объединённого файла и удалением частей).
+        """
+        part_pattern = re.compile(rf"^{re.escape(self.stem)}-(?P<run>.+)-\d{{{PART_DIGITS}}}\.parquet$")
+        names = set(os.listdir(self.directory))
+        for name in names:
+            path = os.path.join(self.directory, name)
+            if (name.startswith(f".{self.stem}-") and name.endswith(".tmp")
+                    or name == f"{os.path.basename(self.parquet_file)}.tmp"):  # Файл прежней версии писателя
+                os.remove(path)
+                continue
+            match = part_pattern.match(name)
+            if match and f"{self.stem}-{match.group('run')}.parquet" in names:
+                os.remove(path)
+
+    def _upgrade_legacy_file(self):
+        """
+        Файл `parquet_file` старого формата (например, со строковыми полями) один раз приводится
+        к схеме той же нормализацией, чтобы все файлы каталога читались с одной схемой.
+        """
+        if not os.path.exists(self.parquet_file) or os.path.getsize(self.parquet_file) == 0:
+            return
+        try:
+            existing = pq.ParquetFile(self.parquet_file)
+            if existing.schema_arrow.equals(self.schema):
+                return
+            legacy = self.normalize is not None and not set(self.schema.names) <= set(existing.schema_arrow.names)
+            tmp_file = self._tmp_path(os.path.basename(self.parquet_file))
+            with pq.ParquetWriter(tmp_file, self.schema, compression=self.compression) as writer:
+                for index in range(existing.num_row_groups):
+                    table = existing.read_row_group(index)
+                    if legacy:
+                        table = self.normalize(table)
+                    writer.write_table(conform_table(table, self.schema))
+            os.replace(tmp_file, self.parquet_file)
+            logging.info("Файл %s приведён к текущей схеме.", self.parquet_file)
+        except Exception as e:
+            # Нечитаемый файл не перезаписываем молча, а сохраняем рядом (имя с точкой читатели пропускают)
+            backup_file = os.path.join(self.directory, f".{os.path.basename(self.parquet_file)}.bak")
+            os.replace(self.parquet_file, backup_file)
+            logging.warning(f"Не удалось прочитать {self.parquet_file} ({e}), файл перемещён в {backup_file}.")
+
+    def _tmp_path(self, name):
+        return os.path.join(self.directory, f".{name}.tmp")
+
+    def _write_file(self, path, tables):
+        """Записывает таблицы в файл через временный файл и атомарное переименование."""
+        tmp_file = self._tmp_path(os.path.basename(path))
+        with pq.ParquetWriter(tmp_file, self.schema, compression=self.compression) as writer:
+            for table in tables:
+                writer.write_table(table)
+        os.replace(tmp_file, path)
+
+    def write(self, record):
+        """Добавляет запись (словарь или dataclass) в буфер. Сброс на диск выполняется только по достижении порогов."""
+        if not self._opened:
+            self.open()
+        with self._lock:
+            if not self._buffer:
+                self._buffer_started = time.monotonic()
+            self._buffer.append(record)
+            callbacks, error = [], None
+            if (len(self._buffer) >= self.flush_rows
+                    or time.monotonic() - self._buffer_started >= self.flush_seconds):
+                callbacks, error = self._flush_locked()
+        self._run_callbacks(callbacks, error)
+
+    def when_flushed(self, callback, on_error=None):
+        """
+        Вызывает callback(), когда все уже добавленные записи будут на диске
+        (сразу, если буфер пуст; иначе - после ближайшего сброса в потоке, который его выполнил).
+
+        :param on_error: Функция on_error(ошибка), вызываемая вместо callback, если сброс не удался.
+        """
+        with self._lock:
+            if self._buffer:
+                self._callbacks.append((callback, on_error))
+                return
+        self._run_callbacks([callback])
+
+    def flush(self):
+        """Сбрасывает буфер в новый файл-часть."""
+        with self._lock:
+            callbacks, error = self._flush_locked()
+        self._run_callbacks(callbacks, error)
+
+    def _flush_locked(self):
+        """
+        Записывает буфер файлом-частью.
+
+        :return: tuple: (функции для вызова после снятия блокировки, ошибка сброса или None).
+        """
+        if not self._buffer:
+            return [], None
+        pending, self._callbacks = self._callbacks, []
+        try:
+            table = self._build_table(self._buffer)
+            part_file = os.path.join(self.directory,
+                                     f"{self.stem}-{self.run_id}-{len(self._parts):0{PART_DIGITS}d}.parquet")
+            self._write_file(part_file, [table])
+        except Exception as e:
+            # Записи буфера теряются: карточки, ожидавшие сброса, отмечаются неудачными через on_error
+            logging.error(f"Не удалось сбросить {len(self._buffer)} записей в {self.parquet_file}: {e}")
+            return [functools.partial(on_error, e) for callback, on_error in pending if on_error is not None], e
+        finally:
+            self._buffer = []
+            self._buffer_started = None
+        self._parts.append(part_file)
+        self.rows_written += table.num_rows
+        logging.info("В %s сброшено %d записей (всего %d).", part_file, table.num_rows, self.rows_written)
+        return [callback for callback, on_error in pending], None
+
+    @staticmethod
+    def _run_callbacks(callbacks, error=None):
+        """Вызывает функции, ожидавшие сброса, и передаёт дальше ошибку сброса, если она была."""
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Ошибка в обработчике сброса буфера: {e}")
+        if error is not None:
+            raise error
+
+    def _build_table(self, records):
+        if self.normalize is None:
+            return records_to_table(records, self.schema)
+        return conform_table(self.normalize(records_to_table(records, self.raw_schema)), self.schema)
+
+    def _compact_locked(self):
+        """Объединяет файлы-части запуска в один файл `<имя>-<запуск>.parquet`."""
+        if not self._parts:
+            return
+        run_file = os.path.join(self.directory, f"{self.stem}-{self.run_id}.parquet")
+        if len(self._parts) == 1:
+            os.replace(self._parts[0], run_file)
+        else:
+            # Группы строк переносятся по одной; до удаления частей данные лежат в двух местах,
+            # лишние части после аварии убирает _remove_leftovers
+            self._write_file(run_file, self._iter_part_tables())
+            for part in self._parts:
+                os.remove(part)
+        self._parts = []
+
+    def _iter_part_tables(self):
+        for part in self._parts:
+            part_file = pq.ParquetFile(part)
+            for index in range(part_file.num_row_groups):
+                yield part_file.read_row_group(index)
+
+    def close(self):
+        """Сбрасывает остаток буфера и объединяет файлы-части этого запуска."""
+        with self._lock:
+            if not self._opened:
+                return
+            try:
+                callbacks, error = self._flush_locked()
+            finally:
+                self._opened = False
+            self._compact_locked()
+        self._run_callbacks(callbacks, error)
+        logging.info("Писатель Parquet закрыт: %s (%d записей).", self.parquet_file, self.rows_written)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def parquet_files(path):
+    """
+    Возвращает отсортированный список файлов Parquet в каталоге (рекурсивно) или [path] для файла.
+
+    Файлы и каталоги, имена которых начинаются с "." или "_" (временные файлы писателей, копии
+    нечитаемых файлов, манифесты), а также файлы без расширения .parquet пропускаются.
+    """
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for directory, subdirectories, names in os.walk(path):
+        subdirectories[:] = [name for name in subdirectories if not name.startswith((".", "_"))]
+        files.extend(os.path.join(directory, name) for name in names
+                     if name.endswith(".parquet") and not name.startswith((".", "_")))
+    return sorted(files)
+
+
+def get_parquet_writer(parquet_file, schema, **kwargs):
+    """Возвращает открытый писатель для файла, создавая его при первом обращении."""
+    key = os.path.abspath(parquet_file)
+    with _open_writers_lock:
+        writer = _open_writers.get(key)
+        if writer is None:
+            writer = BufferedParquetWriter(parquet_file, schema, **kwargs).open()
+            _open_writers[key] = writer
+    return writer
+
+
+def close_parquet_writers():
+    """Закрывает все открытые писатели. Вызывается при завершении процесса и из `main`."""
+    with _open_writers_lock:
+        writers = list(_open_writers.values())
+        _open_writers.clear()
+    for writer in writers:
+        try:
+            writer.close()
+        except Exception as e:
+            logging.error(f"Ошибка при закрытии писателя {writer.parquet_file}: {e}")
+
+
+def flush_parquet_writers():
+    """Сбрасывает буферы всех открытых писателей (например, когда новых записей пока не ожидается)."""
+    with _open_writers_lock:
+        writers = list(_open_writers.values())
+    for writer in writers:
+        try:
+            writer.flush()
+        except Exception as e:
+            logging.error(f"Ошибка при сбросе писателя {writer.parquet_file}: {e}")
+
+
+atexit.register(close_parquet_writers)
+
+
+# Имя файла манифеста секционированного набора данных (pyarrow игнорирует файлы, начинающиеся с "_")
+MANIFEST_FILE = "_manifest.jsonl"
+# Значение секции для записей без ключа (совпадает с соглашением Hive)
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+class PartitionedDatasetWriter:
+    """
+    Писатель секционированного набора Parquet в формате Hive: `<root>/<column>=<value>/part-*.parquet`.
+
+    Каждый вызов `write` создаёт новый файл-часть и дописывает строку в манифест `_manifest.jsonl`,
+    поэтому стоимость записи не зависит от объёма уже сохранённых данных. Запись с `replace=True`
+    заменяет прежние файлы-части секции (повторный сбор товара): сначала на диск попадает новая часть,
+    затем в манифест - список заменённых частей (ключ "replaces"), и только после этого они удаляются.
+    Колонка секционирования хранится только в пути и восстанавливается pyarrow при чтении.
+    Функция `normalize` (если задана) приводит таблицу записей со схемой `raw_schema` к схеме набора.
+    """
+
+    def __init__(self, root, schema, partition_column, compression="snappy", prefix="part",
+                 raw_schema=None, normalize=None):
+        self.root = root
+        self.schema = schema
+        self.raw_schema = raw_schema or self.schema
+        self.normalize = normalize
+        self.partition_column = partition_column
+        self.compression = compression
+        self.prefix = prefix
+        # Схема файлов-частей: без колонки секционирования
+        self.file_schema = pa.schema([field for field in schema if field.name != partition_column])
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def write(self, records, partition_value, replace=False):
+        """
+        Записывает пачку записей в отдельный файл-часть секции `partition_value`.
+
+        :param records: Список словарей или dataclass-записей.
+        :param partition_value: Значение колонки секционирования (например, артикул товара).
+        :param replace: Заменить прежние файлы-части секции (при пустом `records` они просто удаляются).
+        :return: Относительный путь созданного файла или None, если записей нет.
+        """
+        value = NULL_PARTITION if partition_value in (None, "") else quote(str(partition_value), safe="")
+        partition_dir = f"{self.partition_column}={value}"
+        replaced = self._partition_parts(partition_dir) if replace else []
+        if not records and not replaced:
+            return None
+
+        entry = {self.partition_column: partition_value, "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        if records:
+            if self.normalize is None:
+                table = records_to_table(records, self.file_schema)
+            else:
+                table = conform_table(self.normalize(records_to_table(records, self.raw_schema)), self.file_schema)
+            file_name = f"{self.prefix}-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+            relative_path = os.path.join(partition_dir, file_name)
+            os.makedirs(os.path.join(self.root, partition_dir), exist_ok=True)
+
+            # Пишем во временный файл (игнорируется при чтении) и атомарно переименовываем
+            tmp_path = os.path.join(self.root, partition_dir, f".{file_name}.tmp")
+            pq.write_table(table, tmp_path, compression=self.compression)
+            os.replace(tmp_path, os.path.join(self.root, relative_path))
+            entry.update(path=relative_path.replace(os.sep, "/"), rows=table.num_rows)
+        if replaced:
+            entry["replaces"] = replaced
+
+        with self._lock:
+            with open(os.path.join(self.root, MANIFEST_FILE), "a", encoding="utf-8") as manifest:
+                manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        for path in replaced:
+            try:
+                os.remove(os.path.join(self.root, path))
+            except FileNotFoundError:
+                pass
+        return entry.get("path")
+
+    def _partition_parts(self, partition_dir):
+        """Относительные пути законченных файлов-частей секции (в том числе не попавших в манифест)."""
+        directory = os.path.join(self.root, partition_dir)
+        if not os.path.isdir(directory):
+            return []
+        return [f"{partition_dir}/{name}" for name in sorted(os.listdir(directory))
+                if name.endswith(".parquet") and not name.startswith((".", "_"))]
+
+    def upgrade_legacy_parts(self):
+        """
+        Переписывает файлы-части старого формата (без части колонок текущей схемы),
+        приводя их функцией normalize. Читаются только метаданные файлов.
+
+        :return: Количество переписанных файлов.
+        """
+        if self.normalize is None:
+            return 0
+        upgraded = 0
+        for entry in read_manifest(self.root):
+            path = os.path.join(self.root, entry["path"])
+            try:
+                if set(self.file_schema.names) <= set(pq.read_schema(path).names):
+                    continue
+                table = conform_table(self.normalize(pq.read_table(path)), self.file_schema)
+                tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+                pq.write_table(table, tmp_path, compression=self.compression)
+                os.replace(tmp_path, path)
+                upgraded += 1
+            except Exception as e:
+                logging.warning(f"Не удалось привести к текущей схеме {path}: {e}")
+        if upgraded:
+            logging.info(f"В {self.root} приведено к текущей схеме {upgraded} файлов-частей.")
+        return upgraded
+
+
+def read_manifest(root):
+    """
+    Возвращает записи манифеста секционированного набора данных о действующих файлах-частях
+    (части, заменённые при повторной записи секции, пропускаются).
+    """
+    manifest_path = os.path.join(root, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return []
+    entries = {}
+    with open(manifest_path, encoding="utf-8") as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            for path in entry.get("replaces", ()):
+                entries.pop(path, None)
+            if entry.get("path"):
+                entries[entry["path"]] = entry
+    return list(entries.values())
+
+
+def open_partitioned_dataset(root, partition_column, partition_type=pa.string(), schema=None):
+    """
+    Открывает секционированный набор как единый pyarrow.dataset.
+
+    Фильтр по колонке секционирования (например, `ds.field("product_article") == "123"`)
+    отсекает лишние каталоги без чтения файлов. Если передана схема, файлы-части читаются
+    с приведением к ней (недостающие колонки - null).
+    """
+    import pyarrow.dataset as ds  # Загружается только для чтения наборов: вместе с ним импортируется pandas
+    partitioning = ds.partitioning(pa.schema([(partition_column, partition_type)]), flavor="hive")
+    return ds.dataset(root, format="parquet", partitioning=partitioning, schema=schema)
+
+
+# Писатели секционированных наборов по корневому каталогу
+_dataset_writers = {}
+
+
+def get_dataset_writer(root, schema, partition_column, **kwargs):
+    """Возвращает писатель секционированного набора для каталога, создавая его при первом обращении."""
+    key = os.path.abspath(root)
+    with _open_writers_lock:
+        writer = _dataset_writers.get(key)
+        if writer is None:
+            writer = PartitionedDatasetWriter(root, schema, partition_column, **kwargs)
+            writer.upgrade_legacy_parts()
+            _dataset_writers[key] = writer
+    return writer
@@ -0,0 +1,20 @@
+import os  # Для путей к фикстурам
+import sys  # Для импорта модулей парсера из корня репозитория
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Модули парсера лежат в корне репозитория
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+@pytest.fixture
+def load_fixture():
+    """Возвращает функцию, читающую сохранённую HTML-страницу из tests/fixtures."""
+    def load(name):
+        with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as file:
+            return file.read()
+    return load
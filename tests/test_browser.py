@@ -0,0 +1,29 @@
+import os  # Для путей к профилям
+import subprocess  # Для второго процесса, занимающего профиль
+import sys  # Для запуска того же интерпретатора
+
+import browser
+
+
+def test_profiles_are_not_shared_between_processes(tmp_path):
+    profile_dir = str(tmp_path)
+    # Другой процесс `work` на той же машине держит профиль worker-0
+    holder = subprocess.Popen(
+        [sys.executable, "-c", "import sys, browser; print(browser._acquire_profile(sys.argv[1]), flush=True); "
+                               "sys.stdin.read()", profile_dir],
+        cwd=os.path.dirname(os.path.abspath(browser.__file__)),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == os.path.join(profile_dir, "worker-0")
+        first = browser._acquire_profile(profile_dir)
+        second = browser._acquire_profile(profile_dir)
+        assert (first, second) == (os.path.join(profile_dir, "worker-1"), os.path.join(profile_dir, "worker-2"))
+        browser._release_profile(first)
+        assert browser._acquire_profile(profile_dir) == first
+        browser._release_profile(first)
+        browser._release_profile(second)
+    finally:
+        holder.communicate("")
+    # Профиль процесса, завершившегося без освобождения, снова свободен
+    assert browser._acquire_profile(profile_dir) == os.path.join(profile_dir, "worker-0")
+    browser._release_profile(os.path.join(profile_dir, "worker-0"))
@@ -0,0 +1,154 @@
+import os  # Для путей к данным обхода
+import argparse  # Для аргументов команды crawl
+
+import pyarrow.parquet as pq
+import pytest
+
+import crawl
+from benchmark import FakeSite, FakeWebDriver, SleepRecorder, start_image_server
+from journal import CrawlJournal
+from html_extract import extract_reviews_with_photos
+from products import read_product_articles
+from query import ProductLookup
+from reviews import open_review_dataset
+from storage import BufferedParquetWriter, parquet_files, read_manifest
+
+CARDS = 6  # Карточек на фиктивном сайте
+
+
+class _CountingSite(FakeSite):
+    """Фиктивный сайт, который считает открытые страницы товаров."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.card_loads = 0
+
+    def page(self, url):
+        if url.endswith("/detail.aspx"):
+            self.card_loads += 1
+        return super().page(url)
+
+
+@pytest.fixture
+def site():
+    server, image_base_url = start_image_server()
+    try:
+        yield _CountingSite(CARDS, image_base_url)
+    finally:
+        server.shutdown()
+
+
+def data_paths(data_dir):
+    """Пути к данным обхода одним процессом, как в main.data_paths (main при импорте перенастраивает stdout)."""
+    worker = "worker=local"
+    return argparse.Namespace(
+        products_dir=os.path.join(data_dir, "products_data"),
+        products=os.path.join(data_dir, "products_data", worker, "products.parquet"),
+        reviews_dir=os.path.join(data_dir, "reviews_data"),
+        reviews=os.path.join(data_dir, "reviews_data", worker),
+        snapshots_dir=os.path.join(data_dir, "snapshots"),
+        snapshots=os.path.join(data_dir, "snapshots", worker),
+        images=os.path.join(data_dir, "photos"),
+        journal=os.path.join(data_dir, "crawl_journal.sqlite"),
+        index=os.path.join(data_dir, "article_index.sqlite"),
+        metrics=os.path.join(data_dir, "wb_parser-local.prom"),
+    )
+
+
+@pytest.fixture
+def run(site, tmp_path, monkeypatch):
+    """Возвращает функцию, запускающую команду crawl на фиктивном сайте; результат - число открытых карточек."""
+    monkeypatch.setattr(crawl, "make_driver_factory", lambda args: lambda: FakeWebDriver(site))
+    monkeypatch.setattr(crawl, "postprocess", lambda paths, journal=None: None)
+
+    def run_crawl(incremental=False, ttl_hours=24.0, fresh=False):
+        args = argparse.Namespace(category=[site.start_url], data_dir=str(tmp_path), workers=1, max_pages=None,
+                                  incremental=incremental, ttl_hours=ttl_hours, fresh=fresh, no_snapshots=True,
+                                  metrics_format="json")
+        before = site.card_loads
+        with SleepRecorder():
+            crawl.run_crawl(args, data_paths(str(tmp_path)))
+        return site.card_loads - before
+    return run_crawl
+
+
+def test_crawl_saves_every_card(run, tmp_path):
+    assert run() == CARDS
+    with CrawlJournal(data_paths(str(tmp_path)).journal) as journal:
+        assert journal.stats() == {"done": CARDS}
+    assert len(read_product_articles(os.path.join(tmp_path, "products_data"))) == CARDS
+
+
+def test_incremental_recrawl_refetches_stale_cards(run):
+    assert run() == CARDS
+    assert run(incremental=True) == 0  # Карточки свежие и не изменились
+    assert run(incremental=True, ttl_hours=0) == CARDS  # Все карточки устарели
+
+
+def _product_rows(data_dir):
+    return sum(pq.read_metadata(path).num_rows for path in parquet_files(os.path.join(data_dir, "products_data")))
+
+
+def _review_rows(data_dir):
+    return open_review_dataset(os.path.join(data_dir, "reviews_data")).count_rows()
+
+
+def test_rescraped_cards_replace_earlier_reviews(run, tmp_path):
+    assert run() == CARDS
+    reviews = _review_rows(tmp_path)
+    assert reviews > 0
+    assert run(incremental=True, ttl_hours=0, fresh=True) == CARDS
+
+    assert _review_rows(tmp_path) == reviews
+    manifest = read_manifest(data_paths(str(tmp_path)).reviews)
+    assert sum(entry["rows"] for entry in manifest) == reviews
+    # Товары хранят историю сборов, при чтении остаётся последняя строка артикула
+    assert _product_rows(tmp_path) == 2 * CARDS
+    assert len(ProductLookup.load(os.path.join(tmp_path, "products_data"))) == CARDS
+
+
+def test_failed_card_leaves_no_partial_rows(run, site, tmp_path, monkeypatch):
+    failing_url = site.card_urls()[0]
+    original = crawl.iter_reviews_with_photos
+    attempts = []
+
+    def flaky_reviews(driver, *args, **kwargs):
+        # Первая попытка первой карточки обрывается после того, как порция отзывов уже передана дальше
+        first_attempt = driver.current_url == failing_url and not attempts
+        if driver.current_url == failing_url:
+            attempts.append(driver.current_url)
+        for number, review in enumerate(original(driver, *args, **kwargs)):
+            if first_attempt and number == 3:
+                raise RuntimeError("обрыв соединения")
+            yield review
+
+    monkeypatch.setattr(crawl, "REVIEW_BATCH_SIZE", 2)
+    monkeypatch.setattr(crawl, "iter_reviews_with_photos", flaky_reviews)
+    assert run() == CARDS + 1
+
+    expected = sum(len(extract_reviews_with_photos(site.page(url))) for url in site.card_urls())
+    assert _review_rows(tmp_path) == expected
+    assert _product_rows(tmp_path) == CARDS
+    with CrawlJournal(data_paths(str(tmp_path)).journal) as journal:
+        assert journal.stats() == {"done": CARDS}
+
+
+def test_failed_product_write_marks_cards_failed(run, tmp_path, monkeypatch):
+    original = BufferedParquetWriter._write_file
+    calls = []
+
+    def failing_write(self, path, tables):
+        calls.append(path)
+        if len(calls) == 1:
+            raise OSError("нет места на диске")
+        return original(self, path, tables)
+
+    monkeypatch.setattr(BufferedParquetWriter, "_write_file", failing_write)
+    assert run() == CARDS
+    with CrawlJournal(data_paths(str(tmp_path)).journal) as journal:
+        assert journal.stats() == {"failed": CARDS}  # Товары не попали на диск: карточки не отмечены готовыми
+
+    assert run() == CARDS  # Продолжение обхода повторяет неудачные карточки
+    with CrawlJournal(data_paths(str(tmp_path)).journal) as journal:
+        assert journal.stats() == {"done": CARDS}
+    assert _product_rows(tmp_path) == CARDS
@@ -0,0 +1,56 @@
+import itertools  # Для перебора всех пар в эталонном поиске
+
+import numpy as np
+
+import dedup
+from dedup import find_duplicate_clusters, hamming_distance, PHASH_THRESHOLD, DHASH_THRESHOLD
+
+
+def _brute_force_clusters(phashes, dhashes):
+    """Эталон: перебор всех пар и объединение через множества."""
+    groups = [{index} for index in range(len(phashes))]
+    for left, right in itertools.combinations(range(len(phashes)), 2):
+        if (hamming_distance(phashes[left], phashes[right]) <= PHASH_THRESHOLD
+                and hamming_distance(dhashes[left], dhashes[right]) <= DHASH_THRESHOLD):
+            merged = groups[left] | groups[right]
+            for index in merged:
+                groups[index] = merged
+    return sorted({tuple(sorted(group)) for group in groups if len(group) > 1})
+
+
+def _normalize(clusters):
+    return sorted(tuple(sorted(int(index) for index in cluster)) for cluster in clusters)
+
+
+def _sample_hashes(seed=0, size=200, near=60, exact=30):
+    rng = np.random.default_rng(seed)
+    phashes = rng.integers(0, 2 ** 63, size, dtype=np.uint64)
+    dhashes = rng.integers(0, 2 ** 63, size, dtype=np.uint64)
+    sources = rng.integers(0, size, near)
+    flips = np.uint64(1) << rng.integers(0, 64, near).astype(np.uint64)
+    phashes = np.concatenate([phashes, phashes[sources] ^ flips, np.full(exact, 12345, np.uint64)])
+    dhashes = np.concatenate([dhashes, dhashes[sources], np.full(exact, 999, np.uint64)])
+    return phashes, dhashes
+
+
+def test_clusters_match_brute_force():
+    phashes, dhashes = _sample_hashes()
+    assert _normalize(find_duplicate_clusters(phashes, dhashes)) == _brute_force_clusters(phashes, dhashes)
+
+
+def test_empty_input():
+    assert find_duplicate_clusters(np.array([], dtype=np.uint64)) == []
+
+
+def test_exact_duplicates_survive_bucket_limit(monkeypatch):
+    # Одинаковые хеши объединяются до корзин, поэтому ограничение размера корзины их не теряет
+    monkeypatch.setattr(dedup, "MAX_BUCKET_SIZE", 2)
+    phashes = np.full(50, 7, dtype=np.uint64)
+    assert _normalize(find_duplicate_clusters(phashes)) == [tuple(range(50))]
+
+
+def test_oversized_bucket_is_skipped(monkeypatch, caplog):
+    monkeypatch.setattr(dedup, "MAX_BUCKET_SIZE", 2)
+    phashes = np.array([0, 1, 2], dtype=np.uint64) << np.uint64(60)  # Совпадают все полосы, кроме старшей
+    assert find_duplicate_clusters(phashes) == []
+    assert "не сравнивались попарно" in caplog.text
@@ -0,0 +1,118 @@
+import os  # Для работы с файлами
+import threading  # Для HTTP-сервера в отдельном потоке
+from collections import Counter  # Для подсчёта запросов к серверу
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from downloader import ImageDownloader, DownloadSummary
+from rate_limit import RateLimiter
+
+BODY = bytes(range(256)) * 64  # Содержимое "изображения", 16 КБ
+FLAKY_FAILURES = 2  # Сколько раз /flaky отвечает 500 перед успехом
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Маршруты тестового сервера: /ok, /flaky, /range, /missing, /broken."""
+
+    hits = Counter()
+    ranges = []
+
+    def do_GET(self):
+        self.hits[self.path] += 1
+        if self.path == "/flaky" and self.hits[self.path] <= FLAKY_FAILURES:
+            return self._reply(500, b"")
+        if self.path == "/missing":
+            return self._reply(404, b"")
+        if self.path == "/broken":
+            return self._reply(502, b"")
+        range_header = self.headers.get("Range")
+        if self.path == "/range" and range_header:
+            self.ranges.append(range_header)
+            start = int(range_header.split("=")[1].rstrip("-"))
+            return self._reply(206, BODY[start:], {"Content-Range": f"bytes {start}-{len(BODY) - 1}/{len(BODY)}"})
+        self._reply(200, BODY)
+
+    def _reply(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    """Локальный HTTP-сервер; возвращает базовый URL."""
+    _Handler.hits.clear()
+    _Handler.ranges.clear()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def downloader():
+    # Без пауз между повторами и без ограничения частоты запросов
+    return ImageDownloader(max_workers=4, max_retries=2, backoff_base=0.0, rate_limiter=RateLimiter(groups=()))
+
+
+def read(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def test_fetch_success(server, downloader, tmp_path):
+    path = tmp_path / "ok.jpg"
+    assert downloader.fetch(f"{server}/ok", str(path)) == len(BODY)
+    assert read(path) == BODY
+    assert not os.path.exists(f"{path}.part")
+
+
+def test_fetch_retries_server_errors(server, downloader, tmp_path):
+    path = tmp_path / "flaky.jpg"
+    assert downloader.fetch(f"{server}/flaky", str(path)) == len(BODY)
+    assert read(path) == BODY
+    assert _Handler.hits["/flaky"] == FLAKY_FAILURES + 1
+
+
+def test_fetch_resumes_partial_file(server, downloader, tmp_path):
+    path = tmp_path / "range.jpg"
+    received = 5000
+    with open(f"{path}.part", "wb") as file:
+        file.write(BODY[:received])
+    assert downloader.fetch(f"{server}/range", str(path)) == len(BODY) - received
+    assert _Handler.ranges == [f"bytes={received}-"]
+    assert read(path) == BODY
+
+
+def test_fetch_gives_up_after_retries(server, downloader, tmp_path):
+    with pytest.raises(Exception):
+        downloader.fetch(f"{server}/broken", str(tmp_path / "broken.jpg"))
+    assert _Handler.hits["/broken"] == downloader.max_retries + 1
+
+
+def test_download_summary(server, downloader, tmp_path):
+    jobs = [(f"{server}/ok", str(tmp_path / "a.jpg")), (f"{server}/flaky", str(tmp_path / "b.jpg")),
+            (f"{server}/missing", str(tmp_path / "c.jpg")), (f"{server}/broken", str(tmp_path / "d.jpg"))]
+    results = {}
+    summary = downloader.download(iter(jobs), on_result=lambda url, path, error: results.update({url: error}))
+
+    assert isinstance(summary, DownloadSummary)
+    assert (summary.ok, summary.failed, summary.skipped) == (2, 2, 0)
+    assert summary.bytes == 2 * len(BODY)
+    assert summary.seconds > 0
+    assert set(summary.errors) == {f"{server}/missing", f"{server}/broken"}
+    assert "404" in summary.errors[f"{server}/missing"]
+    # 404 не повторяется, 502 повторяется до исчерпания попыток
+    assert _Handler.hits["/missing"] == 1
+    assert _Handler.hits["/broken"] == downloader.max_retries + 1
+    assert results[f"{server}/ok"] is None and results[f"{server}/missing"] is not None
+    assert read(tmp_path / "a.jpg") == BODY and read(tmp_path / "b.jpg") == BODY
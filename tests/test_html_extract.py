@@ -0,0 +1,146 @@
+import dataclasses  # Для сравнения записей по полям
+
+import pytest
+
+from benchmark import FakeWebDriver, SleepRecorder
+from html_extract import extract_product_data, extract_reviews_with_photos, extract_description_data, parse_html
+from products import get_product_data
+from reviews import get_reviews_with_photos
+
+# Ожидаемые записи для сохранённых страниц tests/fixtures (scraped_at не сравнивается)
+PRODUCT_PAGE = {
+    "product_article": "146972802",
+    "brand": "Pampers",
+    "name": "Подгузники трусики Pants 4 размер 9-15 кг 52 шт",
+    "price": 2437,
+    "color": "белый",
+    "number_of_units": "52 шт.",
+    "diapers_type": "трусики",
+    "weight_category": "9-15 кг",
+    "shipping_weight": "1,4 кг",
+    "producing_country": "Польша",
+    "equipment": "подгузники-трусики 52 шт.",
+    "overall_size": "30x22x19",
+    "description": "Мягкие трусики с дышащим верхним слоем для активных малышей.",
+}
+# Страница без бренда, цены и окна характеристик
+PRODUCT_PAGE_MINIMAL = {
+    "product_article": "163048221",
+    "brand": None,
+    "name": "Подгузники ночные 5 размер",
+    "price": None,
+    "color": None,
+    "number_of_units": None,
+    "diapers_type": None,
+    "weight_category": None,
+    "shipping_weight": None,
+    "producing_country": None,
+    "equipment": None,
+    "overall_size": None,
+    "description": None,
+}
+# Окно характеристик без части строк, габаритов и описания
+POPUP_PARTIAL = {
+    "color": "голубой",
+    "number_of_units": "38 шт.",
+    "diapers_type": "на липучках",
+    "weight_category": "от 15 кг",
+}
+# Отзывы с фотографиями (второй отзыв на странице без фотографий и пропускается)
+REVIEWS = [
+    {
+        "photo_urls": ["https://feedback04.wbbasket.ru/vol1012/part101234/101234567/photos/fs.webp",
+                       "https://feedback04.wbbasket.ru/vol1012/part101234/101234568/photos/fs.webp"],
+        "author_name": "Анна",
+        "published_at": "2024-11-21T11:29:09Z",
+        "rating": 5,
+        "review_text": "Достоинства: Хорошо сидят, не протекают\nНедостатки: Дороговато\n"
+                       "Комментарии: Берём уже третью пачку",
+    },
+    {
+        # Нет автора и даты: без даты оценка тоже не сохраняется
+        "photo_urls": ["https://feedback11.wbbasket.ru/vol2001/part200123/200123456/photos/fs.webp"],
+        "author_name": None,
+        "published_at": None,
+        "rating": None,
+        "review_text": "Достоинства: Мягкие\nКомментарии: Размер соответствует",
+    },
+    {
+        # Только фотография, без текста
+        "photo_urls": ["https://feedback02.wbbasket.ru/vol3003/part300345/300345678/photos/fs.webp"],
+        "author_name": "Мария К.",
+        "published_at": "2024-10-02T19:45:00Z",
+        "rating": 1,
+        "review_text": "",
+    },
+]
+
+PRODUCT_URL = "https://www.example.test/catalog/146972802/detail.aspx"
+REVIEWS_URL = "https://www.example.test/catalog/146972802/feedbacks"
+
+
+class FixtureSite:
+    """Сайт для FakeWebDriver, отдающий сохранённые страницы по URL."""
+
+    def __init__(self, pages):
+        self.pages = pages
+
+    def page(self, url):
+        return self.pages[url]
+
+
+def product_fields(product_data):
+    fields = dataclasses.asdict(product_data)
+    fields.pop("scraped_at")
+    return fields
+
+
+def review_fields(reviews):
+    return [dataclasses.asdict(review_data) for review_data in reviews]
+
+
+def test_extract_product_data(load_fixture):
+    assert product_fields(extract_product_data(load_fixture("product_page.html"))) == PRODUCT_PAGE
+
+
+def test_extract_product_data_missing_elements(load_fixture):
+    assert product_fields(extract_product_data(load_fixture("product_page_minimal.html"))) == PRODUCT_PAGE_MINIMAL
+
+
+def test_extract_product_data_separate_popup(load_fixture):
+    product_data = extract_product_data(load_fixture("product_page_minimal.html"), load_fixture("popup_partial.html"))
+    assert product_fields(product_data) == {**PRODUCT_PAGE_MINIMAL, **POPUP_PARTIAL}
+
+
+def test_extract_description_data_missing_popup(load_fixture):
+    assert extract_description_data(parse_html(load_fixture("product_page_minimal.html"))) is None
+
+
+def test_extract_reviews_with_photos(load_fixture):
+    assert review_fields(extract_reviews_with_photos(load_fixture("reviews_page.html"))) == REVIEWS
+
+
+def test_extract_reviews_with_photos_limit(load_fixture):
+    assert review_fields(extract_reviews_with_photos(load_fixture("reviews_page.html"), max_reviews=2)) == REVIEWS[:2]
+
+
+def test_extract_reviews_without_list():
+    assert extract_reviews_with_photos("<html><body><p>Отзывов пока нет</p></body></html>") == []
+
+
+@pytest.mark.parametrize("use_js", [True, False])
+def test_product_matches_webdriver_path(load_fixture, use_js):
+    """Разбор без браузера совпадает с записью, собранной через WebDriver по той же странице."""
+    driver = FakeWebDriver(FixtureSite({PRODUCT_URL: load_fixture("product_page.html")}))
+    with SleepRecorder():
+        product_data = get_product_data(driver, PRODUCT_URL, use_js=use_js)
+    assert product_fields(product_data) == product_fields(extract_product_data(load_fixture("product_page.html")))
+
+
+@pytest.mark.parametrize("use_js", [True, False])
+def test_reviews_match_webdriver_path(load_fixture, use_js):
+    driver = FakeWebDriver(FixtureSite({REVIEWS_URL: load_fixture("reviews_page.html")}))
+    driver.get(REVIEWS_URL)
+    with SleepRecorder():
+        reviews = get_reviews_with_photos(driver, use_js=use_js)
+    assert review_fields(reviews) == review_fields(extract_reviews_with_photos(load_fixture("reviews_page.html")))
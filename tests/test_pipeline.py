@@ -0,0 +1,53 @@
+import itertools  # Для бесконечного источника
+import threading  # Для источника, ждущего новых элементов
+
+import pytest
+
+import pipeline
+from pipeline import Pipeline
+
+
+class _WorkerDied(BaseException):
+    """Ошибка, которую обработчик элемента не перехватывает (как SystemExit)."""
+
+
+def test_dead_worker_stops_every_stage():
+    seen = []
+
+    def broken(item):
+        if item == 3:
+            raise _WorkerDied()
+        yield item
+
+    stages = Pipeline(queue_size=2).add_stage("broken", broken).add_stage("sink", seen.append)
+    stats = stages.run(itertools.count())  # Источник бесконечный: завершить его может только остановка
+
+    assert seen == list(range(len(seen))) and len(seen) <= 3  # После остановки элементы отбрасываются
+    assert all(stage.finished is not None for stage in stats)
+
+
+def test_interrupted_run_stops_stages_while_source_waits(monkeypatch):
+    monkeypatch.setattr(pipeline, "SOURCE_STOP_SECONDS", 0.1)
+    released = threading.Event()
+    seen = []
+
+    def waiting_source():
+        yield from range(3)
+        released.wait()  # Ждёт новых задач, как work --wait
+        yield 3
+
+    stages = Pipeline(report_seconds=0).add_stage("sink", seen.append)
+    reports = []
+
+    def report():
+        reports.append(len(seen))
+        if len(reports) == 1:
+            raise SystemExit(1)  # SIGTERM в основном потоке (см. main.handle_termination)
+
+    monkeypatch.setattr(stages, "report", report)
+    try:
+        with pytest.raises(SystemExit):
+            stages.run(waiting_source())
+    finally:
+        released.set()
+    assert stages._stages[0].stats.finished is not None
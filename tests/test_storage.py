@@ -0,0 +1,63 @@
+import os  # Для проверки файлов-частей
+
+import pyarrow.parquet as pq
+import pytest
+
+from records import ReviewRecord, ProductRecord, PRODUCT_SCHEMA, PRODUCT_RAW_SCHEMA, normalize_products
+from reviews import save_review_data_to_parquet, open_review_dataset
+from storage import BufferedParquetWriter, parquet_files, read_manifest
+
+
+def _reviews(count, author="Покупатель"):
+    return [ReviewRecord(photo_urls=[f"https://example.com/{index}.webp"], author_name=f"{author} {index}",
+                         published_at="2024-11-21T11:29:09Z", rating=5) for index in range(count)]
+
+
+def _parts(root, article):
+    return sorted(os.listdir(os.path.join(root, f"product_article={article}")))
+
+
+def test_replace_drops_earlier_parts(tmp_path):
+    root = str(tmp_path / "reviews")
+    save_review_data_to_parquet(_reviews(3), root, "101")
+    save_review_data_to_parquet(_reviews(2, "Другой"), root, "101")
+    save_review_data_to_parquet(_reviews(4), root, "202")
+
+    save_review_data_to_parquet(_reviews(5), root, "101", replace=True)
+
+    assert len(_parts(root, "101")) == 1
+    assert open_review_dataset(root).count_rows() == 5 + 4
+    assert sorted((entry["product_article"], entry["rows"]) for entry in read_manifest(root)) == [("101", 5), ("202", 4)]
+
+
+def test_replace_with_no_reviews_removes_partition_rows(tmp_path):
+    root = str(tmp_path / "reviews")
+    save_review_data_to_parquet(_reviews(3), root, "101")
+    save_review_data_to_parquet([], root, "101", replace=True)
+
+    assert _parts(root, "101") == []
+    assert open_review_dataset(root).count_rows() == 0
+    assert read_manifest(root) == []
+
+
+def test_failed_flush_reports_waiting_callbacks(tmp_path, monkeypatch):
+    writer = BufferedParquetWriter(str(tmp_path / "products.parquet"), PRODUCT_SCHEMA,
+                                   raw_schema=PRODUCT_RAW_SCHEMA, normalize=normalize_products).open()
+    saved, failed = [], []
+    writer.write(ProductRecord(product_article="101"))
+    writer.when_flushed(lambda: saved.append("101"), on_error=lambda error: failed.append(("101", str(error))))
+
+    def broken(path, tables):
+        raise OSError("нет места на диске")
+
+    monkeypatch.setattr(writer, "_write_file", broken)
+    with pytest.raises(OSError):
+        writer.flush()
+    assert saved == [] and failed == [("101", "нет места на диске")]
+
+    monkeypatch.undo()
+    writer.write(ProductRecord(product_article="202"))
+    writer.when_flushed(lambda: saved.append("202"))
+    writer.close()
+    assert saved == ["202"]
+    assert sum(pq.read_metadata(path).num_rows for path in parquet_files(str(tmp_path))) == 1
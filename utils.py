@@ -1,89 +1,218 @@
 
-from selenium.webdriver.common.by import By  # Для поиска элементов на странице
 import logging  # Для ведения логов
 import time  # Для работы с временем
-import random  # Для генерации случайных чисел
-TIMEOUT = (0.5, 2.0)
 
+from metrics import timed
+from rate_limit import RATE_LIMITER
 
-def scroll_page_to_bottom(driver, increment=0.1, step=300, max_retries=5):
+
+class By:
+    """
+    Стратегии поиска элементов WebDriver (те же строки, что у selenium.webdriver.common.by.By).
+
+    Модули разбора страниц импортируются и командами без браузера (разбор HTML, экспорт),
+    поэтому сам selenium загружается только при запуске браузера и ожидании элементов.
+    """
+    XPATH = "xpath"
+    CSS_SELECTOR = "css selector"
+
+CATALOG_ITEM_XPATH = '//article/div/a'  # Карточки товаров на странице каталога
+CATALOG_TARGET_COUNT = 100  # Количество карточек на полностью загруженной странице каталога
+SCROLL_TIME_BUDGET = 10.0  # Максимальное время прокрутки одной страницы, секунд
+SCROLL_QUIET_MS = 700  # Сколько DOM должен не меняться внизу страницы, чтобы считать загрузку завершённой, мс
+BLOCKED_PAGE_RETRIES = 3  # Сколько раз повторно открывать страницу, если сайт показал капчу или ошибку 429/503
+
+# Скрипт адаптивной прокрутки (выполняется через execute_async_script, см. scroll_until_loaded).
+# Аргументы: XPath элементов, целевое количество (0 - без цели), бюджет времени в мс,
+# время тишины в мс, прокручиваемый элемент (null - страница), callback.
+SCROLL_SCRIPT = """
+const itemXpath = arguments[0], targetCount = arguments[1], budgetMs = arguments[2], quietMs = arguments[3];
+const container = arguments[4];
+const done = arguments[arguments.length - 1];
+const scroller = container || document.scrollingElement || document.documentElement;
+const started = performance.now();
+let lastMutation = started;
+const count = () => itemXpath ? document.evaluate(
+    "count(" + itemXpath + ")", document, null, XPathResult.NUMBER_TYPE, null).numberValue : 0;
+const observer = new MutationObserver(() => { lastMutation = performance.now(); });
+observer.observe(container || document.body, {childList: true, subtree: true});
+const finish = reason => {
+    observer.disconnect();
+    done({reason: reason, count: count(), height: scroller.scrollHeight, elapsed: performance.now() - started});
+};
+const step = () => {
+    const now = performance.now();
+    if (targetCount && count() >= targetCount) return finish("target");
+    if (now - started >= budgetMs) return finish("budget");
+    const atBottom = scroller.scrollTop + scroller.clientHeight >= scroller.scrollHeight - 2;
+    if (atBottom && now - lastMutation >= quietMs) return finish("converged");
+    scroller.scrollTop = scroller.scrollTop + scroller.clientHeight * 2;
+    setTimeout(step, 50);
+};
+step();
+"""
+
+
+def wait_for_xpath(driver, xpath, timeout):
+    """
+    Ждёт появления элемента `xpath` на странице не дольше `timeout` секунд и возвращает его.
+
+    :raises TimeoutException: Если элемент так и не появился.
     """
-    Плавно прокручивает страницу, дожидаясь полной загрузки всех элементов.
-    
+    from selenium.webdriver.support.ui import WebDriverWait  # Для ожидания загрузки элементов
+    from selenium.webdriver.support import expected_conditions as EC  # Для условий ожидания
+    return WebDriverWait(driver, timeout).until(EC.presence_of_element_located((By.XPATH, xpath)))
+
+
+# Скрипт, проверяющий, не показал ли сайт вместо страницы капчу или ошибку ограничения частоты.
+# arguments[0] - признаки в заголовке страницы (в нижнем регистре).
+# Возвращает найденный признак или null.
+BLOCK_CHECK_SCRIPT = """
+const markers = arguments[0];
+if (document.querySelector('iframe[src*="captcha"], [class*="captcha"], [id*="captcha"]')) return "captcha";
+const title = (document.title || "").toLowerCase();
+for (const marker of markers) if (title.includes(marker)) return marker;
+return null;
+"""
+# Признаки в заголовке страницы блокировки
+BLOCK_TITLE_MARKERS = ["429", "503", "too many requests", "service unavailable", "почти готово",
+                       "доступ ограничен", "подозрительная активность"]
+
+
+class PageBlockedError(Exception):
+    """Сайт продолжает показывать капчу или ошибку ограничения частоты вместо страницы."""
+
+
+def open_page(driver, url, limiter=RATE_LIMITER, retries=BLOCKED_PAGE_RETRIES):
+    """
+    Открывает страницу с соблюдением ограничения частоты запросов к её хосту.
+
+    Перед переходом ждёт токен планировщика, после - сообщает ему время загрузки и то,
+    не показал ли сайт капчу или страницу ошибки 429/503. Заблокированная страница
+    открывается повторно после паузы, назначенной планировщиком.
+
     :param driver: WebDriver для взаимодействия с браузером.
-    :param increment: Доля высоты страницы, на которую нужно прокрутить за один цикл.
-    :param step: Шаг прокрутки в пикселях, чтобы обеспечить плавное движение.
-    :param max_retries: Максимальное количество попыток для загрузки всех элементов.
+    :param url: Адрес страницы.
+    :param limiter: Планировщик запросов (по умолчанию общий для процесса).
+    :raises PageBlockedError: Если страница заблокирована и после `retries` повторов.
     """
-    logging.info("Начинаем плавную прокрутку страницы.")
-
-    last_height = driver.execute_script("return document.body.scrollHeight")  # Текущая высота страницы
-    retries = 0  # Счётчик попыток
-    while retries < max_retries:
-        current_scroll_position = 0
-        while current_scroll_position < last_height:
-            # Прокручиваем страницу на шаг `step`
-            driver.execute_script(f"window.scrollTo(0, {current_scroll_position});")
-            current_scroll_position += step
-            time.sleep(0.01)  # Короткая пауза для плавности
-
-        time.sleep(random.uniform(*TIMEOUT))  # Делаем паузу, чтобы подгрузились элементы
-
-        # Проверяем, изменилась ли высота страницы
-        new_height = driver.execute_script("return document.body.scrollHeight")
-        if new_height == last_height:
-            logging.info("Высота страницы не изменилась. Проверяем количество загруженных элементов.")
-            products = driver.find_elements(By.XPATH, '//article/div/a')
-            if len(products) >= 100 or retries >= max_retries:
-                logging.info(f"Достигнуто {len(products)} элементов. Прокрутка завершена.")
-                break
-            else:
-                logging.warning(f"Элементов загружено {len(products)}, требуется повторная прокрутка.")
-                retries += 1
-                continue  # Повторяем цикл
-        else:
-            last_height = new_height
-            retries = 0  # Сброс счётчика при изменении высоты страницы
-
-    # Прокручиваем до самого конца
-    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-    logging.info("Плавная прокрутка страницы завершена.")
+    for attempt in range(retries + 1):
+        limiter.acquire(url)
+        started = time.perf_counter()
+        driver.get(url)
+        seconds = time.perf_counter() - started
+        marker = driver.execute_script(BLOCK_CHECK_SCRIPT, BLOCK_TITLE_MARKERS)
+        limiter.report(url, seconds, throttled=bool(marker))
+        if not marker:
+            return
+        logging.warning(f"Вместо страницы {url} показана блокировка ({marker}), попытка {attempt + 1}.")
+    raise PageBlockedError(f"Страница {url} заблокирована сайтом")
+
 
+@timed("scroll")
+def scroll_until_loaded(driver, item_xpath=None, target_count=None, time_budget=SCROLL_TIME_BUDGET,
+                       quiet_ms=SCROLL_QUIET_MS, container=None):
+    """
+    Прокручивает страницу (или элемент) внутри браузера, пока подгружается новое содержимое.
+
+    Весь цикл выполняется одним вызовом execute_async_script: прокрутка идёт шагами в два экрана,
+    а появление нового содержимого отслеживается MutationObserver. Прокрутка останавливается,
+    когда найдено `target_count` элементов `item_xpath`, когда достигнут низ и DOM не меняется
+    `quiet_ms` миллисекунд, или когда исчерпан бюджет времени.
+
+    :param driver: WebDriver для взаимодействия с браузером.
+    :param item_xpath: XPath подгружаемых элементов (например, карточек товаров).
+    :param target_count: Количество элементов, после которого прокрутка не нужна (None - до конца).
+    :param time_budget: Максимальное время прокрутки, секунд.
+    :param quiet_ms: Сколько миллисекунд DOM должен не меняться внизу страницы, чтобы считать загрузку завершённой.
+    :param container: Прокручиваемый WebElement (по умолчанию вся страница).
+    :return: Словарь с причиной остановки (reason), количеством элементов (count), высотой и временем.
+    """
+    driver.set_script_timeout(time_budget + 5)
+    result = driver.execute_async_script(SCROLL_SCRIPT, item_xpath, target_count or 0,
+                                         int(time_budget * 1000), quiet_ms, container)
+    logging.debug("Прокрутка завершена (%s): элементов %s, высота %s, %.1f с.",
+                  result["reason"], result["count"], result["height"], result["elapsed"] / 1000)
+    return result
+
+
+def scroll_page_to_bottom(driver, item_xpath=CATALOG_ITEM_XPATH, target_count=CATALOG_TARGET_COUNT,
+                          time_budget=SCROLL_TIME_BUDGET):
+    """
+    Прокручивает страницу каталога, пока не загрузится `target_count` элементов `item_xpath`
+    или пока новые элементы не перестанут появляться.
+
+    :param driver: WebDriver для взаимодействия с браузером.
+    :param item_xpath: XPath карточек товаров.
+    :param target_count: Ожидаемое количество карточек на странице.
+    :param time_budget: Максимальное время прокрутки, секунд.
+    """
+    logging.debug("Начинаем прокрутку страницы.")
+    return scroll_until_loaded(driver, item_xpath, target_count, time_budget)
 
 
 def scroll_page_incrementally(driver, increment: float):
-    """Прокручивает страницу на заданное количество пикселей, основанное на проценте от высоты страницы."""
-    start_height = driver.execute_script("return document.body.scrollHeight")  # Получаем начальную высоту страницы
-    scroll_increment = int(start_height * increment)  # Вычисляем количество пикселей для прокрутки
-    new_scroll_position = 0  # Начальная позиция прокрутки
-
-    logging.info(f"Прокручиваем страницу на {scroll_increment} пикселей.")
-    while new_scroll_position < scroll_increment:
-        driver.execute_script(f"window.scrollTo(0, {new_scroll_position});")  # Прокручиваем на заданное количество пикселей
-        new_scroll_position += 2  # Увеличиваем позицию прокрутки на 2 пикселя
-
-
-def scroll_popup_to_bottom(driver, popup_element):
-    """Прокручивает всплывающее окно до самого низа."""
-    logging.info("Начинаем прокрутку всплывающего окна.")
-    last_height = driver.execute_script("return arguments[0].scrollHeight", popup_element)  # Получаем высоту всплывающего окна
-    
-    while True:
-        driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", popup_element)  # Прокрутка вниз
-        time.sleep(random.uniform(*TIMEOUT))  # Ожидание перед следующей прокруткой
-        new_height = driver.execute_script("return arguments[0].scrollHeight", popup_element)  # Получаем новую высоту
-        if new_height == last_height:  # Если высота не изменилась, значит, достигли конца
-            logging.info("Достигнут конец всплывающего окна.")
-            break
-        last_height = new_height  # Обновляем высоту для следующей итерации
+    """Прокручивает страницу на долю `increment` от её высоты одним запросом к браузеру."""
+    position = driver.execute_script(
+        "const y = Math.floor(document.body.scrollHeight * arguments[0]);"
+        "window.scrollTo(0, y); return y;", increment)
+    logging.debug("Страница прокручена на %s пикселей.", position)
+
+
+def scroll_popup_to_bottom(driver, popup_element, time_budget=SCROLL_TIME_BUDGET):
+    """Прокручивает всплывающее окно до самого низа, пока в нём подгружается содержимое."""
+    logging.debug("Начинаем прокрутку всплывающего окна.")
+    return scroll_until_loaded(driver, time_budget=time_budget, container=popup_element)
 
 
 def get_next_page_button(driver):
     """Возвращает кнопку 'Следующая страница', если она доступна, иначе None."""
     try:
         next_button = driver.find_element(By.XPATH, '//*[@class="pagination-next pagination__next j-next-page"]')
-        logging.info("Найдена кнопка 'Следующая страница'.")
+        logging.debug("Найдена кнопка 'Следующая страница'.")
         return next_button
     except Exception as e:
         logging.warning("Кнопка 'Следующая страница' не найдена: %s", e)
         return None
+
+
+# Скрипт, возвращающий тексты элементов по набору XPath за один вызов execute_script.
+# arguments[0] - XPath корневого элемента (null - весь документ), arguments[1] - словарь {ключ: XPath}.
+# Возвращает null, если корневой элемент не найден; для ненайденных элементов - null.
+XPATH_TEXTS_SCRIPT = """
+const rootXpath = arguments[0], xpaths = arguments[1];
+const first = (xpath, context) => document.evaluate(
+    xpath, context, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+const root = rootXpath ? first(rootXpath, document) : document;
+if (!root) return null;
+const result = {};
+for (const [key, xpath] of Object.entries(xpaths)) {
+    const node = first(xpath, root);
+    result[key] = node ? node.innerText : null;
+}
+return result;
+"""
+
+
+def get_texts_by_xpath(driver, xpaths, root_xpath=None):
+    """
+    Извлекает тексты нескольких элементов за один запрос к браузеру.
+
+    :param driver: WebDriver для взаимодействия с браузером.
+    :param xpaths: Словарь {ключ: XPath}; XPath вычисляются относительно корневого элемента.
+    :param root_xpath: XPath корневого элемента (по умолчанию весь документ).
+    :return: Словарь {ключ: текст или None} либо None, если корневой элемент не найден.
+    """
+    return driver.execute_script(XPATH_TEXTS_SCRIPT, root_xpath, xpaths)
+
+
+OUTER_HTML_SCRIPT = """
+const node = document.evaluate(
+    arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+return node ? node.outerHTML : null;
+"""
+
+
+def get_outer_html(driver, xpath):
+    """Возвращает HTML элемента (outerHTML) по XPath или None, если элемент не найден."""
+    return driver.execute_script(OUTER_HTML_SCRIPT, xpath)
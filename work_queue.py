@@ -0,0 +1,344 @@
+import os  # Для работы с операционной системой
+import json  # Для параметров задач
+import time  # Для работы с временем
+import socket  # Для имени хоста в идентификаторе рабочего
+import sqlite3  # Для хранения очереди задач
+import logging  # Для ведения логов
+import threading  # Для доступа из рабочих потоков и продления аренды
+
+# Виды задач: категория каталога порождает задачу первой страницы, страница - задачи карточек
+# и следующей страницы, карточка собирается и сохраняется рабочим
+TASK_CATEGORY = "category"
+TASK_PAGE = "page"
+TASK_CARD = "card"
+# Карточки выбираются первыми, чтобы очередь не разрасталась найденными, но не собранными ссылками
+TASK_PRIORITY = {TASK_CATEGORY: 0, TASK_PAGE: 1, TASK_CARD: 2}
+
+# Состояния задач
+TASK_PENDING = "pending"
+TASK_LEASED = "leased"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+
+LEASE_SECONDS = 300.0  # Срок аренды задачи; если рабочий не продлил аренду, задачу может взять другой
+HEARTBEAT_SECONDS = 60.0  # Как часто рабочий продлевает аренду своих задач
+RETRY_DELAY_SECONDS = 60.0  # Через сколько секунд задачу с ошибкой можно взять снова
+MAX_TASK_ATTEMPTS = 3  # Максимальное количество попыток выполнения задачи
+BUSY_TIMEOUT = 30.0  # Сколько ждать снятия блокировки базы другим процессом, секунд
+
+
+def default_worker_id():
+    """Идентификатор рабочего процесса: имя хоста и PID."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Task:
+    """Задача из очереди."""
+
+    __slots__ = ("id", "kind", "url", "payload", "attempts")
+
+    def __init__(self, id, kind, url, payload, attempts):
+        self.id = id
+        self.kind = kind
+        self.url = url
+        self.payload = payload
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Task({self.id}, {self.kind}, {self.url})"
+
+
+class WorkQueue:
+    """
+    Общая очередь задач обхода в SQLite с арендой задач.
+
+    Несколько рабочих процессов открывают один файл очереди. Рабочий берёт задачу в аренду
+    на `lease_seconds` секунд и продлевает аренду, пока её выполняет (см. LeaseKeeper).
+    Если рабочий упал или завис, аренда истекает и задачу берёт другой рабочий; задача с ошибкой
+    возвращается в очередь через `retry_delay` секунд, пока не исчерпаны попытки.
+
+    Для рабочих на нескольких хостах файл должен лежать на общем диске с рабочими блокировками
+    файлов (SQLite не гарантирует их на всех сетевых файловых системах).
+
+    Методы mark_card_done и mark_card_failed совместимы с journal.CrawlJournal, поэтому этапы
+    конвейера из main работают и с очередью.
+    """
+
+    def __init__(self, queue_file, worker_id=None, lease_seconds=LEASE_SECONDS, retry_delay=RETRY_DELAY_SECONDS,
+                 max_attempts=MAX_TASK_ATTEMPTS):
+        self.queue_file = queue_file
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        directory = os.path.dirname(queue_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Транзакции открываются явно (BEGIN IMMEDIATE), чтобы выбор и аренда задачи были атомарными
+        self._connection = sqlite3.connect(queue_file, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                                           isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                payload TEXT,
+                priority INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                available_at REAL NOT NULL,
+                error TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL,
+                UNIQUE (kind, url)
+            );
+            CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (state, priority, id);
+            CREATE INDEX IF NOT EXISTS tasks_owner ON tasks (lease_owner);
+            """
+        )
+
+    def close(self):
+        """Закрывает очередь."""
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _execute(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters)
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def enqueue(self, kind, urls, payload=None, requeue_done=False):
+        """
+        Добавляет задачи одного вида (уже известные задачи не меняются).
+
+        :param urls: Ссылка или список ссылок.
+        :param payload: Параметры задачи (словарь, общий для всех ссылок).
+        :param requeue_done: Возвращать в очередь уже выполненные или неудачные задачи с теми же ссылками
+                             (новый проход по категории, устаревшие карточки).
+        :return: Список добавленных (или возвращённых в очередь) ссылок.
+        """
+        urls = [urls] if isinstance(urls, str) else list(urls)
+        payload_json = json.dumps(payload, ensure_ascii=False) if payload is not None else None
+        now = time.time()
+        added = []
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                for url in urls:
+                    cursor = self._connection.execute(
+                        "INSERT OR IGNORE INTO tasks (kind, url, payload, priority, state, available_at, created, updated) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (kind, url, payload_json, TASK_PRIORITY.get(kind, 0), TASK_PENDING, now, now, now),
+                    )
+                    if not cursor.rowcount and requeue_done:
+                        cursor = self._connection.execute(
+                            "UPDATE tasks SET state = ?, attempts = 0, payload = ?, available_at = ?, error = NULL, "
+                            "updated = ? WHERE kind = ? AND url = ? AND state IN (?, ?)",
+                            (TASK_PENDING, payload_json, now, now, kind, url, TASK_DONE, TASK_FAILED),
+                        )
+                    if cursor.rowcount:
+                        added.append(url)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        return added
+
+    def lease(self, kinds=None):
+        """
+        Берёт в аренду следующую готовую задачу: ожидающую или с истёкшей арендой.
+
+        :param kinds: Виды задач, которые может выполнять рабочий (по умолчанию любые).
+        :return: Task или None, если готовых задач нет.
+        """
+        now = time.time()
+        kind_filter = ""
+        parameters = [TASK_PENDING, now, TASK_LEASED, now, self.max_attempts]
+        if kinds:
+            kind_filter = f" AND kind IN ({', '.join('?' for _ in kinds)})"
+            parameters.extend(kinds)
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Задачи, рабочий которых пропал на последней попытке, больше не выдаются
+                self._connection.execute(
+                    "UPDATE tasks SET state = ?, lease_owner = NULL, error = COALESCE(error, ?), updated = ? "
+                    "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                    (TASK_FAILED, "аренда истекла", now, TASK_LEASED, now, self.max_attempts),
+                )
+                row = self._connection.execute(
+                    "SELECT id, kind, url, payload, attempts FROM tasks "
+                    "WHERE ((state = ? AND available_at <= ?) OR (state = ? AND lease_expires < ?)) "
+                    f"AND attempts < ?{kind_filter} ORDER BY priority DESC, id LIMIT 1",
+                    parameters,
+                ).fetchone()
+                if row is not None:
+                    self._connection.execute(
+                        "UPDATE tasks SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                        "updated = ? WHERE id = ?",
+                        (TASK_LEASED, self.worker_id, now + self.lease_seconds, now, row[0]),
+                    )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        task_id, kind, url, payload, attempts = row
+        return Task(task_id, kind, url, json.loads(payload) if payload else {}, attempts + 1)
+
+    def heartbeat(self):
+        """
+        Продлевает аренду всех задач этого рабочего.
+
+        :return: Количество продлённых задач.
+        """
+        now = time.time()
+        cursor = self._execute(
+            "UPDATE tasks SET lease_expires = ?, updated = ? WHERE state = ? AND lease_owner = ?",
+            (now + self.lease_seconds, now, TASK_LEASED, self.worker_id),
+        )
+        return cursor.rowcount
+
+    def complete(self, task_id, result=None):
+        """
+        Отмечает задачу как выполненную.
+
+        :param result: Необязательный итог (например, артикул), сохраняется в payload задачи.
+        :return: False, если аренда уже потеряна (задачу мог взять другой рабочий).
+        """
+        parameters = [TASK_DONE, time.time()]
+        result_sql = ""
+        if result is not None:
+            result_sql = ", payload = json_set(COALESCE(payload, '{}'), '$.result', ?)"
+            parameters.append(result)
+        cursor = self._execute(
+            f"UPDATE tasks SET state = ?, lease_owner = NULL, lease_expires = NULL, error = NULL, updated = ?{result_sql} "
+            "WHERE id = ? AND state = ? AND lease_owner = ?",
+            parameters + [task_id, TASK_LEASED, self.worker_id],
+        )
+        return cursor.rowcount > 0
+
+    def fail(self, task_id, error):
+        """
+        Возвращает задачу с ошибкой в очередь (через retry_delay секунд)
+        или отмечает её как окончательно неудачную, если попытки исчерпаны.
+        """
+        now = time.time()
+        self._execute(
+            "UPDATE tasks SET state = CASE WHEN attempts < ? THEN ? ELSE ? END, lease_owner = NULL, "
+            "lease_expires = NULL, available_at = ?, error = ?, updated = ? "
+            "WHERE id = ? AND state = ? AND lease_owner = ?",
+            (self.max_attempts, TASK_PENDING, TASK_FAILED, now + self.retry_delay, str(error), now,
+             task_id, TASK_LEASED, self.worker_id),
+        )
+
+    def release(self):
+        """Возвращает в очередь все задачи этого рабочего без учёта попытки (при штатной остановке)."""
+        now = time.time()
+        cursor = self._execute(
+            "UPDATE tasks SET state = ?, lease_owner = NULL, lease_expires = NULL, attempts = MAX(attempts - 1, 0), "
+            "available_at = ?, updated = ? WHERE state = ? AND lease_owner = ?",
+            (TASK_PENDING, now, now, TASK_LEASED, self.worker_id),
+        )
+        return cursor.rowcount
+
+    def _card_task_id(self, url):
+        rows = self._query("SELECT id FROM tasks WHERE kind = ? AND url = ?", (TASK_CARD, url))
+        return rows[0][0] if rows else None
+
+    def mark_card_done(self, url, product_article=None):
+        """Отмечает задачу карточки как выполненную (интерфейс journal.CrawlJournal)."""
+        task_id = self._card_task_id(url)
+        if task_id is not None and not self.complete(task_id, product_article):
+            logging.warning("Аренда карточки %s истекла до завершения, её может собрать другой рабочий.", url)
+
+    def mark_card_failed(self, url, error):
+        """Отмечает неудачную попытку обработки карточки (интерфейс journal.CrawlJournal)."""
+        task_id = self._card_task_id(url)
+        if task_id is not None:
+            self.fail(task_id, error)
+
+    def is_idle(self):
+        """True, если в очереди не осталось ни ожидающих, ни арендованных задач."""
+        rows = self._query("SELECT COUNT(*) FROM tasks WHERE state IN (?, ?)", (TASK_PENDING, TASK_LEASED))
+        return rows[0][0] == 0
+
+    def stats(self):
+        """Возвращает количество задач по видам и состояниям: {вид: {состояние: количество}}."""
+        result = {}
+        for kind, state, count in self._query("SELECT kind, state, COUNT(*) FROM tasks GROUP BY kind, state"):
+            result.setdefault(kind, {})[state] = count
+        return result
+
+    def active_workers(self):
+        """Возвращает рабочих с действующей арендой: {worker_id: количество задач}."""
+        rows = self._query(
+            "SELECT lease_owner, COUNT(*) FROM tasks WHERE state = ? AND lease_expires >= ? GROUP BY lease_owner",
+            (TASK_LEASED, time.time()),
+        )
+        return dict(rows)
+
+    def recent_errors(self, limit=10):
+        """Возвращает последние ошибки задач: список (вид, ссылка, попытки, ошибка)."""
+        return self._query(
+            "SELECT kind, url, attempts, error FROM tasks WHERE error IS NOT NULL ORDER BY updated DESC LIMIT ?",
+            (limit,),
+        )
+
+    def retry_failed(self):
+        """Возвращает окончательно неудачные задачи в очередь с обнулёнными попытками."""
+        now = time.time()
+        cursor = self._execute(
+            "UPDATE tasks SET state = ?, attempts = 0, available_at = ?, updated = ? WHERE state = ?",
+            (TASK_PENDING, now, now, TASK_FAILED),
+        )
+        return cursor.rowcount
+
+
+class LeaseKeeper:
+    """Фоновый поток, продлевающий аренду задач рабочего, пока тот их выполняет."""
+
+    def __init__(self, work_queue, interval=HEARTBEAT_SECONDS):
+        self.work_queue = work_queue
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.work_queue.heartbeat()
+            except Exception as e:
+                logging.warning(f"Не удалось продлить аренду задач: {e}")
+
+    def close(self):
+        """Останавливает продление аренды."""
+        self._stopping.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()